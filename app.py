@@ -1,25 +1,54 @@
+import asyncio
 import datetime
+import os
 from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from piccolo_admin.endpoints import create_admin
 from piccolo.engine import engine_finder
 from starlette.routing import Mount, Route
-from starlette.staticfiles import StaticFiles
+from tasks.auth import CachedSessionsAuthBackend, cached_session_logout
+from tasks.changes import router as changes_router
+from tasks.compression import CompressionMiddleware, PrecompressedStaticFiles
 from tasks.endpoints import HomeEndpoint
+from tasks.metrics import MetricsMiddleware, metrics_endpoint
+from tasks.notifications import listener
 from tasks.piccolo_app import APP_CONFIG
-from tasks.routers import router as task_router
-from piccolo_api.session_auth.endpoints import session_login, session_logout
-from piccolo_api.session_auth.middleware import SessionsAuthBackend
+from tasks.replicas import PrimaryPinMiddleware, replicas
+from tasks.routers import hot_statements, router as task_router
+from piccolo_api.session_auth.endpoints import session_login
 from starlette.middleware import Middleware
 from starlette.middleware.authentication import AuthenticationMiddleware
 
+DB_CONNECT_ATTEMPTS = int(os.environ.get("DB_CONNECT_ATTEMPTS", "5"))
+DB_CONNECT_BACKOFF = float(os.environ.get("DB_CONNECT_BACKOFF", "1"))
+
 
 async def open_database_connection_pool():
+    """
+    Retries with exponential backoff, then fails the startup rather than
+    serving errors without a database.
+    """
+    engine = engine_finder()
+    for node in [engine, *engine.extra_nodes.values()]:
+        node.prepared_statements = hot_statements()
+    delay = DB_CONNECT_BACKOFF
+    for attempt in range(1, DB_CONNECT_ATTEMPTS + 1):
+        try:
+            await engine.start_connection_pool()
+            return
+        except Exception as exception:
+            if attempt == DB_CONNECT_ATTEMPTS:
+                raise RuntimeError("Unable to connect to the database") from exception
+            print(f"Unable to connect to the database, retrying in {delay}s")
+            await asyncio.sleep(delay)
+            delay *= 2
+
+
+async def start_notification_listener():
     try:
-        engine = engine_finder()
-        await engine.start_connection_pool()
+        await listener.start()
     except Exception:
-        print("Unable to connect to the database")
+        print("Unable to listen for database notifications")
 
 
 async def close_database_connection_pool():
@@ -30,40 +59,56 @@ async def close_database_connection_pool():
         print("Unable to connect to the database")
 
 
+auth_backend = CachedSessionsAuthBackend(
+    increase_expiry=datetime.timedelta(minutes=30),
+    admin_only=False,
+    superuser_only=False,
+)
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     await open_database_connection_pool()
+    await replicas.start()
+    await start_notification_listener()
+    await auth_backend.start()
     yield
+    await auth_backend.stop()
+    await listener.stop()
+    await replicas.stop()
     await close_database_connection_pool()
 
 
 app = FastAPI(
     routes=[
         Route("/", HomeEndpoint),
+        Route("/metrics", metrics_endpoint),
         Mount(
             "/admin/",
             create_admin(
                 tables=APP_CONFIG.table_classes,
             ),
         ),
-        Mount("/static/", StaticFiles(directory="static")),
+        Mount("/static/", PrecompressedStaticFiles(directory="static")),
         Mount("/login/", session_login(redirect_to="/task_manager/docs")),
-        Mount("/logout/", session_logout(redirect_to="/login/")),
+        Mount(
+            "/logout/",
+            cached_session_logout(auth_backend, redirect_to="/login/"),
+        ),
+    ],
+    middleware=[
+        Middleware(MetricsMiddleware),
+        Middleware(CompressionMiddleware),
     ],
     lifespan=lifespan,
 )
 
 authenticated_app = FastAPI(
     middleware=[
-        Middleware(
-            AuthenticationMiddleware,
-            backend=SessionsAuthBackend(
-                increase_expiry=datetime.timedelta(minutes=30),
-                admin_only=False,
-                superuser_only=False,
-            ),
-        ),
+        Middleware(AuthenticationMiddleware, backend=auth_backend),
+        Middleware(PrimaryPinMiddleware),
     ],
 )
 authenticated_app.include_router(task_router)
+authenticated_app.include_router(changes_router)
 app.mount("/task_manager/", authenticated_app)
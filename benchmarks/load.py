@@ -0,0 +1,463 @@
+"""
+A load generator for the ``/task_manager/`` routes.
+
+Each scenario is run in turn against a freshly seeded user, with
+``--concurrency`` clients sending ``--requests`` requests between them. The
+throughput, latency percentiles, and database queries per request are
+reported for each one.
+
+By default the app is run in-process against the database in
+``piccolo_conf.py``, which is needed to count the queries. Pass
+``--base-url`` to benchmark a running server instead - the queries aren't
+counted then, and the same database must be configured locally for seeding.
+
+Run with ``python -m benchmarks.load --output results.json``, and compare
+two builds with ``--baseline results.json``.
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import sys
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import httpx
+from piccolo.apps.user.tables import BaseUser
+from piccolo_api.session_auth.tables import SessionsBase
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from tasks.metrics import request_stats
+from tasks.tables import Label, Task, TaskHistory
+
+PREFIX = "/task_manager"
+SEED_BATCH_SIZE = 1000
+BULK_SIZE = 100
+QUERIES_HEADER = "x-benchmark-queries"
+
+
+def count_queries(app: ASGIApp) -> ASGIApp:
+    """
+    Wraps the app, so each response has a ``QUERIES_HEADER`` with the
+    number of queries run while handling the request, as counted in
+    ``tasks.metrics.request_stats``. Statements which bypass piccolo, such as
+    ``COPY``, aren't counted.
+    """
+
+    async def counting_app(scope: Scope, receive: Receive, send: Send) -> None:
+        async def send_wrapper(message: Message) -> None:
+            # Called from inside the app, where the request's stats are set.
+            stats = request_stats.get()
+            if message["type"] == "http.response.start" and stats is not None:
+                headers = MutableHeaders(scope=message)
+                headers.append(QUERIES_HEADER, str(stats.queries))
+            await send(message)
+
+        await app(scope, receive, send_wrapper)
+
+    return counting_app
+
+
+@dataclass
+class Fixtures:
+    """
+    The data seeded for a run, shared by the scenarios.
+    """
+
+    user_id: int
+    token: str
+    task_ids: List[int]
+    parent_ids: List[int]
+    label_ids: List[int]
+    label_prefix: str
+    disposable_ids: List[int] = field(default_factory=list)
+    bulk_disposable_ids: List[int] = field(default_factory=list)
+    deleted_ids: List[int] = field(default_factory=list)
+    created_label_ids: List[int] = field(default_factory=list)
+
+    def task_body(self, index: int) -> Dict[str, Any]:
+        return {
+            "name": f"Benchmark task {index}",
+            "description": "Created by the load generator",
+            "assignee_id": self.user_id,
+            "status": random.choice([x.value for x in Task.Status]),
+            "parent_task": None,
+            "date_due": "2030-01-01",
+        }
+
+
+async def insert_tasks(rows: List[Dict[str, Any]]) -> List[int]:
+    ids = []
+    for start in range(0, len(rows), SEED_BATCH_SIZE):
+        batch = rows[start : start + SEED_BATCH_SIZE]
+        inserted = await Task.insert(*[Task(**x) for x in batch]).returning(Task.id)
+        ids += [x["id"] for x in inserted]
+    return ids
+
+
+async def seed(
+    tasks: int, labels: int, requests: int, bulk_deletes: bool = True
+) -> Fixtures:
+    """
+    Creates a user owning ``tasks`` tasks - one in ten of which have nine
+    subtasks - along with ``labels`` labels, and enough extra tasks for the
+    delete scenarios to consume. The bulk delete scenario needs
+    ``BULK_SIZE`` times as many, so they're only created for ``bulk_deletes``.
+    """
+    run_id = uuid.uuid4().hex[:8]
+    user = await BaseUser.create_user(
+        username=f"benchmark-{run_id}",
+        password=uuid.uuid4().hex,
+        email=f"benchmark-{run_id}@example.com",
+        active=True,
+    )
+    session = await SessionsBase.create_session(user.id)
+
+    def row(index: int, parent_task: Optional[int] = None) -> Dict[str, Any]:
+        return {
+            "name": f"Task {index}",
+            "description": "Seeded by the load generator",
+            "assignee_id": user.id,
+            "status": random.choice(list(Task.Status)),
+            "parent_task": parent_task,
+            "date_due": None,
+        }
+
+    parent_ids = await insert_tasks([row(i) for i in range(max(tasks // 10, 1))])
+    child_ids = await insert_tasks(
+        [row(i, parent_ids[i // 9]) for i in range(len(parent_ids) * 9)][
+            : max(tasks - len(parent_ids), 0)
+        ]
+    )
+    disposable_ids = await insert_tasks([row(i) for i in range(requests)])
+    bulk_disposable_ids = await insert_tasks(
+        [row(i) for i in range(requests * BULK_SIZE if bulk_deletes else 0)]
+    )
+
+    label_prefix = f"benchmark-{run_id}-"
+    created_labels = await Label.insert(
+        *[Label(term=f"{label_prefix}{i}") for i in range(max(labels, 1))]
+    ).returning(Label.id)
+
+    return Fixtures(
+        user_id=user.id,
+        token=session.token,
+        task_ids=parent_ids + child_ids,
+        parent_ids=parent_ids,
+        label_ids=[x["id"] for x in created_labels],
+        label_prefix=label_prefix,
+        disposable_ids=disposable_ids,
+        bulk_disposable_ids=bulk_disposable_ids,
+    )
+
+
+async def clean_up(fixtures: Fixtures) -> None:
+    await TaskHistory.delete().where(TaskHistory.deleted_by == fixtures.user_id)
+    await Task.delete().where(Task.assignee_id == fixtures.user_id)
+    await Label.delete().where(Label.term.like(f"{fixtures.label_prefix}%"))
+    await SessionsBase.delete().where(SessionsBase.user_id == fixtures.user_id)
+    await BaseUser.delete().where(BaseUser.id == fixtures.user_id)
+
+
+Request = Callable[[httpx.AsyncClient, Fixtures, int], Awaitable[httpx.Response]]
+
+
+def pick(ids: List[int], index: int) -> int:
+    return ids[index % len(ids)]
+
+
+async def delete_task(client: httpx.AsyncClient, fixtures: Fixtures, index: int):
+    task_id = fixtures.disposable_ids.pop()
+    response = await client.delete(f"{PREFIX}/tasks/{task_id}/")
+    fixtures.deleted_ids.append(task_id)
+    return response
+
+
+async def restore_task(client: httpx.AsyncClient, fixtures: Fixtures, index: int):
+    task_id = fixtures.deleted_ids.pop()
+    return await client.post(
+        f"{PREFIX}/tasks/deleted/restore", json={"restore_ids": [task_id]}
+    )
+
+
+async def delete_tasks_bulk(client: httpx.AsyncClient, fixtures: Fixtures, index: int):
+    task_ids = [fixtures.bulk_disposable_ids.pop() for _ in range(BULK_SIZE)]
+    return await client.request(
+        "DELETE", f"{PREFIX}/tasks/bulk", json={"delete_ids": task_ids}
+    )
+
+
+async def create_label(client: httpx.AsyncClient, fixtures: Fixtures, index: int):
+    response = await client.post(
+        f"{PREFIX}/labels/", json={"term": f"{fixtures.label_prefix}created-{index}"}
+    )
+    if response.status_code == 200:
+        fixtures.created_label_ids.append(response.json()["id"])
+    return response
+
+
+async def delete_label(client: httpx.AsyncClient, fixtures: Fixtures, index: int):
+    return await client.delete(f"{PREFIX}/labels/{fixtures.created_label_ids.pop()}/")
+
+
+async def set_task_labels(client: httpx.AsyncClient, fixtures: Fixtures, index: int):
+    labels = random.sample(fixtures.label_ids, min(3, len(fixtures.label_ids)))
+    return await client.post(
+        f"{PREFIX}/tasks/{pick(fixtures.task_ids, index)}/labels/",
+        json=[{"label": x} for x in labels],
+    )
+
+
+# The scenarios run in this order - restore relies on the tasks deleted
+# before it, and delete_label on the labels created before it. The change
+# feed isn't included, as its response never finishes.
+SCENARIOS: Dict[str, Request] = {
+    "list_tasks": lambda c, f, i: c.get(f"{PREFIX}/tasks"),
+    "list_tasks_with_labels": lambda c, f, i: c.get(
+        f"{PREFIX}/tasks", params={"include": "labels"}
+    ),
+    "list_subtasks": lambda c, f, i: c.get(
+        f"{PREFIX}/tasks/{pick(f.parent_ids, i)}/subtasks/"
+    ),
+    "task_tree": lambda c, f, i: c.get(f"{PREFIX}/tasks/{pick(f.parent_ids, i)}/tree"),
+    "search_tasks": lambda c, f, i: c.get(
+        f"{PREFIX}/tasks/search", params={"q": f"task {i % 100}"}
+    ),
+    "create_task": lambda c, f, i: c.post(f"{PREFIX}/tasks/", json=f.task_body(i)),
+    "create_tasks_bulk": lambda c, f, i: c.post(
+        f"{PREFIX}/tasks/bulk", json=[f.task_body(i) for _ in range(BULK_SIZE)]
+    ),
+    "update_tasks_bulk": lambda c, f, i: c.put(
+        f"{PREFIX}/tasks/bulk",
+        json=[
+            {**f.task_body(i), "id": pick(f.task_ids, i * BULK_SIZE + x)}
+            for x in range(min(BULK_SIZE, len(f.task_ids)))
+        ],
+    ),
+    "update_task": lambda c, f, i: c.put(
+        f"{PREFIX}/tasks/{pick(f.task_ids, i)}/",
+        json={**f.task_body(i), "parent_task": None},
+    ),
+    "patch_task": lambda c, f, i: c.patch(
+        f"{PREFIX}/tasks/{pick(f.task_ids, i)}/",
+        json={"status": random.choice([x.value for x in Task.Status])},
+    ),
+    "delete_task": delete_task,
+    "delete_tasks_bulk": delete_tasks_bulk,
+    "list_deleted": lambda c, f, i: c.get(f"{PREFIX}/tasks/deleted/"),
+    "restore_task": restore_task,
+    "list_labels": lambda c, f, i: c.get(f"{PREFIX}/labels"),
+    "create_label": create_label,
+    "update_label": lambda c, f, i: c.put(
+        f"{PREFIX}/labels/{pick(f.label_ids, i)}/",
+        json={"term": f"{f.label_prefix}updated-{i}", "description": None},
+    ),
+    "patch_label": lambda c, f, i: c.patch(
+        f"{PREFIX}/labels/{pick(f.label_ids, i)}/",
+        json={"description": f"Patched by request {i}"},
+    ),
+    "delete_label": delete_label,
+    "set_task_labels": set_task_labels,
+    "list_task_labels": lambda c, f, i: c.get(
+        f"{PREFIX}/tasks/{pick(f.task_ids, i)}/labels/"
+    ),
+}
+
+
+def percentile(latencies: List[float], percent: int) -> float:
+    if len(latencies) < 2:
+        return latencies[0] if latencies else 0.0
+    return statistics.quantiles(latencies, n=100, method="inclusive")[percent - 1]
+
+
+async def run_scenario(
+    client: httpx.AsyncClient,
+    fixtures: Fixtures,
+    send: Request,
+    requests: int,
+    concurrency: int,
+    count: bool,
+) -> Dict[str, Any]:
+    latencies: List[float] = []
+    queries: List[int] = []
+    errors = 0
+    indexes = iter(range(requests))
+
+    async def worker():
+        nonlocal errors
+        for index in indexes:
+            started = time.perf_counter()
+            try:
+                response = await send(client, fixtures, index)
+                failed = response.status_code >= 400
+                if count:
+                    queries.append(int(response.headers.get(QUERIES_HEADER, 0)))
+            except httpx.HTTPError:
+                failed = True
+            latencies.append(time.perf_counter() - started)
+            errors += failed
+
+    started = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    elapsed = time.perf_counter() - started
+
+    return {
+        "requests": requests,
+        "errors": errors,
+        "rps": round(requests / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        "queries_per_request": (
+            round(statistics.mean(queries), 2) if count and queries else None
+        ),
+    }
+
+
+async def run(args: argparse.Namespace) -> Dict[str, Any]:
+    from app import app
+
+    random.seed(args.seed)
+    in_process = args.base_url is None
+
+    scenarios = [x for x in SCENARIOS if not args.scenario or x in args.scenario]
+    results: Dict[str, Any] = {}
+    async with app.router.lifespan_context(app):
+        fixtures = await seed(
+            args.tasks,
+            args.labels,
+            args.requests,
+            bulk_deletes="delete_tasks_bulk" in scenarios,
+        )
+        transport = httpx.ASGITransport(app=count_queries(app)) if in_process else None
+        try:
+            async with httpx.AsyncClient(
+                transport=transport,
+                base_url=args.base_url or "http://testserver",
+                cookies={"id": fixtures.token},
+                timeout=args.timeout,
+                limits=httpx.Limits(max_connections=args.concurrency),
+            ) as client:
+                # Authenticate once up front, so the session is cached.
+                await client.get(f"{PREFIX}/labels")
+                for name in scenarios:
+                    results[name] = await run_scenario(
+                        client,
+                        fixtures,
+                        SCENARIOS[name],
+                        args.requests,
+                        args.concurrency,
+                        count=in_process,
+                    )
+                    print(format_result(name, results[name]), file=sys.stderr)
+        finally:
+            if not args.keep_data:
+                await clean_up(fixtures)
+
+    return {
+        "config": {
+            "concurrency": args.concurrency,
+            "requests": args.requests,
+            "tasks": args.tasks,
+            "labels": args.labels,
+            "seed": args.seed,
+            "base_url": args.base_url,
+        },
+        "results": results,
+    }
+
+
+def format_result(name: str, result: Dict[str, Any]) -> str:
+    queries = result["queries_per_request"]
+    return (
+        f"{name:<24} {result['rps']:>9.1f} rps  "
+        f"p50 {result['p50_ms']:>8.2f}ms  p95 {result['p95_ms']:>8.2f}ms  "
+        f"p99 {result['p99_ms']:>8.2f}ms  "
+        f"queries {'-' if queries is None else queries:>5}  "
+        f"errors {result['errors']}"
+    )
+
+
+def compare(
+    results: Dict[str, Any], baseline: Dict[str, Any], tolerance: float
+) -> List[str]:
+    """
+    Returns the endpoints which are slower, or run more queries, than in the
+    baseline by more than ``tolerance``.
+    """
+    regressions = []
+    for name, result in results["results"].items():
+        previous = baseline["results"].get(name)
+        if previous is None:
+            continue
+        if result["p95_ms"] > previous["p95_ms"] * (1 + tolerance):
+            regressions.append(
+                f"{name}: p95 {previous['p95_ms']}ms -> {result['p95_ms']}ms"
+            )
+        if result["rps"] < previous["rps"] * (1 - tolerance):
+            regressions.append(f"{name}: {previous['rps']} -> {result['rps']} rps")
+        queries, previous_queries = (
+            result["queries_per_request"],
+            previous["queries_per_request"],
+        )
+        if None not in (queries, previous_queries) and queries > previous_queries:
+            regressions.append(f"{name}: {previous_queries} -> {queries} queries")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument(
+        "--requests", type=int, default=200, help="Requests per scenario."
+    )
+    parser.add_argument(
+        "--tasks", type=int, default=1000, help="Tasks seeded for the user."
+    )
+    parser.add_argument("--labels", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument(
+        "--scenario",
+        action="append",
+        choices=list(SCENARIOS),
+        help="Only run this scenario - can be repeated.",
+    )
+    parser.add_argument("--base-url", help="Benchmark a running server instead.")
+    parser.add_argument("--output", help="Write the results as JSON to this file.")
+    parser.add_argument("--baseline", help="Results to check for regressions.")
+    parser.add_argument("--tolerance", type=float, default=0.1)
+    parser.add_argument("--keep-data", action="store_true")
+    args = parser.parse_args()
+    scenarios = args.scenario or SCENARIOS
+    for scenario, needed in [
+        ("restore_task", "delete_task"),
+        ("delete_label", "create_label"),
+    ]:
+        if scenario in scenarios and needed not in scenarios:
+            parser.error(f"{scenario} needs the {needed} scenario")
+
+    results = asyncio.run(run(args))
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    else:
+        print(output)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"Regression - {regression}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+Compares encoding a page of task rows through the ``response_model``, as
+FastAPI does by default, with encoding them directly with
+``ORJSONResponse``.
+
+Run with ``python -m benchmarks.serialization``.
+"""
+
+import argparse
+import asyncio
+import datetime
+import timeit
+from typing import List
+
+from fastapi.responses import JSONResponse, ORJSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+
+from tasks.tables import Task
+from tasks.types.task import TaskModelOut
+
+
+def make_rows(count: int) -> List[dict]:
+    statuses = list(Task.Status)
+    return [
+        {
+            "id": i,
+            "name": f"Task {i}",
+            "description": "Lorem ipsum dolor sit amet " * 4,
+            "assignee_id": 1,
+            "status": statuses[i % len(statuses)].value,
+            "parent_task": i // 10 or None,
+            "date_due": datetime.date(2024, 6, 1) + datetime.timedelta(days=i % 365),
+        }
+        for i in range(count)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    rows = make_rows(args.rows)
+    field = create_response_field(name="response", type_=List[TaskModelOut])
+    loop = asyncio.new_event_loop()
+
+    def validated() -> bytes:
+        content = loop.run_until_complete(
+            serialize_response(field=field, response_content=rows)
+        )
+        return JSONResponse(content).body
+
+    def direct() -> bytes:
+        return ORJSONResponse(rows).body
+
+    for name, encode in [("response_model", validated), ("orjson", direct)]:
+        seconds = min(timeit.repeat(encode, number=args.repeat, repeat=3))
+        print(
+            f"{name:>15}: {seconds / args.repeat * 1000:.2f} ms "
+            f"per {args.rows} rows"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,16 +1,43 @@
 import os
-from piccolo.engine.postgres import PostgresEngine
 from piccolo.conf.apps import AppRegistry
+from tasks.engine import InstrumentedPostgresEngine
+from tasks.replicas import replica_configs
+from tasks.slow_queries import slow_query_log_from_env
 
 
-DB = PostgresEngine(
-    config={
-        "database": os.environ.get("POSTGRES_DB_NAME", "task_manager"),
-        "user": os.environ.get("POSTGRES_DB_USER", "task_manager"),
-        "password": os.environ.get("POSTGRES_DB_USER_PASSWORD", "task_manager"),
-        "host": os.environ.get("POSTGRESQL_DB_HOST", "localhost"),
-        "port": int(os.environ.get("POSTGRESQL_DB_PORT", "5432")),
-    }
+DB_CONFIG = {
+    "database": os.environ.get("POSTGRES_DB_NAME", "task_manager"),
+    "user": os.environ.get("POSTGRES_DB_USER", "task_manager"),
+    "password": os.environ.get("POSTGRES_DB_USER_PASSWORD", "task_manager"),
+    "host": os.environ.get("POSTGRESQL_DB_HOST", "localhost"),
+    "port": int(os.environ.get("POSTGRESQL_DB_PORT", "5432")),
+    # Set to 0 when connecting through a transaction pooler like PgBouncer.
+    "statement_cache_size": int(os.environ.get("DB_STATEMENT_CACHE_SIZE", "100")),
+}
+
+POOL_CONFIG = {
+    "min_size": int(os.environ.get("DB_POOL_MIN_SIZE", "10")),
+    "max_size": int(os.environ.get("DB_POOL_MAX_SIZE", "10")),
+    "max_queries": int(os.environ.get("DB_POOL_MAX_QUERIES", "50000")),
+    "max_inactive_connection_lifetime": float(
+        os.environ.get("DB_POOL_MAX_IDLE_LIFETIME", "300")
+    ),
+}
+
+DB = InstrumentedPostgresEngine(
+    config=DB_CONFIG,
+    pool_config=POOL_CONFIG,
+    slow_query_log=slow_query_log_from_env(os.environ),
+    # Read only routes are spread across these - see ``tasks.replicas``.
+    extra_nodes={
+        # Replicas are read only, so can't create the extensions.
+        f"replica_{index}": InstrumentedPostgresEngine(
+            config=config, pool_config=POOL_CONFIG, extensions=()
+        )
+        for index, config in enumerate(
+            replica_configs(DB_CONFIG, os.environ.get("DB_REPLICA_HOSTS"))
+        )
+    },
 )
 
 APP_REGISTRY = AppRegistry(
@@ -1,7 +1,7 @@
 from piccolo_conf import *  # noqa
 
 
-DB = PostgresEngine(
+DB = InstrumentedPostgresEngine(
     config={
         "database": "task_manager_test",
         "user": "task_manager",
@@ -0,0 +1,184 @@
+import asyncio
+import datetime
+import hashlib
+import logging
+from typing import Optional, Set, Tuple, Type
+
+from piccolo_api.session_auth.endpoints import SessionLogoutEndpoint, session_logout
+from piccolo_api.session_auth.middleware import SessionsAuthBackend
+from piccolo_api.session_auth.tables import SessionsBase
+from starlette.authentication import AuthCredentials, AuthenticationBackend, BaseUser
+from starlette.requests import HTTPConnection, Request
+from starlette.responses import Response
+
+from tasks.cache import TTLCache
+from tasks.notifications import listener
+
+logger = logging.getLogger(__name__)
+
+SESSION_REVOKED_CHANNEL = "session_revoked"
+
+AuthResult = Tuple[AuthCredentials, BaseUser]
+
+
+def hash_token(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+class CachedSessionsAuthBackend(AuthenticationBackend):
+    """
+    Wraps ``SessionsAuthBackend``, caching the user for each session token,
+    so most requests don't touch the database.
+
+    Rather than extending the session expiry on every request, the tokens
+    which were used are collected, and extended together by a periodic bulk
+    ``UPDATE``.
+
+    Cached sessions are revoked straight away on logout - in other processes
+    too, via the ``session_revoked`` notification. Any other change, such as
+    a user being deactivated, is picked up once the entry expires after
+    ``ttl``. While the notification listener is disconnected the cache is
+    bypassed, and it's cleared when the listener reconnects.
+    """
+
+    def __init__(
+        self,
+        increase_expiry: Optional[datetime.timedelta] = None,
+        ttl: datetime.timedelta = datetime.timedelta(seconds=60),
+        max_size: int = 10000,
+        flush_interval: datetime.timedelta = datetime.timedelta(seconds=30),
+        session_table: Type[SessionsBase] = SessionsBase,
+        **kwargs,
+    ):
+        """
+        :param increase_expiry:
+            As for ``SessionsAuthBackend`` - sessions which are used, and are
+            within this amount of expiring, are extended by it.
+        :param ttl:
+            How long a session is cached for.
+        :param max_size:
+            The maximum number of sessions to cache.
+        :param flush_interval:
+            How often to extend the expiry of the sessions which were used.
+        :param kwargs:
+            Passed on to ``SessionsAuthBackend``.
+
+        """
+        super().__init__()
+        self.backend = SessionsAuthBackend(
+            session_table=session_table, increase_expiry=None, **kwargs
+        )
+        self.session_table = session_table
+        self.increase_expiry = increase_expiry
+        self.flush_interval = flush_interval
+        self._cache: TTLCache[str, AuthResult] = TTLCache(
+            max_size=max_size, ttl=ttl.total_seconds()
+        )
+        self._generation = 0
+        self._used_tokens: Set[str] = set()
+        self._flush_task: Optional[asyncio.Task] = None
+        listener.subscribe(SESSION_REVOKED_CHANNEL, self._on_revoked)
+
+    async def authenticate(self, conn: HTTPConnection) -> Optional[AuthResult]:
+        token = conn.cookies.get(self.backend.cookie_name)
+        if not token:
+            return await self.backend.authenticate(conn)
+
+        token_hash = hash_token(token)
+        # Without the listener, revocations from other processes are missed.
+        if not listener.is_listening:
+            result = await self.backend.authenticate(conn)
+        else:
+            result = self._cache.get(token_hash)
+            if result is None:
+                generation = self._generation
+                result = await self.backend.authenticate(conn)
+                if (
+                    result is not None
+                    and result[1].is_authenticated
+                    and generation == self._generation
+                ):
+                    self._cache.set(token_hash, result)
+
+        if self.increase_expiry is not None:
+            self._used_tokens.add(token)
+        return result
+
+    async def revoke(self, token: str) -> None:
+        """
+        Removes the session from this process' cache, and tells the other
+        processes to do the same.
+        """
+        token_hash = hash_token(token)
+        self._cache.pop(token_hash)
+        self._used_tokens.discard(token)
+        await self.session_table.raw(
+            "SELECT pg_notify({}, {})", SESSION_REVOKED_CHANNEL, token_hash
+        )
+
+    def _on_revoked(self, token_hash: Optional[str]) -> None:
+        if token_hash is None:
+            # Notifications may have been missed.
+            self._generation += 1
+            self._cache.clear()
+        else:
+            self._cache.pop(token_hash)
+
+    async def flush(self) -> None:
+        """
+        Extends the expiry of every session used since the last flush, with a
+        single ``UPDATE``. As with ``SessionsBase.get_user_id``, only
+        sessions which are close to expiring are extended.
+        """
+        if not self._used_tokens or self.increase_expiry is None:
+            return
+        tokens, self._used_tokens = list(self._used_tokens), set()
+        now = datetime.datetime.now()
+        tablename = self.session_table._meta.get_formatted_tablename()
+        await self.session_table.raw(
+            f"UPDATE {tablename} SET expiry_date = expiry_date + {{}} "
+            "WHERE token = ANY({}) AND expiry_date > {} "
+            "AND max_expiry_date > {} AND expiry_date < {}",
+            self.increase_expiry,
+            tokens,
+            now,
+            now,
+            now + self.increase_expiry,
+        )
+
+    async def _flush_periodically(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval.total_seconds())
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("Unable to extend the session expiry")
+
+    async def start(self) -> None:
+        if self._flush_task is None:
+            self._flush_task = asyncio.ensure_future(self._flush_periodically())
+
+    async def stop(self) -> None:
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            self._flush_task = None
+        await self.flush()
+
+
+def cached_session_logout(
+    backend: CachedSessionsAuthBackend, **kwargs
+) -> Type[SessionLogoutEndpoint]:
+    """
+    Wraps ``session_logout``, so the session is also revoked from the
+    ``CachedSessionsAuthBackend`` caches.
+    """
+
+    class _CachedSessionLogoutEndpoint(session_logout(**kwargs)):  # type: ignore
+        async def post(self, request: Request) -> Response:
+            token = request.cookies.get(self._cookie_name, None)
+            response = await super().post(request)
+            if token:
+                await backend.revoke(token)
+            return response
+
+    return _CachedSessionLogoutEndpoint
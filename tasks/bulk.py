@@ -0,0 +1,20 @@
+from typing import List, Type
+
+from piccolo.table import Table
+
+
+async def reserve_ids(table: Type[Table], count: int) -> List[int]:
+    """
+    Takes ``count`` ids from the table's sequence. COPY can't return the
+    generated ids, so they're reserved up front, which also lets the copied
+    rows reference each other.
+    """
+    if count == 0:
+        return []
+    rows = await table.raw(
+        "SELECT nextval(pg_get_serial_sequence({}, 'id')) AS id "
+        "FROM generate_series(1, {})",
+        table._meta.tablename,
+        count,
+    )
+    return [x["id"] for x in rows]
@@ -0,0 +1,118 @@
+import hashlib
+import os
+import time
+from collections import OrderedDict
+from typing import Dict, Generic, Hashable, Optional, Tuple, TypeVar
+
+import orjson
+
+from tasks.notifications import listener
+from tasks.tables import Label
+
+LABEL_CHANNEL = "label_changed"
+LISTING_CACHE_SIZE = int(os.environ.get("LISTING_CACHE_SIZE", "1000"))
+LISTING_CACHE_TTL = float(os.environ.get("LISTING_CACHE_TTL", "60"))
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+
+class TTLCache(Generic[K, V]):
+    """
+    A least recently used cache, holding at most ``max_size`` entries, each
+    of which expires ``ttl`` seconds after it was set.
+    """
+
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: "OrderedDict[K, Tuple[float, V]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: K) -> Optional[V]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: K, value: V) -> None:
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def pop(self, key: K) -> None:
+        self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+
+class LabelCache:
+    """
+    A process-local copy of the serialised label list, and its ETag.
+
+    It's invalidated directly by this process' label writes, and by the
+    ``label_changed`` notification, which a trigger on the ``label`` table
+    sends on every change - so edits from other workers, or from the admin,
+    are also picked up. The cache is only used while the notification
+    listener is connected, otherwise every call reads from the database.
+    """
+
+    def __init__(self):
+        self._entry: Optional[Tuple[bytes, str]] = None
+        self._generation = 0
+
+    def invalidate(self, payload: Optional[str] = None) -> None:
+        self._generation += 1
+        self._entry = None
+
+    async def get(self) -> Tuple[bytes, str]:
+        if self._entry is not None and listener.is_listening:
+            return self._entry
+
+        generation = self._generation
+        labels = await Label.select().order_by(Label.id)
+        body = orjson.dumps(labels)
+        entry = (body, f'"{hashlib.sha256(body).hexdigest()}"')
+        # Don't store the result if a write happened while it was loading.
+        if generation == self._generation:
+            self._entry = entry
+        return entry
+
+
+label_cache = LabelCache()
+listener.subscribe(LABEL_CHANNEL, label_cache.invalidate)
+
+
+# A (user id, task version, path and query string) key.
+ListingKey = Tuple[int, int, str]
+
+# The encoded pages of task listings, and their headers. A write bumps the
+# user's version, so the old entries are never used again, and age out.
+listing_cache: TTLCache[ListingKey, Tuple[bytes, Dict[str, str]]] = TTLCache(
+    max_size=LISTING_CACHE_SIZE, ttl=LISTING_CACHE_TTL
+)
+
+
+def listing_etag(key: ListingKey) -> str:
+    digest = hashlib.sha256(repr(key).encode()).hexdigest()[:32]
+    return f'"{key[1]}-{digest}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """
+    Whether an ``If-None-Match`` header matches ``etag``, using the weak
+    comparison that RFC 9110 specifies for this header.
+    """
+    if not if_none_match:
+        return False
+    candidates = {x.strip().removeprefix("W/") for x in if_none_match.split(",")}
+    return "*" in candidates or etag.removeprefix("W/") in candidates
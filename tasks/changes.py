@@ -0,0 +1,110 @@
+import asyncio
+import json
+import os
+from collections import defaultdict
+from typing import AsyncIterator, DefaultDict, Optional, Set
+
+from fastapi import APIRouter
+from fastapi.requests import Request
+from fastapi.responses import StreamingResponse
+
+from tasks.notifications import listener
+
+CHANGES_CHANNEL = "changes"
+CHANGE_EVENT_SETTING = "task_manager.change_event"
+HEARTBEAT_INTERVAL = float(os.environ.get("CHANGE_FEED_HEARTBEAT", "15"))
+QUEUE_SIZE = 100
+
+# Tells the client that events may have been missed, so it should fetch
+# everything again.
+RESET = b"event: reset\ndata: {}\n\n"
+
+router = APIRouter()
+
+
+def format_event(table: str, event: str, payload: str) -> bytes:
+    return f"event: {table}.{event}\ndata: {payload}\n\n".encode()
+
+
+class ChangeFeed:
+    """
+    Fans out the ``changes`` notifications, which triggers on the ``task``,
+    ``task_label`` and ``label`` tables send, to the subscribers of the user
+    they concern. Label changes go to everyone.
+
+    Each subscriber has a bounded queue of server-sent events. If a
+    subscriber falls too far behind, or the listener loses its connection,
+    its queue is replaced with a single reset event.
+    """
+
+    def __init__(self, queue_size: int = QUEUE_SIZE):
+        self.queue_size = queue_size
+        self._queues: DefaultDict[int, Set[asyncio.Queue]] = defaultdict(set)
+
+    def subscribe(self, user_id: int) -> asyncio.Queue:
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        self._queues[user_id].add(queue)
+        return queue
+
+    def unsubscribe(self, user_id: int, queue: asyncio.Queue) -> None:
+        queues = self._queues.get(user_id)
+        if queues is not None:
+            queues.discard(queue)
+            if not queues:
+                del self._queues[user_id]
+
+    def publish(self, payload: Optional[str]) -> None:
+        if payload is None:
+            for queues in self._queues.values():
+                for queue in queues:
+                    self._put(queue, RESET)
+            return
+
+        change = json.loads(payload)
+        message = format_event(change["table"], change["event"], payload)
+        if change["user_id"] is None:
+            queues = set().union(*self._queues.values())
+        else:
+            queues = self._queues.get(change["user_id"], set())
+        for queue in queues:
+            self._put(queue, message)
+
+    def _put(self, queue: asyncio.Queue, message: bytes) -> None:
+        try:
+            queue.put_nowait(message)
+        except asyncio.QueueFull:
+            while not queue.empty():
+                queue.get_nowait()
+            queue.put_nowait(RESET)
+
+    async def stream(self, user_id: int) -> AsyncIterator[bytes]:
+        queue = self.subscribe(user_id)
+        try:
+            # Sent straight away, so the client knows it's connected.
+            yield b": connected\n\n"
+            while True:
+                try:
+                    yield await asyncio.wait_for(queue.get(), HEARTBEAT_INTERVAL)
+                except asyncio.TimeoutError:
+                    yield b": heartbeat\n\n"
+        finally:
+            self.unsubscribe(user_id, queue)
+
+
+change_feed = ChangeFeed()
+listener.subscribe(CHANGES_CHANNEL, change_feed.publish)
+
+
+@router.get("/changes")
+async def stream_changes(request: Request) -> StreamingResponse:
+    """
+    A server-sent event stream of the changes to the current user's tasks,
+    and to labels. Each event is named ``<table>.<event>`` - such as
+    ``task.created`` or ``task_label.deleted`` - and its data has the ids of
+    the changed rows. After a ``reset`` event, refetch everything.
+    """
+    return StreamingResponse(
+        change_feed.stream(request.user.user_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
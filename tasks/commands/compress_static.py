@@ -0,0 +1,31 @@
+import os
+
+from tasks.compression import STATIC_SUFFIXES, compressible_files, static_variants
+
+
+def compress_static(directory: str = "static"):
+    """
+    Writes a ``.gz``, ``.br`` and ``.zst`` copy of each compressible file in
+    ``directory``, which ``PrecompressedStaticFiles`` serves instead of
+    compressing the file on every request. Run it whenever the files
+    change - copies older than their file are ignored.
+
+    :param directory:
+        The directory served at ``/static/``.
+
+    """
+    written = 0
+    for path in compressible_files(directory):
+        with open(path, "rb") as file:
+            data = file.read()
+        for encoding, compressed in static_variants(data).items():
+            variant = f"{path}{STATIC_SUFFIXES[encoding]}"
+            # Not worth serving if it isn't any smaller.
+            if len(compressed) >= len(data):
+                if os.path.exists(variant):
+                    os.remove(variant)
+                continue
+            with open(variant, "wb") as file:
+                file.write(compressed)
+            written += 1
+    print(f"Wrote {written} compressed files")
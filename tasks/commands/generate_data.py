@@ -0,0 +1,250 @@
+import datetime
+import json
+import random
+import time
+from typing import Any, Dict, List, Sequence, Tuple, Type
+
+from piccolo.apps.user.tables import BaseUser
+from piccolo.table import Table
+
+from tasks.bulk import reserve_ids
+from tasks.tables import Label, Task, TaskHistory, TaskLabel
+
+# Rows are generated and copied a batch of users at a time, to bound memory.
+ROWS_PER_BATCH = 50000
+
+STATUS_WEIGHTS = {
+    Task.Status.pending: 3,
+    Task.Status.doing: 2,
+    Task.Status.blocked: 1,
+    Task.Status.done: 4,
+}
+
+
+async def copy_rows(
+    table: Type[Table], columns: Sequence[str], records: List[Tuple]
+) -> None:
+    if not records:
+        return
+    async with table._meta.db.transaction() as transaction:
+        await transaction.connection.copy_records_to_table(
+            table._meta.tablename, columns=list(columns), records=records
+        )
+
+
+class Generator:
+    """
+    Generates the rows for one batch of users. Everything is drawn from
+    ``rng``, so the same seed always produces the same data.
+    """
+
+    def __init__(
+        self,
+        rng: random.Random,
+        today: datetime.date,
+        tree_depth: int,
+        label_ids: List[int],
+        labels_per_task: int,
+    ):
+        self.rng = rng
+        self.today = today
+        self.tree_depth = tree_depth
+        self.label_ids = label_ids
+        self.labels_per_task = labels_per_task
+        # Popular labels are used much more than the rest.
+        self.label_weights = [1 / (rank + 1) for rank in range(len(label_ids))]
+
+    def status(self) -> str:
+        return self.rng.choices(
+            list(STATUS_WEIGHTS), weights=list(STATUS_WEIGHTS.values())
+        )[0].value
+
+    def date_due(self, parent_due: Any) -> Any:
+        if self.rng.random() < 0.3:
+            return None
+        due = self.today + datetime.timedelta(days=self.rng.randint(-30, 90))
+        # Subtasks are due before the task they belong to.
+        if parent_due is not None and due > parent_due:
+            due = parent_due - datetime.timedelta(days=self.rng.randint(0, 7))
+        return due
+
+    def tasks(self, user_id: int, task_ids: List[int]) -> List[Dict[str, Any]]:
+        """
+        About a third of the tasks are top level, and the rest are subtasks
+        of an earlier task, down to ``tree_depth`` levels.
+        """
+        tasks: List[Dict[str, Any]] = []
+        nestable: List[Tuple[int, int]] = []
+        for task_id in task_ids:
+            parent = None
+            depth = 0
+            if nestable and self.rng.random() > 0.35:
+                index, depth = self.rng.choice(nestable)
+                parent = tasks[index]
+                depth += 1
+            task = {
+                "id": task_id,
+                "name": f"Task {task_id}",
+                "description": self.rng.choice(
+                    [None, f"Description of task {task_id}"]
+                ),
+                "assignee_id": user_id,
+                "status": self.status(),
+                "parent_task": parent["id"] if parent else None,
+                "date_due": self.date_due(parent["date_due"] if parent else None),
+            }
+            if depth < self.tree_depth:
+                nestable.append((len(tasks), depth))
+            tasks.append(task)
+        return tasks
+
+    def task_labels(self, task_id: int) -> List[int]:
+        if not self.label_ids:
+            return []
+        count = min(self.rng.randint(0, self.labels_per_task * 2), len(self.label_ids))
+        labels: Dict[int, None] = {}
+        while len(labels) < count:
+            label_id = self.rng.choices(self.label_ids, weights=self.label_weights)
+            labels[label_id[0]] = None
+        return list(labels)
+
+    def deleted_on(self) -> datetime.datetime:
+        return datetime.datetime.combine(
+            self.today, datetime.time()
+        ) - datetime.timedelta(seconds=self.rng.randint(0, 365 * 24 * 60 * 60))
+
+
+async def generate_data(
+    users: int = 10,
+    tasks_per_user: int = 1000,
+    tree_depth: int = 3,
+    labels: int = 50,
+    labels_per_task: int = 2,
+    deleted_per_user: int = 100,
+    seed: int = 0,
+    prefix: str = "generated",
+):
+    """
+    Bulk loads a realistic data set with COPY, for benchmarks and query plan
+    work.
+
+    :param users:
+        The number of users to create.
+    :param tasks_per_user:
+        The number of tasks assigned to each user.
+    :param tree_depth:
+        How many levels of subtasks there can be below a top level task.
+    :param labels:
+        The number of labels to create.
+    :param labels_per_task:
+        The average number of labels on each task.
+    :param deleted_per_user:
+        The number of deleted tasks in each user's history.
+    :param seed:
+        The same seed always generates the same data, with its dates
+        relative to the current date.
+    :param prefix:
+        Prepended to the usernames and label terms, so the generated rows are
+        easy to tell apart.
+
+    """
+    started = time.monotonic()
+    rng = random.Random(seed)
+    today = datetime.date.today()
+
+    # The history covers the last year, so give each month its partition
+    # rather than leaving the rows in the default one.
+    await TaskHistory.raw(
+        "SELECT create_task_history_partition(month) FROM generate_series("
+        "{}::timestamp, {}::timestamp, interval '1 month') month",
+        today - datetime.timedelta(days=365),
+        today,
+    )
+
+    label_ids = await reserve_ids(Label, labels)
+    await copy_rows(
+        Label,
+        ["id", "term", "description"],
+        [(id, f"{prefix}-label-{id}", None) for id in label_ids],
+    )
+
+    # Hashing is deliberately slow, so every user shares one password.
+    password = BaseUser.hash_password("password")
+    generator = Generator(rng, today, tree_depth, label_ids, labels_per_task)
+    users_per_batch = max(ROWS_PER_BATCH // max(tasks_per_user, 1), 1)
+    totals = {"users": 0, "tasks": 0, "task labels": 0, "deleted tasks": 0}
+
+    for batch_start in range(0, users, users_per_batch):
+        batch_size = min(users_per_batch, users - batch_start)
+        user_ids = await reserve_ids(BaseUser, batch_size)
+        await copy_rows(
+            BaseUser,
+            ["id", "username", "password", "email", "active"],
+            [
+                (
+                    id,
+                    f"{prefix}-user-{id}",
+                    password,
+                    f"{prefix}-{id}@example.com",
+                    True,
+                )
+                for id in user_ids
+            ],
+        )
+
+        task_ids = await reserve_ids(
+            Task, batch_size * (tasks_per_user + deleted_per_user)
+        )
+        tasks: List[Dict[str, Any]] = []
+        history: List[Tuple] = []
+        for index, user_id in enumerate(user_ids):
+            start = index * (tasks_per_user + deleted_per_user)
+            tasks += generator.tasks(user_id, task_ids[start : start + tasks_per_user])
+            for deleted in generator.tasks(
+                user_id,
+                task_ids[
+                    start + tasks_per_user : start + tasks_per_user + deleted_per_user
+                ],
+            ):
+                deleted["parent_task"] = None
+                serialized = {
+                    **deleted,
+                    "date_due": deleted["date_due"] and deleted["date_due"].isoformat(),
+                }
+                history.append(
+                    (
+                        deleted["id"],
+                        json.dumps(serialized),
+                        generator.deleted_on(),
+                        user_id,
+                    )
+                )
+
+        await copy_rows(
+            Task,
+            [x._meta.db_column_name for x in Task._meta.columns],
+            [tuple(row[x._meta.name] for x in Task._meta.columns) for row in tasks],
+        )
+
+        task_labels = [
+            (x["id"], label_id)
+            for x in tasks
+            for label_id in generator.task_labels(x["id"])
+        ]
+        await copy_rows(TaskLabel, ["task", "label"], task_labels)
+        await copy_rows(
+            TaskHistory,
+            ["task_id", "serialized_data", "deleted_on", "deleted_by"],
+            history,
+        )
+
+        totals["users"] += batch_size
+        totals["tasks"] += len(tasks)
+        totals["task labels"] += len(task_labels)
+        totals["deleted tasks"] += len(history)
+        print(f"Loaded {totals['users']} / {users} users")
+
+    await Task.raw("ANALYZE")
+    summary = ", ".join(f"{count} {name}" for name, count in totals.items())
+    elapsed = time.monotonic() - started
+    print(f"Generated {labels} labels, {summary} in {elapsed:.1f}s")
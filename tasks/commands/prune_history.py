@@ -0,0 +1,82 @@
+import datetime
+import re
+from typing import List
+
+from tasks.tables import TaskHistory
+
+PARTITION_NAME = re.compile(r"task_history_(\d{4}_\d{2})")
+DEFAULT_PARTITION = "task_history_default"
+
+
+def add_months(month: datetime.date, months: int) -> datetime.date:
+    index = month.year * 12 + month.month - 1 + months
+    return datetime.date(index // 12, index % 12 + 1, 1)
+
+
+async def history_partitions() -> List[str]:
+    """
+    The monthly partitions attached to ``task_history``, oldest first.
+    """
+    rows = await TaskHistory.raw(
+        "SELECT child.relname AS name FROM pg_inherits "
+        "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+        "WHERE pg_inherits.inhparent = 'task_history'::regclass "
+        "AND child.relname <> {} ORDER BY child.relname",
+        DEFAULT_PARTITION,
+    )
+    return [x["name"] for x in rows]
+
+
+async def prune_history(
+    keep_months: int = 24, archive: bool = False, months_ahead: int = 3
+):
+    """
+    Removes the task history from before the last ``keep_months`` months,
+    a whole monthly partition at a time, so it takes the same time however
+    much history there is. Also creates the partitions for the coming
+    months, so new history doesn't pile up in the default partition - run
+    it at least monthly.
+
+    :param keep_months:
+        How many months of history to keep, including the current one.
+    :param archive:
+        Detach old partitions and rename them ``archived_task_history_*``,
+        rather than dropping them, so they can be backed up first.
+    :param months_ahead:
+        How many months ahead to create partitions for.
+
+    """
+    this_month = datetime.date.today().replace(day=1)
+    cutoff = add_months(this_month, 1 - keep_months)
+
+    await TaskHistory.raw(
+        "SELECT create_task_history_partition(month) FROM generate_series("
+        "{}::timestamp, {}::timestamp, interval '1 month') month",
+        this_month,
+        add_months(this_month, months_ahead),
+    )
+
+    pruned = 0
+    for name in await history_partitions():
+        # Leave any partitions which weren't made by this command alone.
+        match = PARTITION_NAME.fullmatch(name)
+        if match is None:
+            continue
+        month = datetime.datetime.strptime(match.group(1), "%Y_%m").date()
+        if month >= cutoff:
+            continue
+        async with TaskHistory._meta.db.transaction():
+            await TaskHistory.raw(f'ALTER TABLE task_history DETACH PARTITION "{name}"')
+            if archive:
+                await TaskHistory.raw(
+                    f'ALTER TABLE "{name}" RENAME TO "archived_{name}"'
+                )
+            else:
+                await TaskHistory.raw(f'DROP TABLE "{name}"')
+        pruned += 1
+
+    # Only has rows which arrived before their month's partition existed.
+    await TaskHistory.raw(
+        f"DELETE FROM {DEFAULT_PARTITION} WHERE deleted_on < {{}}", cutoff
+    )
+    print(f"{'Archived' if archive else 'Dropped'} {pruned} history partitions")
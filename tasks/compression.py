@@ -0,0 +1,327 @@
+import mimetypes
+import os
+import time
+import zlib
+from typing import Callable, Dict, List, Optional, Sequence
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import NotModifiedResponse, PathLike, StaticFiles
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover
+    zstandard = None
+
+COMPRESSION_MIN_SIZE = int(os.environ.get("COMPRESSION_MIN_SIZE", "500"))
+# The share of one core which compression may use, averaged over a second.
+COMPRESSION_CPU_BUDGET = float(os.environ.get("COMPRESSION_CPU_BUDGET", "0.5"))
+
+COMPRESSIBLE_TYPES = {
+    "application/javascript",
+    "application/json",
+    "image/svg+xml",
+    "image/vnd.microsoft.icon",
+    "image/x-icon",
+}
+# Events have to reach the client as soon as they're sent.
+INCOMPRESSIBLE_TYPES = {"text/event-stream"}
+
+# The file suffix of each precompressed static file variant.
+STATIC_SUFFIXES = {"zstd": ".zst", "br": ".br", "gzip": ".gz"}
+
+
+class Encoder:
+    """
+    Compresses a response body incrementally. ``flush`` returns everything
+    compressed so far, so each streamed chunk can be decoded on arrival.
+    """
+
+    def compress(self, data: bytes) -> bytes:
+        raise NotImplementedError
+
+    def flush(self) -> bytes:
+        raise NotImplementedError
+
+    def finish(self) -> bytes:
+        raise NotImplementedError
+
+
+class GzipEncoder(Encoder):
+    def __init__(self, level: int = 6):
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data)
+
+    def flush(self) -> bytes:
+        return self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        return self._compressor.flush(zlib.Z_FINISH)
+
+
+class BrotliEncoder(Encoder):
+    def __init__(self, quality: int = 4):
+        self._compressor = brotli.Compressor(quality=quality)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.process(data)
+
+    def flush(self) -> bytes:
+        return self._compressor.flush()
+
+    def finish(self) -> bytes:
+        return self._compressor.finish()
+
+
+class ZstdEncoder(Encoder):
+    def __init__(self, level: int = 3):
+        self._compressor = zstandard.ZstdCompressor(level=level).compressobj()
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data)
+
+    def flush(self) -> bytes:
+        return self._compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def finish(self) -> bytes:
+        return self._compressor.flush(zstandard.COMPRESSOBJ_FLUSH_FINISH)
+
+
+# In order of preference - brotli and zstd are only offered when their
+# packages are installed.
+ENCODERS: Dict[str, Callable[[], Encoder]] = {}
+if zstandard is not None:
+    ENCODERS["zstd"] = ZstdEncoder
+if brotli is not None:
+    ENCODERS["br"] = BrotliEncoder
+ENCODERS["gzip"] = GzipEncoder
+
+
+def negotiate(accept_encoding: str, available: Sequence[str]) -> Optional[str]:
+    """
+    Picks the encoding from ``available`` which the ``Accept-Encoding``
+    header gives the highest weight, preferring the earlier ones on a tie.
+    """
+    weights: Dict[str, float] = {}
+    for item in accept_encoding.split(","):
+        name, _, params = item.partition(";")
+        weight = 1.0
+        key, _, value = params.partition("=")
+        if key.strip().lower() == "q":
+            try:
+                weight = float(value)
+            except ValueError:
+                weight = 0.0
+        weights[name.strip().lower()] = weight
+
+    default = weights.get("*", 0.0)
+    best, best_weight = None, 0.0
+    for encoding in available:
+        weight = weights.get(encoding, default)
+        if weight > best_weight:
+            best, best_weight = encoding, weight
+    return best
+
+
+def is_compressible(media_type: str) -> bool:
+    media_type = media_type.partition(";")[0].strip().lower()
+    if media_type in INCOMPRESSIBLE_TYPES:
+        return False
+    return (
+        media_type.startswith("text/")
+        or media_type.endswith("+json")
+        or media_type in COMPRESSIBLE_TYPES
+    )
+
+
+class CpuBudget:
+    """
+    Limits the time spent compressing to ``fraction`` of each ``window``
+    seconds. Once it's spent, new responses go out uncompressed until the
+    next window, so compression can't starve request handling under load.
+    """
+
+    def __init__(self, fraction: float, window: float = 1.0):
+        self.limit = fraction * window
+        self.window = window
+        self._window_start = time.monotonic()
+        self._spent = 0.0
+
+    def _roll(self) -> None:
+        now = time.monotonic()
+        if now - self._window_start >= self.window:
+            self._window_start = now
+            self._spent = 0.0
+
+    def available(self) -> bool:
+        self._roll()
+        return self._spent < self.limit
+
+    def spend(self, seconds: float) -> None:
+        self._roll()
+        self._spent += seconds
+
+
+class CompressionMiddleware:
+    """
+    Compresses responses with the best encoding the client accepts, from
+    zstd, brotli and gzip. Streamed bodies are compressed chunk by chunk, and
+    each chunk is flushed, so they're never buffered.
+
+    Bodies sent in one piece which are shorter than ``minimum_size`` aren't
+    worth compressing, and neither are responses which already have a
+    ``Content-Encoding``, such as the precompressed static files.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        minimum_size: int = COMPRESSION_MIN_SIZE,
+        cpu_budget: float = COMPRESSION_CPU_BUDGET,
+    ):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.budget = CpuBudget(cpu_budget)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        accept_encoding = Headers(scope=scope).get("Accept-Encoding", "")
+        encoding = negotiate(accept_encoding, list(ENCODERS))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message: Optional[Message] = None
+        encoder: Optional[Encoder] = None
+        passthrough = False
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal start_message, encoder, passthrough
+            if message["type"] == "http.response.start":
+                start_message = message
+                return
+            if message["type"] != "http.response.body" or passthrough:
+                if start_message is not None:
+                    # Such as ``http.response.pathsend`` - there's no body to
+                    # compress, so the response goes out as it is.
+                    passthrough = True
+                    await send(start_message)
+                    start_message = None
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if encoder is None:
+                assert start_message is not None
+                headers = MutableHeaders(scope=start_message)
+                if (
+                    start_message["status"] in (204, 304)
+                    or "content-encoding" in headers
+                    or not is_compressible(headers.get("content-type", ""))
+                    or (not more_body and len(body) < self.minimum_size)
+                    or not self.budget.available()
+                ):
+                    passthrough = True
+                    await send(start_message)
+                    await send(message)
+                    return
+
+                encoder = ENCODERS[encoding]()
+                headers["Content-Encoding"] = encoding
+                headers.add_vary_header("Accept-Encoding")
+                if "content-length" in headers:
+                    del headers["Content-Length"]
+
+            started = time.perf_counter()
+            data = encoder.compress(body)
+            data += encoder.flush() if more_body else encoder.finish()
+            self.budget.spend(time.perf_counter() - started)
+
+            if start_message is not None:
+                if not more_body:
+                    headers = MutableHeaders(scope=start_message)
+                    headers["Content-Length"] = str(len(data))
+                await send(start_message)
+                start_message = None
+            await send({**message, "body": data})
+
+        await self.app(scope, receive, send_wrapper)
+
+
+class PrecompressedStaticFiles(StaticFiles):
+    """
+    Serves the ``.zst``, ``.br`` or ``.gz`` copy of a file, made by the
+    ``compress_static`` command, when there is one and the client accepts
+    that encoding.
+    """
+
+    def file_response(
+        self,
+        full_path: PathLike,
+        stat_result: os.stat_result,
+        scope: Scope,
+        status_code: int = 200,
+    ) -> Response:
+        request_headers = Headers(scope=scope)
+        accept_encoding = request_headers.get("Accept-Encoding", "")
+        variants: Dict[str, os.stat_result] = {}
+        for encoding, suffix in STATIC_SUFFIXES.items():
+            try:
+                variant = os.stat(f"{full_path}{suffix}")
+            except OSError:
+                continue
+            # Ignore copies left over from an older version of the file.
+            if variant.st_mtime >= stat_result.st_mtime:
+                variants[encoding] = variant
+
+        encoding = negotiate(accept_encoding, list(variants))
+        if encoding is None:
+            return super().file_response(full_path, stat_result, scope, status_code)
+
+        response = FileResponse(
+            f"{full_path}{STATIC_SUFFIXES[encoding]}",
+            status_code=status_code,
+            stat_result=variants[encoding],
+            media_type=mimetypes.guess_type(str(full_path))[0] or "text/plain",
+            headers={"Content-Encoding": encoding, "Vary": "Accept-Encoding"},
+        )
+        if self.is_not_modified(response.headers, request_headers):
+            return NotModifiedResponse(response.headers)
+        return response
+
+
+def static_variants(data: bytes) -> Dict[str, bytes]:
+    """
+    Compresses ``data`` as much as each encoding allows, as static files are
+    only compressed once.
+    """
+    variants: Dict[str, bytes] = {"gzip": zlib.compress(data, 9, zlib.MAX_WBITS | 16)}
+    if brotli is not None:
+        variants["br"] = brotli.compress(data, quality=11)
+    if zstandard is not None:
+        variants["zstd"] = zstandard.ZstdCompressor(level=19).compress(data)
+    return variants
+
+
+def compressible_files(directory: str) -> List[str]:
+    paths = []
+    for root, _, files in os.walk(directory):
+        for name in files:
+            if os.path.splitext(name)[1] in STATIC_SUFFIXES.values():
+                continue
+            media_type = mimetypes.guess_type(name)[0]
+            if media_type and is_compressible(media_type):
+                paths.append(os.path.join(root, name))
+    return sorted(paths)
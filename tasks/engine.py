@@ -0,0 +1,140 @@
+from contextlib import asynccontextmanager
+import logging
+import re
+import time
+from typing import Any, AsyncIterator, Dict, List, Optional, Union
+
+import asyncpg
+from piccolo.engine.postgres import PostgresEngine, PostgresTransaction
+from piccolo.querystring import QueryString
+
+from tasks.metrics import record_pool_wait, record_query
+from tasks.slow_queries import SlowQueryLog
+
+logger = logging.getLogger(__name__)
+
+PARAMETER = re.compile(r"\$(\d+)")
+
+
+class InstrumentedPostgresTransaction(PostgresTransaction):
+    __slots__ = ()
+
+    async def get_connection(self):
+        if self.engine.pool:
+            return await self.engine.acquire()
+        return await self.engine.get_new_connection()
+
+
+class InstrumentedPostgresEngine(PostgresEngine):
+    """
+    Times every query run through piccolo, for ``tasks.metrics`` and the
+    slow query log. Statements which bypass piccolo, such as ``COPY``,
+    aren't included.
+
+    :param pool_config:
+        Passed to ``asyncpg.create_pool`` - such as ``min_size`` and
+        ``max_size``.
+    :param slow_query_log:
+        Statements slower than its threshold are written to it.
+
+    """
+
+    def __init__(
+        self,
+        *args,
+        pool_config: Optional[Dict[str, Any]] = None,
+        slow_query_log: Optional[SlowQueryLog] = None,
+        **kwargs,
+    ):
+        super().__init__(*args, **kwargs)
+        self.pool_config = pool_config or {}
+        self.slow_query_log = slow_query_log
+        # Prepared on every new pool connection - see ``hot_statements``.
+        self.prepared_statements: List[str] = []
+
+    async def start_connection_pool(self, **kwargs) -> None:
+        """
+        The pool opens ``min_size`` connections straight away, each with the
+        ``prepared_statements`` already in its statement cache.
+        """
+        await super().start_connection_pool(
+            **{"init": self._prepare_statements, **self.pool_config, **kwargs}
+        )
+
+    async def _prepare_statements(self, connection: asyncpg.Connection) -> None:
+        """
+        Runs each statement once, with every parameter ``NULL``, which adds
+        it to the statement cache that ``fetch`` uses. The statements are
+        expected to be read only, but they're rolled back regardless.
+        """
+        for statement in self.prepared_statements:
+            parameters = max(map(int, PARAMETER.findall(statement)), default=0)
+            transaction = connection.transaction()
+            await transaction.start()
+            try:
+                await connection.fetch(statement, *[None] * parameters)
+            except asyncpg.PostgresError:
+                logger.exception("Unable to prepare a statement")
+            finally:
+                await transaction.rollback()
+
+    async def acquire(self) -> asyncpg.Connection:
+        started = time.perf_counter()
+        try:
+            return await self.pool.acquire()
+        finally:
+            record_pool_wait(time.perf_counter() - started)
+
+    @asynccontextmanager
+    async def connection(self) -> AsyncIterator[asyncpg.Connection]:
+        """
+        A connection from the pool, for work which needs more than a single
+        fetch, such as a cursor. It's released however the block exits,
+        including when the task is cancelled.
+        """
+        if not self.pool:
+            connection = await self.get_new_connection()
+            try:
+                yield connection
+            finally:
+                await connection.close()
+            return
+        connection = await self.acquire()
+        try:
+            yield connection
+        finally:
+            await self.pool.release(connection)
+
+    async def _run_in_pool(self, query: str, args=None):
+        if not self.pool:
+            raise ValueError("A pool isn't currently running.")
+        connection = await self.acquire()
+        try:
+            return await connection.fetch(query, *(args or []))
+        finally:
+            await self.pool.release(connection)
+
+    def transaction(self, allow_nested: bool = True) -> PostgresTransaction:
+        return InstrumentedPostgresTransaction(engine=self, allow_nested=allow_nested)
+
+    async def run_querystring(self, querystring: QueryString, in_pool: bool = True):
+        started = time.perf_counter()
+        try:
+            return await super().run_querystring(querystring, in_pool=in_pool)
+        finally:
+            self.record_query(querystring, time.perf_counter() - started)
+
+    async def run_ddl(self, ddl: str, in_pool: bool = True):
+        started = time.perf_counter()
+        try:
+            return await super().run_ddl(ddl, in_pool=in_pool)
+        finally:
+            self.record_query(ddl, time.perf_counter() - started)
+
+    def record_query(self, query: Union[QueryString, str], duration: float) -> None:
+        record_query(duration)
+        if (
+            self.slow_query_log is not None
+            and duration >= self.slow_query_log.threshold
+        ):
+            self.slow_query_log.record(self, query, duration)
@@ -0,0 +1,279 @@
+import bisect
+import contextvars
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple, TypeVar
+
+from piccolo.engine import engine_finder
+from starlette.requests import Request
+from starlette.responses import Response
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.5, 1.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 25, 50, 100)
+
+LabelValues = Tuple[str, ...]
+M = TypeVar("M", bound="Metric")
+
+
+def escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{escape(value)}"' for name, value in zip(names, values))
+    return f"{{{pairs}}}"
+
+
+class Metric:
+    """
+    A minimal Prometheus metric. Updates only touch a dict, so they're cheap
+    enough to make on every request - the text format is only built when
+    ``/metrics`` is scraped.
+    """
+
+    type = "untyped"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+
+    def samples(self) -> Iterable[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.type}",
+            *self.samples(),
+        ]
+        return "\n".join(lines)
+
+
+class Gauge(Metric):
+    """
+    :param function:
+        If given, it's called on each scrape to get the current values, keyed
+        by their label values.
+
+    """
+
+    type = "gauge"
+
+    def __init__(
+        self,
+        *args,
+        function: Optional[Callable[[], Dict[LabelValues, float]]] = None,
+        **kwargs,
+    ):
+        super().__init__(*args, **kwargs)
+        self.function = function
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, *label_values: str, amount: float = 1) -> None:
+        self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def dec(self, *label_values: str, amount: float = 1) -> None:
+        self.inc(*label_values, amount=-amount)
+
+    def samples(self) -> Iterable[str]:
+        values = self.function() if self.function else self._values
+        for label_values, value in values.items():
+            yield f"{self.name}{format_labels(self.labels, label_values)} {value}"
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, *args, buckets: Sequence[float] = LATENCY_BUCKETS, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.buckets = tuple(buckets)
+        # The count in each bucket (not cumulative), then the sum.
+        self._values: Dict[LabelValues, List[float]] = {}
+
+    def observe(self, value: float, *label_values: str) -> None:
+        values = self._values.get(label_values)
+        if values is None:
+            values = self._values[label_values] = [0] * (len(self.buckets) + 2)
+        values[bisect.bisect_left(self.buckets, value)] += 1
+        values[-1] += value
+
+    def samples(self) -> Iterable[str]:
+        bucket_labels = self.labels + ("le",)
+        for label_values, values in self._values.items():
+            cumulative = 0.0
+            for bound, count in zip(self.buckets + (float("inf"),), values):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else str(bound)
+                labels = format_labels(bucket_labels, label_values + (le,))
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            labels = format_labels(self.labels, label_values)
+            yield f"{self.name}_count{labels} {cumulative}"
+            yield f"{self.name}_sum{labels} {values[-1]}"
+
+
+class Registry:
+    def __init__(self):
+        self.metrics: List[Metric] = []
+
+    def register(self, metric: M) -> M:
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        return "\n".join(x.render() for x in self.metrics) + "\n"
+
+
+def pool_sizes() -> Dict[LabelValues, float]:
+    pool = getattr(engine_finder(), "pool", None)
+    if pool is None:
+        return {}
+    return {
+        ("size",): pool.get_size(),
+        ("idle",): pool.get_idle_size(),
+        ("min",): pool.get_min_size(),
+        ("max",): pool.get_max_size(),
+    }
+
+
+registry = Registry()
+
+REQUEST_DURATION = registry.register(
+    Histogram(
+        "http_request_duration_seconds",
+        "Time taken to handle each request.",
+        ["method", "route", "status"],
+    )
+)
+REQUESTS_IN_PROGRESS = registry.register(
+    Gauge("http_requests_in_progress", "Requests currently being handled.")
+)
+QUERY_DURATION = registry.register(
+    Histogram(
+        "db_query_duration_seconds",
+        "Time taken by each database query.",
+        buckets=QUERY_BUCKETS,
+    )
+)
+REQUEST_QUERIES = registry.register(
+    Histogram(
+        "db_queries_per_request",
+        "Database queries run while handling each request.",
+        ["route"],
+        buckets=QUERY_COUNT_BUCKETS,
+    )
+)
+REQUEST_QUERY_DURATION = registry.register(
+    Histogram(
+        "db_query_seconds_per_request",
+        "Total time spent in database queries while handling each request.",
+        ["route"],
+    )
+)
+POOL_WAIT = registry.register(
+    Histogram(
+        "db_pool_wait_seconds",
+        "Time spent waiting to acquire a connection from the pool.",
+        buckets=QUERY_BUCKETS,
+    )
+)
+POOL_CONNECTIONS = registry.register(
+    Gauge(
+        "db_pool_connections",
+        "Connections in the database pool.",
+        ["state"],
+        function=pool_sizes,
+    )
+)
+
+
+@dataclass
+class RequestStats:
+    scope: Scope
+    queries: int = 0
+    query_seconds: float = 0.0
+
+
+request_stats: contextvars.ContextVar[Optional[RequestStats]] = contextvars.ContextVar(
+    "request_stats", default=None
+)
+
+
+def record_query(duration: float) -> None:
+    """
+    Called by ``InstrumentedPostgresEngine`` after every query.
+    """
+    QUERY_DURATION.observe(duration)
+    stats = request_stats.get()
+    if stats is not None:
+        stats.queries += 1
+        stats.query_seconds += duration
+
+
+def record_pool_wait(duration: float) -> None:
+    POOL_WAIT.observe(duration)
+
+
+def route_name(scope: Scope) -> str:
+    """
+    The path template of the route which handled the request, so paths with
+    ids in them don't each get their own series.
+    """
+    root_path = scope.get("root_path", "")
+    route = scope.get("route")
+    if route is not None:
+        return root_path + route.path
+    if root_path:
+        # Mounted apps, such as the admin and static files.
+        return root_path
+    if "endpoint" in scope:
+        return scope["path"]
+    return "unmatched"
+
+
+class MetricsMiddleware:
+    """
+    Records the latency of every request, along with the number and time of
+    the database queries it ran.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        stats = RequestStats(scope)
+        token = request_stats.set(stats)
+        REQUESTS_IN_PROGRESS.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            duration = time.perf_counter() - started
+            REQUESTS_IN_PROGRESS.dec()
+            request_stats.reset(token)
+            route = route_name(scope)
+            REQUEST_DURATION.observe(duration, scope["method"], route, str(status_code))
+            REQUEST_QUERIES.observe(stats.queries, route)
+            REQUEST_QUERY_DURATION.observe(stats.query_seconds, route)
+
+
+async def metrics_endpoint(request: Request) -> Response:
+    return Response(registry.render(), media_type=CONTENT_TYPE)
@@ -0,0 +1,93 @@
+import asyncio
+import logging
+from collections import defaultdict
+from typing import Callable, DefaultDict, List, Optional
+
+from piccolo.engine import engine_finder
+
+logger = logging.getLogger(__name__)
+
+Subscriber = Callable[[Optional[str]], None]
+
+
+class Listener:
+    """
+    Holds a single ``LISTEN`` connection per process, and fans out the
+    notifications it receives to every subscriber of the channel.
+
+    If the connection drops, notifications may have been missed, so every
+    subscriber is called with ``None`` - when it drops, and again once it
+    has reconnected.
+    """
+
+    def __init__(self, reconnect_delay: float = 1.0):
+        self.reconnect_delay = reconnect_delay
+        self._subscribers: DefaultDict[str, List[Subscriber]] = defaultdict(list)
+        self._connection = None
+        self._reconnect_task: Optional[asyncio.Task] = None
+        self._stopping = False
+
+    @property
+    def is_listening(self) -> bool:
+        return self._connection is not None and not self._connection.is_closed()
+
+    def subscribe(self, channel: str, subscriber: Subscriber) -> None:
+        is_new_channel = channel not in self._subscribers
+        self._subscribers[channel].append(subscriber)
+        if is_new_channel and self._connection is not None:
+            asyncio.ensure_future(
+                self._connection.add_listener(channel, self._dispatch)
+            )
+
+    def unsubscribe(self, channel: str, subscriber: Subscriber) -> None:
+        self._subscribers[channel].remove(subscriber)
+
+    async def start(self) -> None:
+        self._stopping = False
+        engine = engine_finder()
+        connection = await engine.get_new_connection()
+        for channel in self._subscribers:
+            await connection.add_listener(channel, self._dispatch)
+        connection.add_termination_listener(self._on_termination)
+        self._connection = connection
+
+    async def stop(self) -> None:
+        self._stopping = True
+        if self._reconnect_task:
+            self._reconnect_task.cancel()
+            self._reconnect_task = None
+        if self._connection is not None:
+            connection, self._connection = self._connection, None
+            await connection.close()
+
+    def _dispatch(self, connection, pid: int, channel: str, payload: str) -> None:
+        for subscriber in list(self._subscribers[channel]):
+            subscriber(payload)
+
+    def _on_termination(self, connection) -> None:
+        if self._stopping:
+            return
+        logger.warning("Lost the notification connection, reconnecting")
+        self._connection = None
+        self._reset_subscribers()
+        self._reconnect_task = asyncio.ensure_future(self._reconnect())
+
+    def _reset_subscribers(self) -> None:
+        for subscribers in self._subscribers.values():
+            for subscriber in list(subscribers):
+                subscriber(None)
+
+    async def _reconnect(self) -> None:
+        delay = self.reconnect_delay
+        while not self._stopping:
+            try:
+                await self.start()
+                self._reset_subscribers()
+                return
+            except Exception:
+                logger.exception("Unable to reconnect the notification listener")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 30.0)
+
+
+listener = Listener()
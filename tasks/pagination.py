@@ -0,0 +1,45 @@
+import base64
+import json
+from typing import Any, List, Optional, Tuple
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+STREAM_BATCH_SIZE = 500
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(*values: Any) -> str:
+    """
+    Encodes the keyset values of the last row on a page as an opaque token,
+    which clients pass back unchanged as the ``after`` parameter.
+    """
+    payload = json.dumps(values, default=str, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(
+    cursor: Optional[str], types: Tuple[type, ...] = (int,)
+) -> Optional[List[Any]]:
+    """
+    The inverse of ``encode_cursor`` - ``types`` gives the expected type of
+    each keyset value, so a tampered cursor is rejected before it reaches the
+    database.
+    """
+    if cursor is None:
+        return None
+    try:
+        padding = "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(cursor + padding))
+    except ValueError as error:
+        raise InvalidCursor(f"Malformed cursor: {cursor}") from error
+    if (
+        not isinstance(values, list)
+        or len(values) != len(types)
+        or not all(isinstance(v, t) for v, t in zip(values, types))
+    ):
+        raise InvalidCursor(f"Malformed cursor: {cursor}")
+    return values
@@ -5,7 +5,11 @@ the APP_CONFIG.
 
 import os
 
-from piccolo.conf.apps import AppConfig, table_finder
+from piccolo.conf.apps import AppConfig, Command, table_finder
+
+from .commands.compress_static import compress_static
+from .commands.generate_data import generate_data
+from .commands.prune_history import prune_history
 
 
 CURRENT_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
@@ -16,5 +20,9 @@ APP_CONFIG = AppConfig(
     migrations_folder_path=os.path.join(CURRENT_DIRECTORY, "piccolo_migrations"),
     table_classes=table_finder(modules=["tasks.tables"], exclude_imported=True),
     migration_dependencies=[],
-    commands=[],
+    commands=[
+        Command(callable=generate_data, aliases=["generate"]),
+        Command(callable=compress_static),
+        Command(callable=prune_history),
+    ],
 )
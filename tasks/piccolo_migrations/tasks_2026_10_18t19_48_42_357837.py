@@ -0,0 +1,76 @@
+from piccolo.apps.migrations.auto.migration_manager import MigrationManager
+from piccolo.columns.column_types import ForeignKey
+from piccolo.table import Table
+
+
+ID = "2026-10-18T19:48:42:357837"
+VERSION = "1.5.1"
+DESCRIPTION = "Index the task listing and task label access paths"
+
+
+class RawTable(Table):
+    pass
+
+
+# Piccolo can only declare single column indexes, so the composite indexes
+# used by ``tasks/routers.py`` are created here.
+INDEXES = [
+    "CREATE INDEX task_assignee_id_id ON task (assignee_id, id)",
+    (
+        "CREATE INDEX task_assignee_id_parent_task_id "
+        "ON task (assignee_id, parent_task, id) WHERE parent_task IS NOT NULL"
+    ),
+    "CREATE UNIQUE INDEX task_label_task_label ON task_label (task, label)",
+]
+
+
+async def forwards():
+    manager = MigrationManager(
+        migration_id=ID, app_name="tasks", description=DESCRIPTION
+    )
+
+    async def run():
+        # Remove any duplicate labels before enforcing uniqueness.
+        await RawTable.raw(
+            "DELETE FROM task_label duplicate USING task_label original "
+            "WHERE duplicate.task = original.task "
+            "AND duplicate.label = original.label "
+            "AND duplicate.id > original.id"
+        )
+        for index in INDEXES:
+            await RawTable.raw(index)
+
+    async def run_backwards():
+        await RawTable.raw(
+            "DROP INDEX task_assignee_id_id, task_assignee_id_parent_task_id, "
+            "task_label_task_label"
+        )
+
+    manager.add_raw(run)
+    manager.add_raw_backwards(run_backwards)
+
+    manager.alter_column(
+        table_class_name="Task",
+        tablename="task",
+        column_name="parent_task",
+        db_column_name="parent_task",
+        params={"index": True},
+        old_params={"index": False},
+        column_class=ForeignKey,
+        old_column_class=ForeignKey,
+        schema=None,
+    )
+
+    manager.alter_column(
+        table_class_name="TaskLabel",
+        tablename="task_label",
+        column_name="label",
+        db_column_name="label",
+        params={"index": True},
+        old_params={"index": False},
+        column_class=ForeignKey,
+        old_column_class=ForeignKey,
+        schema=None,
+    )
+
+    return manager
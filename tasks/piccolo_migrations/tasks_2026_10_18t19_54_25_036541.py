@@ -0,0 +1,46 @@
+from piccolo.apps.migrations.auto.migration_manager import MigrationManager
+from piccolo.table import Table
+
+
+ID = "2026-10-18T19:54:25:036541"
+VERSION = "1.5.1"
+DESCRIPTION = "Index task history by user"
+
+
+class RawTable(Table):
+    pass
+
+
+# Deleted tasks are listed per user - either the user who deleted them, or
+# the assignee recorded in the archived payload - ordered by deletion time.
+INDEXES = [
+    (
+        "CREATE INDEX task_history_deleted_by_deleted_on_id "
+        "ON task_history (deleted_by, deleted_on, id)"
+    ),
+    (
+        "CREATE INDEX task_history_assignee_id_deleted_on_id ON task_history "
+        "(((serialized_data ->> 'assignee_id')::integer), deleted_on, id)"
+    ),
+]
+
+
+async def forwards():
+    manager = MigrationManager(
+        migration_id=ID, app_name="tasks", description=DESCRIPTION
+    )
+
+    async def run():
+        for index in INDEXES:
+            await RawTable.raw(index)
+
+    async def run_backwards():
+        await RawTable.raw(
+            "DROP INDEX task_history_deleted_by_deleted_on_id, "
+            "task_history_assignee_id_deleted_on_id"
+        )
+
+    manager.add_raw(run)
+    manager.add_raw_backwards(run_backwards)
+
+    return manager
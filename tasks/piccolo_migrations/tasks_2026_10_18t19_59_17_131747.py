@@ -0,0 +1,43 @@
+from piccolo.apps.migrations.auto.migration_manager import MigrationManager
+from piccolo.table import Table
+
+
+ID = "2026-10-18T19:59:17:131747"
+VERSION = "1.5.1"
+DESCRIPTION = "Notify label changes"
+
+
+class RawTable(Table):
+    pass
+
+
+async def forwards():
+    manager = MigrationManager(
+        migration_id=ID, app_name="tasks", description=DESCRIPTION
+    )
+
+    async def run():
+        await RawTable.raw(
+            """
+            CREATE FUNCTION notify_label_changed() RETURNS trigger AS $$
+            BEGIN
+                PERFORM pg_notify('label_changed', '');
+                RETURN NULL;
+            END;
+            $$ LANGUAGE plpgsql
+            """
+        )
+        await RawTable.raw(
+            "CREATE TRIGGER label_changed "
+            "AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON label "
+            "FOR EACH STATEMENT EXECUTE FUNCTION notify_label_changed()"
+        )
+
+    async def run_backwards():
+        await RawTable.raw("DROP TRIGGER label_changed ON label")
+        await RawTable.raw("DROP FUNCTION notify_label_changed()")
+
+    manager.add_raw(run)
+    manager.add_raw_backwards(run_backwards)
+
+    return manager
@@ -0,0 +1,42 @@
+from piccolo.apps.migrations.auto.migration_manager import MigrationManager
+from piccolo.table import Table
+
+
+ID = "2026-10-18T20:27:49:645965"
+VERSION = "1.5.1"
+DESCRIPTION = "Full text search over tasks"
+
+
+class RawTable(Table):
+    pass
+
+
+# Piccolo has no tsvector column, so the search vector is a generated column
+# maintained by Postgres, which the ``Task`` table doesn't declare. Matches in
+# the name rank above matches in the description.
+SEARCH_VECTOR = """
+ALTER TABLE task ADD COLUMN search_vector tsvector GENERATED ALWAYS AS (
+    setweight(to_tsvector('english', coalesce(name, '')), 'A')
+    || setweight(to_tsvector('english', coalesce(description, '')), 'B')
+) STORED
+"""
+
+
+async def forwards():
+    manager = MigrationManager(
+        migration_id=ID, app_name="tasks", description=DESCRIPTION
+    )
+
+    async def run():
+        await RawTable.raw(SEARCH_VECTOR)
+        await RawTable.raw(
+            "CREATE INDEX task_search_vector ON task USING GIN (search_vector)"
+        )
+
+    async def run_backwards():
+        await RawTable.raw("ALTER TABLE task DROP COLUMN search_vector")
+
+    manager.add_raw(run)
+    manager.add_raw_backwards(run_backwards)
+
+    return manager
@@ -0,0 +1,48 @@
+from piccolo.apps.migrations.auto.migration_manager import MigrationManager
+from piccolo.table import Table
+
+
+ID = "2026-10-18T20:31:24:761517"
+VERSION = "1.5.1"
+DESCRIPTION = "Index filtered task listings"
+
+
+class RawTable(Table):
+    pass
+
+
+# Dashboards mostly show unfinished tasks by due date, or top level tasks, so
+# these are partial indexes - they skip the finished tasks and subtasks, which
+# are most of the rows.
+INDEXES = [
+    (
+        "CREATE INDEX task_open_assignee_id_date_due_id "
+        "ON task (assignee_id, date_due, id) WHERE status <> 'Done'"
+    ),
+    (
+        "CREATE INDEX task_top_level_assignee_id_id "
+        "ON task (assignee_id, id) WHERE parent_task IS NULL"
+    ),
+    "CREATE INDEX task_assignee_id_status_id ON task (assignee_id, status, id)",
+]
+
+
+async def forwards():
+    manager = MigrationManager(
+        migration_id=ID, app_name="tasks", description=DESCRIPTION
+    )
+
+    async def run():
+        for index in INDEXES:
+            await RawTable.raw(index)
+
+    async def run_backwards():
+        await RawTable.raw(
+            "DROP INDEX task_open_assignee_id_date_due_id, "
+            "task_top_level_assignee_id_id, task_assignee_id_status_id"
+        )
+
+    manager.add_raw(run)
+    manager.add_raw_backwards(run_backwards)
+
+    return manager
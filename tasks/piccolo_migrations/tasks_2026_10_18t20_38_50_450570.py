@@ -0,0 +1,173 @@
+from piccolo.apps.migrations.auto.migration_manager import MigrationManager
+from piccolo.table import Table
+
+
+ID = "2026-10-18T20:38:50:450570"
+VERSION = "1.5.1"
+DESCRIPTION = "Notify task and label changes"
+
+
+class RawTable(Table):
+    pass
+
+
+# Sends the ids of the changed rows on the ``changes`` channel, as JSON, one
+# notification per user and at most 500 ids at a time, to stay well within
+# the 8000 byte payload limit. Labels are shared, so have no user.
+NOTIFY_CHANGES = """
+CREATE FUNCTION notify_changes(
+    table_name text, event text, user_ids integer[], ids integer[]
+) RETURNS void AS $$
+DECLARE
+    batch record;
+BEGIN
+    FOR batch IN
+        SELECT user_id, array_agg(id ORDER BY id) AS ids
+        FROM (
+            SELECT user_id, id,
+                (row_number() OVER (PARTITION BY user_id ORDER BY id) - 1) / 500
+                AS chunk
+            FROM unnest(user_ids, ids) AS changed(user_id, id)
+        ) numbered
+        GROUP BY user_id, chunk
+    LOOP
+        PERFORM pg_notify('changes', json_build_object(
+            'table', table_name,
+            'event', event,
+            'user_id', batch.user_id,
+            'ids', batch.ids
+        )::text);
+    END LOOP;
+END;
+$$ LANGUAGE plpgsql
+"""
+
+# Restores set ``task_manager.change_event`` for their transaction, so the
+# tasks they insert are reported as restored rather than created.
+CHANGE_EVENT = """
+CASE TG_OP
+    WHEN 'INSERT' THEN coalesce(
+        nullif(current_setting('task_manager.change_event', true), ''),
+        'created'
+    )
+    WHEN 'UPDATE' THEN 'updated'
+    ELSE 'deleted'
+END
+"""
+
+# A task which moves to another user is reported to both users.
+NOTIFY_TASK_CHANGES = f"""
+CREATE FUNCTION notify_task_changes() RETURNS trigger AS $$
+DECLARE
+    user_ids integer[];
+    ids integer[];
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        SELECT array_agg(assignee_id), array_agg(id) INTO user_ids, ids
+        FROM new_rows;
+    ELSIF TG_OP = 'DELETE' THEN
+        SELECT array_agg(assignee_id), array_agg(id) INTO user_ids, ids
+        FROM old_rows;
+    ELSE
+        SELECT array_agg(assignee_id), array_agg(id) INTO user_ids, ids
+        FROM (
+            SELECT assignee_id, id FROM new_rows
+            UNION
+            SELECT assignee_id, id FROM old_rows
+        ) changed;
+    END IF;
+    PERFORM notify_changes('task', {CHANGE_EVENT}, user_ids, ids);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql
+"""
+
+# Reported with the ids of the tasks whose labels changed. Rows removed by
+# deleting their task aren't reported, as the task's own event covers them.
+NOTIFY_TASK_LABEL_CHANGES = f"""
+CREATE FUNCTION notify_task_label_changes() RETURNS trigger AS $$
+DECLARE
+    user_ids integer[];
+    ids integer[];
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        SELECT array_agg(task.assignee_id), array_agg(task.id) INTO user_ids, ids
+        FROM task WHERE task.id IN (SELECT new_rows.task FROM new_rows);
+    ELSE
+        SELECT array_agg(task.assignee_id), array_agg(task.id) INTO user_ids, ids
+        FROM task WHERE task.id IN (SELECT old_rows.task FROM old_rows);
+    END IF;
+    PERFORM notify_changes('task_label', {CHANGE_EVENT}, user_ids, ids);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql
+"""
+
+NOTIFY_LABEL_CHANGES = f"""
+CREATE FUNCTION notify_label_changes() RETURNS trigger AS $$
+DECLARE
+    ids integer[];
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        SELECT array_agg(id) INTO ids FROM old_rows;
+    ELSE
+        SELECT array_agg(id) INTO ids FROM new_rows;
+    END IF;
+    PERFORM notify_changes(
+        'label', {CHANGE_EVENT}, array_fill(NULL::integer, ARRAY[coalesce(cardinality(ids), 0)]), ids
+    );
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql
+"""
+
+# Transition tables can only be used by single event triggers.
+TRANSITION_TABLES = {
+    "INSERT": "REFERENCING NEW TABLE AS new_rows",
+    "UPDATE": "REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows",
+    "DELETE": "REFERENCING OLD TABLE AS old_rows",
+}
+
+TRIGGERS = {
+    "task": ("notify_task_changes", ["INSERT", "UPDATE", "DELETE"]),
+    "task_label": ("notify_task_label_changes", ["INSERT", "DELETE"]),
+    "label": ("notify_label_changes", ["INSERT", "UPDATE", "DELETE"]),
+}
+
+
+async def forwards():
+    manager = MigrationManager(
+        migration_id=ID, app_name="tasks", description=DESCRIPTION
+    )
+
+    async def run():
+        for function in [
+            NOTIFY_CHANGES,
+            NOTIFY_TASK_CHANGES,
+            NOTIFY_TASK_LABEL_CHANGES,
+            NOTIFY_LABEL_CHANGES,
+        ]:
+            await RawTable.raw(function)
+        for table, (function, operations) in TRIGGERS.items():
+            for operation in operations:
+                await RawTable.raw(
+                    f"CREATE TRIGGER {table}_{operation.lower()}_changes "
+                    f"AFTER {operation} ON {table} {TRANSITION_TABLES[operation]} "
+                    f"FOR EACH STATEMENT EXECUTE FUNCTION {function}()"
+                )
+
+    async def run_backwards():
+        for table, (function, operations) in TRIGGERS.items():
+            for operation in operations:
+                await RawTable.raw(
+                    f"DROP TRIGGER {table}_{operation.lower()}_changes ON {table}"
+                )
+            await RawTable.raw(f"DROP FUNCTION {function}()")
+        await RawTable.raw(
+            "DROP FUNCTION notify_changes(text, text, integer[], integer[])"
+        )
+
+    manager.add_raw(run)
+    manager.add_raw_backwards(run_backwards)
+
+    return manager
@@ -0,0 +1,173 @@
+from piccolo.apps.migrations.auto.migration_manager import MigrationManager
+from piccolo.columns.base import OnDelete
+from piccolo.columns.base import OnUpdate
+from piccolo.columns.column_types import BigInt
+from piccolo.columns.column_types import ForeignKey
+from piccolo.columns.column_types import Serial
+from piccolo.columns.indexes import IndexMethod
+from piccolo.table import Table
+
+
+class BaseUser(Table, tablename="piccolo_user", schema=None):
+    id = Serial(
+        null=False,
+        primary_key=True,
+        unique=False,
+        index=False,
+        index_method=IndexMethod.btree,
+        choices=None,
+        db_column_name="id",
+        secret=False,
+    )
+
+
+ID = "2026-10-18T20:43:23:019513"
+VERSION = "1.5.1"
+DESCRIPTION = "Add task versions"
+
+
+class RawTable(Table):
+    pass
+
+
+# Bumps the version of every user whose tasks changed, in user order so
+# concurrent bulk writes can't deadlock. A task which moves to another user
+# changes both users' listings, and editing a label changes the listings of
+# everyone with a task labelled with it.
+BUMP_TASK_VERSIONS = """
+CREATE FUNCTION bump_task_versions() RETURNS trigger AS $$
+BEGIN
+    IF TG_TABLE_NAME = 'label' THEN
+        INSERT INTO task_version AS current (user_id, version)
+        SELECT DISTINCT task.assignee_id, 1
+        FROM task JOIN task_label ON task_label.task = task.id
+        WHERE task_label.label IN (SELECT new_rows.id FROM new_rows)
+        ORDER BY 1
+        ON CONFLICT (user_id) DO UPDATE SET version = current.version + 1;
+    ELSIF TG_TABLE_NAME = 'task_label' THEN
+        IF TG_OP = 'INSERT' THEN
+            INSERT INTO task_version AS current (user_id, version)
+            SELECT DISTINCT task.assignee_id, 1
+            FROM task WHERE task.id IN (SELECT new_rows.task FROM new_rows)
+            ORDER BY 1
+            ON CONFLICT (user_id) DO UPDATE SET version = current.version + 1;
+        ELSE
+            INSERT INTO task_version AS current (user_id, version)
+            SELECT DISTINCT task.assignee_id, 1
+            FROM task WHERE task.id IN (SELECT old_rows.task FROM old_rows)
+            ORDER BY 1
+            ON CONFLICT (user_id) DO UPDATE SET version = current.version + 1;
+        END IF;
+    ELSIF TG_OP = 'INSERT' THEN
+        INSERT INTO task_version AS current (user_id, version)
+        SELECT DISTINCT assignee_id, 1 FROM new_rows ORDER BY 1
+        ON CONFLICT (user_id) DO UPDATE SET version = current.version + 1;
+    ELSIF TG_OP = 'DELETE' THEN
+        INSERT INTO task_version AS current (user_id, version)
+        SELECT DISTINCT assignee_id, 1 FROM old_rows ORDER BY 1
+        ON CONFLICT (user_id) DO UPDATE SET version = current.version + 1;
+    ELSE
+        INSERT INTO task_version AS current (user_id, version)
+        SELECT assignee_id, 1 FROM new_rows
+        UNION
+        SELECT assignee_id, 1 FROM old_rows
+        ORDER BY 1
+        ON CONFLICT (user_id) DO UPDATE SET version = current.version + 1;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql
+"""
+
+ROWS = {
+    "INSERT": "NEW TABLE AS new_rows",
+    "UPDATE": "OLD TABLE AS old_rows NEW TABLE AS new_rows",
+    "DELETE": "OLD TABLE AS old_rows",
+}
+
+TRIGGERS = {
+    "task": ["INSERT", "UPDATE", "DELETE"],
+    "task_label": ["INSERT", "DELETE"],
+    "label": ["UPDATE"],
+}
+
+
+async def forwards():
+    manager = MigrationManager(
+        migration_id=ID, app_name="tasks", description=DESCRIPTION
+    )
+
+    async def run():
+        await RawTable.raw(BUMP_TASK_VERSIONS)
+        for table, operations in TRIGGERS.items():
+            for operation in operations:
+                await RawTable.raw(
+                    f"CREATE TRIGGER {table}_{operation.lower()}_versions "
+                    f"AFTER {operation} ON {table} REFERENCING {ROWS[operation]} "
+                    "FOR EACH STATEMENT EXECUTE FUNCTION bump_task_versions()"
+                )
+
+    async def run_backwards():
+        for table, operations in TRIGGERS.items():
+            for operation in operations:
+                await RawTable.raw(
+                    f"DROP TRIGGER {table}_{operation.lower()}_versions ON {table}"
+                )
+        await RawTable.raw("DROP FUNCTION bump_task_versions()")
+
+    manager.add_raw(run)
+    manager.add_raw_backwards(run_backwards)
+
+    manager.add_table(
+        class_name="TaskVersion",
+        tablename="task_version",
+        schema=None,
+        columns=None,
+    )
+
+    manager.add_column(
+        table_class_name="TaskVersion",
+        tablename="task_version",
+        column_name="user_id",
+        db_column_name="user_id",
+        column_class_name="ForeignKey",
+        column_class=ForeignKey,
+        params={
+            "references": BaseUser,
+            "on_delete": OnDelete.cascade,
+            "on_update": OnUpdate.cascade,
+            "target_column": None,
+            "null": False,
+            "primary_key": False,
+            "unique": True,
+            "index": False,
+            "index_method": IndexMethod.btree,
+            "choices": None,
+            "db_column_name": None,
+            "secret": False,
+        },
+        schema=None,
+    )
+
+    manager.add_column(
+        table_class_name="TaskVersion",
+        tablename="task_version",
+        column_name="version",
+        db_column_name="version",
+        column_class_name="BigInt",
+        column_class=BigInt,
+        params={
+            "default": 0,
+            "null": False,
+            "primary_key": False,
+            "unique": False,
+            "index": False,
+            "index_method": IndexMethod.btree,
+            "choices": None,
+            "db_column_name": None,
+            "secret": False,
+        },
+        schema=None,
+    )
+
+    return manager
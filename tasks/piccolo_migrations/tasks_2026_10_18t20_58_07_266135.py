@@ -0,0 +1,179 @@
+from piccolo.apps.migrations.auto.migration_manager import MigrationManager
+from piccolo.columns.column_types import JSON
+from piccolo.columns.column_types import JSONB
+from piccolo.table import Table
+
+
+ID = "2026-10-18T20:58:07:266135"
+VERSION = "1.5.1"
+DESCRIPTION = "Partition task history"
+
+
+class RawTable(Table):
+    pass
+
+
+# Partitions are created this many months ahead, so the default partition
+# only catches rows if ``prune_history`` hasn't been run for a while.
+MONTHS_AHEAD = 3
+
+# Uniqueness can only be enforced within a partition, so the primary key has
+# to include ``deleted_on``, and ``task_id`` can no longer be unique.
+CREATE_TABLE = """
+CREATE TABLE task_history (
+    id integer NOT NULL DEFAULT nextval('task_history_id_seq'),
+    task_id integer NOT NULL DEFAULT 0,
+    serialized_data jsonb NOT NULL DEFAULT '{{}}',
+    deleted_on timestamp NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    deleted_by integer REFERENCES piccolo_user (id)
+        ON UPDATE CASCADE ON DELETE RESTRICT,
+    PRIMARY KEY (id, deleted_on)
+) PARTITION BY RANGE (deleted_on)
+"""
+
+# Creates the partition for the month containing ``month``, unless it
+# exists. Any rows for that month which went to the default partition are
+# moved into it first, as Postgres won't attach it otherwise.
+CREATE_PARTITION = """
+CREATE FUNCTION create_task_history_partition(month timestamp) RETURNS text AS $$
+DECLARE
+    start_on timestamp := date_trunc('month', month);
+    end_on timestamp := date_trunc('month', month) + interval '1 month';
+    partition_name text := 'task_history_' || to_char(month, 'YYYY_MM');
+BEGIN
+    IF to_regclass(partition_name) IS NULL THEN
+        EXECUTE format(
+            'CREATE TABLE %I (LIKE task_history INCLUDING DEFAULTS)',
+            partition_name
+        );
+        EXECUTE format(
+            'WITH moved AS ('
+            '    DELETE FROM task_history_default'
+            '    WHERE deleted_on >= %L AND deleted_on < %L RETURNING *'
+            ') INSERT INTO %I SELECT * FROM moved',
+            start_on, end_on, partition_name
+        );
+        EXECUTE format(
+            'ALTER TABLE task_history ATTACH PARTITION %I '
+            'FOR VALUES FROM (%L) TO (%L)',
+            partition_name, start_on, end_on
+        );
+    END IF;
+    RETURN partition_name;
+END;
+$$ LANGUAGE plpgsql
+"""
+
+# Created on the partitioned table, so each partition gets its own copy.
+INDEXES = [
+    (
+        "CREATE INDEX task_history_deleted_by_deleted_on_id "
+        "ON task_history (deleted_by, deleted_on, id)"
+    ),
+    (
+        "CREATE INDEX task_history_assignee_id_deleted_on_id ON task_history "
+        "(((serialized_data ->> 'assignee_id')::integer), deleted_on, id)"
+    ),
+    (
+        "CREATE INDEX task_history_status_deleted_on ON task_history "
+        "((serialized_data ->> 'status'), deleted_on)"
+    ),
+    "CREATE INDEX task_history_task_id ON task_history (task_id)",
+]
+
+# The unpartitioned table, as it was before this migration.
+CREATE_UNPARTITIONED_TABLE = """
+CREATE TABLE task_history (
+    id integer PRIMARY KEY DEFAULT nextval('task_history_id_seq'),
+    task_id integer NOT NULL DEFAULT 0,
+    serialized_data json NOT NULL DEFAULT '{{}}',
+    deleted_on timestamp NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    deleted_by integer REFERENCES piccolo_user (id)
+        ON UPDATE CASCADE ON DELETE RESTRICT
+)
+"""
+
+UNPARTITIONED_INDEXES = INDEXES[:2]
+
+
+async def forwards():
+    manager = MigrationManager(
+        migration_id=ID, app_name="tasks", description=DESCRIPTION
+    )
+
+    async def run():
+        await RawTable.raw("ALTER TABLE task_history RENAME TO task_history_old")
+        await RawTable.raw(
+            "ALTER INDEX task_history_pkey RENAME TO task_history_old_pkey"
+        )
+        await RawTable.raw(
+            "DROP INDEX task_history_deleted_by_deleted_on_id, "
+            "task_history_assignee_id_deleted_on_id"
+        )
+        await RawTable.raw(CREATE_TABLE)
+        await RawTable.raw(
+            "CREATE TABLE task_history_default PARTITION OF task_history DEFAULT"
+        )
+        await RawTable.raw(CREATE_PARTITION)
+        # A partition for every month with history, up to a few months ahead.
+        await RawTable.raw(
+            "SELECT create_task_history_partition(month) FROM generate_series("
+            "    date_trunc('month', coalesce("
+            "        (SELECT min(deleted_on) FROM task_history_old), localtimestamp"
+            "    )),"
+            "    localtimestamp + make_interval(months => {}),"
+            "    interval '1 month'"
+            ") month",
+            MONTHS_AHEAD,
+        )
+        await RawTable.raw(
+            "INSERT INTO task_history "
+            "SELECT id, task_id, serialized_data::jsonb, deleted_on, deleted_by "
+            "FROM task_history_old"
+        )
+        await RawTable.raw(
+            "ALTER SEQUENCE task_history_id_seq OWNED BY task_history.id"
+        )
+        await RawTable.raw("DROP TABLE task_history_old")
+        for index in INDEXES:
+            await RawTable.raw(index)
+
+    async def run_backwards():
+        await RawTable.raw("DROP FUNCTION create_task_history_partition(timestamp)")
+        await RawTable.raw(
+            "DROP INDEX task_history_deleted_by_deleted_on_id, "
+            "task_history_assignee_id_deleted_on_id"
+        )
+        await RawTable.raw("ALTER TABLE task_history RENAME TO task_history_old")
+        await RawTable.raw(
+            "ALTER INDEX task_history_pkey RENAME TO task_history_old_pkey"
+        )
+        await RawTable.raw(CREATE_UNPARTITIONED_TABLE)
+        await RawTable.raw(
+            "INSERT INTO task_history "
+            "SELECT id, task_id, serialized_data::json, deleted_on, deleted_by "
+            "FROM task_history_old"
+        )
+        await RawTable.raw(
+            "ALTER SEQUENCE task_history_id_seq OWNED BY task_history.id"
+        )
+        await RawTable.raw("DROP TABLE task_history_old")
+        for index in UNPARTITIONED_INDEXES:
+            await RawTable.raw(index)
+
+    manager.add_raw(run)
+    manager.add_raw_backwards(run_backwards)
+
+    manager.alter_column(
+        table_class_name="TaskHistory",
+        tablename="task_history",
+        column_name="serialized_data",
+        db_column_name="serialized_data",
+        params={},
+        old_params={},
+        column_class=JSONB,
+        old_column_class=JSON,
+        schema=None,
+    )
+
+    return manager
@@ -0,0 +1,233 @@
+import asyncio
+import contextvars
+from contextlib import AsyncExitStack, asynccontextmanager, contextmanager
+import itertools
+import logging
+import os
+import time
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Set, Tuple
+
+import asyncpg
+from piccolo.engine import engine_finder
+from piccolo.query.base import Query
+from piccolo.querystring import QueryString
+from starlette.datastructures import MutableHeaders
+from starlette.requests import HTTPConnection
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+logger = logging.getLogger(__name__)
+
+REPLICA_MAX_LAG = float(os.environ.get("DB_REPLICA_MAX_LAG", "5"))
+REPLICA_CHECK_INTERVAL = float(os.environ.get("DB_REPLICA_CHECK_INTERVAL", "5"))
+PRIMARY_PIN_SECONDS = int(os.environ.get("DB_PRIMARY_PIN_SECONDS", "10"))
+PRIMARY_PIN_COOKIE = "primary_until"
+SAFE_METHODS = {"GET", "HEAD", "OPTIONS"}
+
+# How far the replica is behind - zero if it has replayed everything it has
+# received, or if it isn't a standby at all.
+LAG_QUERY = """
+SELECT CASE
+    WHEN NOT pg_is_in_recovery() THEN 0
+    WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+    ELSE extract(epoch FROM now() - pg_last_xact_replay_timestamp())
+END AS lag
+"""
+
+# Errors which mean the replica can't be reached, rather than a problem with
+# the query itself.
+CONNECTION_ERRORS = (
+    OSError,
+    asyncio.TimeoutError,
+    asyncpg.PostgresConnectionError,
+    asyncpg.InterfaceError,
+    asyncpg.CannotConnectNowError,
+)
+
+use_primary: contextvars.ContextVar[bool] = contextvars.ContextVar(
+    "use_primary", default=False
+)
+current_node: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar(
+    "current_node", default=None
+)
+
+
+class ReplicaSet:
+    """
+    Spreads reads across the healthy replicas in the engine's
+    ``extra_nodes``. Reads go to the primary instead when there are no
+    healthy replicas, inside a transaction, or when the request is pinned to
+    the primary after a write - see ``PrimaryPinMiddleware``.
+
+    A replica is healthy if it answers the periodic check, and is less than
+    ``max_lag`` seconds behind the primary. A replica which fails a query is
+    taken out of rotation until the next check passes.
+    """
+
+    def __init__(self, max_lag: float, check_interval: float):
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self.healthy: Set[str] = set()
+        self._rotation = itertools.count()
+        self._check_task: Optional[asyncio.Task] = None
+
+    @property
+    def nodes(self) -> Dict[str, Any]:
+        return engine_finder().extra_nodes
+
+    def read_node(self) -> Optional[str]:
+        if not self.healthy or use_primary.get():
+            return None
+        if engine_finder().current_transaction.get() is not None:
+            return None
+        node = current_node.get()
+        if node is not None:
+            return node if node in self.healthy else None
+        healthy = sorted(self.healthy)
+        return healthy[next(self._rotation) % len(healthy)]
+
+    @contextmanager
+    def same_node(self) -> Iterator[None]:
+        """
+        Sends the reads inside the block to the same node, so each one sees
+        at least the changes the earlier ones did. If the node fails, the
+        rest go to the primary, which is always ahead of it.
+        """
+        node = self.read_node()
+        node_token = current_node.set(node)
+        primary_token = use_primary.set(use_primary.get() or node is None)
+        try:
+            yield
+        finally:
+            use_primary.reset(primary_token)
+            current_node.reset(node_token)
+
+    async def read(self, query: Query) -> Any:
+        """
+        Runs a read only query on a replica if there's a suitable one,
+        falling back to the primary.
+        """
+        node = self.read_node()
+        if node is not None:
+            try:
+                return await query.run(node=node)
+            except CONNECTION_ERRORS:
+                logger.warning(f"Replica {node} failed, using the primary")
+                self.healthy.discard(node)
+        return await query.run()
+
+    @asynccontextmanager
+    async def read_connection(self) -> AsyncIterator[Tuple[Any, asyncpg.Connection]]:
+        """
+        A pooled connection, and the engine it came from, for read only work
+        which can't go through ``read`` - such as a cursor. Uses a replica
+        if there's a suitable one, falling back to the primary.
+        """
+        async with AsyncExitStack() as stack:
+            node = self.read_node()
+            if node is not None:
+                engine = self.nodes[node]
+                try:
+                    connection = await stack.enter_async_context(engine.connection())
+                except CONNECTION_ERRORS:
+                    logger.warning(f"Replica {node} failed, using the primary")
+                    self.healthy.discard(node)
+                else:
+                    yield engine, connection
+                    return
+            engine = engine_finder()
+            connection = await stack.enter_async_context(engine.connection())
+            yield engine, connection
+
+    async def check(self) -> None:
+        for name, engine in self.nodes.items():
+            try:
+                rows = await engine.run_querystring(QueryString(LAG_QUERY))
+                lag = float(rows[0]["lag"] or 0)
+            except Exception:
+                logger.warning(f"Replica {name} is unreachable")
+                self.healthy.discard(name)
+                continue
+            if lag > self.max_lag:
+                logger.warning(f"Replica {name} is {lag:.1f}s behind")
+                self.healthy.discard(name)
+            else:
+                self.healthy.add(name)
+
+    async def _check_periodically(self) -> None:
+        while True:
+            await asyncio.sleep(self.check_interval)
+            await self.check()
+
+    async def start(self) -> None:
+        for name, engine in self.nodes.items():
+            try:
+                await engine.start_connection_pool()
+            except Exception:
+                logger.warning(f"Unable to connect to replica {name}")
+        await self.check()
+        if self.nodes and self._check_task is None:
+            self._check_task = asyncio.ensure_future(self._check_periodically())
+
+    async def stop(self) -> None:
+        if self._check_task is not None:
+            self._check_task.cancel()
+            self._check_task = None
+        self.healthy.clear()
+        for engine in self.nodes.values():
+            if engine.pool:
+                await engine.close_connection_pool()
+
+
+class PrimaryPinMiddleware:
+    """
+    Gives read-your-writes consistency. After a client makes a write, a
+    cookie pins its reads to the primary for ``pin_seconds``, which should be
+    longer than the replicas are allowed to lag.
+    """
+
+    def __init__(self, app: ASGIApp, pin_seconds: int = PRIMARY_PIN_SECONDS):
+        self.app = app
+        self.pin_seconds = pin_seconds
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        pinned_until = HTTPConnection(scope).cookies.get(PRIMARY_PIN_COOKIE, "")
+        pinned = pinned_until.isdigit() and int(pinned_until) > time.time()
+        is_write = scope["method"] not in SAFE_METHODS
+
+        async def send_wrapper(message: Message) -> None:
+            if is_write and message["type"] == "http.response.start":
+                until = int(time.time()) + self.pin_seconds
+                headers = MutableHeaders(scope=message)
+                headers.append(
+                    "Set-Cookie",
+                    f"{PRIMARY_PIN_COOKIE}={until}; Max-Age={self.pin_seconds}; "
+                    "Path=/; HttpOnly; SameSite=Lax",
+                )
+            await send(message)
+
+        token = use_primary.set(pinned or is_write)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            use_primary.reset(token)
+
+
+def replica_configs(
+    config: Dict[str, Any], hosts: Optional[str]
+) -> List[Dict[str, Any]]:
+    """
+    Builds the config for each replica in ``hosts`` - a comma separated list
+    of ``host`` or ``host:port`` - which otherwise match the primary.
+    """
+    configs = []
+    for host in filter(None, (x.strip() for x in (hosts or "").split(","))):
+        name, _, port = host.partition(":")
+        configs.append({**config, "host": name, "port": int(port or config["port"])})
+    return configs
+
+
+replicas = ReplicaSet(max_lag=REPLICA_MAX_LAG, check_interval=REPLICA_CHECK_INTERVAL)
@@ -1,32 +1,406 @@
-import json
-from fastapi import APIRouter
-from typing import List, Union
-from fastapi.responses import JSONResponse
+import datetime
+import re
+import time
+import asyncpg
+import orjson
+from fastapi import APIRouter, Body, Query, Response
+from typing import (
+    Annotated,
+    Literal,
+    Any,
+    AsyncIterator,
+    Dict,
+    List,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+    Type,
+    Union,
+)
+from fastapi.responses import JSONResponse, ORJSONResponse, StreamingResponse
 from fastapi.requests import Request
-from tasks.tables import Task, TaskHistory, TaskLabel, Label
+from piccolo.apps.user.tables import BaseUser
+from piccolo.columns.combination import WhereRaw
+from piccolo.custom_types import Combinable
+from piccolo.table import Table
+from piccolo.query.methods.raw import Raw
+from piccolo.query.methods.select import Select
+from tasks.bulk import reserve_ids
+from tasks.cache import (
+    etag_matches,
+    label_cache,
+    listing_cache,
+    listing_etag,
+)
+from tasks.changes import CHANGE_EVENT_SETTING
+from tasks.pagination import (
+    DEFAULT_PAGE_SIZE,
+    MAX_PAGE_SIZE,
+    NEXT_CURSOR_HEADER,
+    STREAM_BATCH_SIZE,
+    InvalidCursor,
+    decode_cursor,
+    encode_cursor,
+)
+from tasks.replicas import replicas
+from tasks.serialization import RowEncoder, check_schema
+from tasks.tables import Task, TaskHistory, TaskLabel, TaskVersion, Label
 from tasks.types.task import (
     TaskModelOut,
     TaskModelIn,
+    TaskModelPatch,
     TaskLabelOut,
     TaskRestoreIn,
+    TaskRestoreOut,
+    TaskDeleteIn,
+    TaskDeleteOut,
+    TaskTreeOut,
+    TaskTreeNodeOut,
+    TaskWithLabelsOut,
     LabelModelOut,
     LabelModelIn,
+    LabelModelPatch,
     TaskLabelIn,
+    TaskBulkUpdateIn,
+    TaskBulkResultOut,
 )
 from fastapi import status
 
 router = APIRouter()
 
+# Multi-row INSERTs are limited by Postgres' 32767 bind parameters, so larger
+# batches are loaded with COPY instead.
+BULK_COPY_THRESHOLD = 1000
+MAX_BULK_SIZE = 10000
+
+MAX_TREE_DEPTH = 50
+MAX_TREE_NODES = 5000
+TREE_TRUNCATED_HEADER = "X-Tree-Truncated"
+
+MAX_SEARCH_LENGTH = 200
 
-@router.get("/tasks", response_model=List[TaskModelOut])
-async def list_tasks(request: Request) -> List[TaskModelOut]:
-    return (
-        await Task.select()
-        .where(Task.assignee_id == request.user.user_id)
-        .order_by(Task.id)
+# The list routes return rows without revalidating them against their
+# ``response_model``, so check the rows match the models on startup.
+task_encoder = RowEncoder(Task, TaskModelOut)
+check_schema(Task, TaskWithLabelsOut, extra_fields=["labels"])
+check_schema(Task, TaskTreeNodeOut, extra_fields=["depth"])
+check_schema(Task, TaskTreeOut, extra_fields=["subtasks"])
+check_schema(Label, LabelModelOut)
+
+
+def task_columns(alias: Optional[str] = None) -> str:
+    """
+    The ``Task`` columns for use in raw queries, which list them explicitly
+    so the output always matches ``TaskModelOut``.
+    """
+    prefix = f"{alias}." if alias else ""
+    return ", ".join(
+        f'{prefix}"{column._meta.db_column_name}"' for column in Task._meta.columns
     )
 
 
+async def attach_labels(tasks: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Adds the labels for every task in ``tasks`` using a single query.
+    """
+    labels_by_task: Dict[int, List[Dict[str, Any]]] = {x["id"]: [] for x in tasks}
+    if labels_by_task:
+        task_labels = await replicas.read(
+            TaskLabel.select(TaskLabel.task, *TaskLabel.label.all_columns())
+            .where(TaskLabel.task.is_in(list(labels_by_task)))
+            .order_by(TaskLabel.id)
+            .output(nested=True)
+        )
+        for task_label in task_labels:
+            labels_by_task[task_label["task"]].append(task_label["label"])
+    for task in tasks:
+        task["labels"] = labels_by_task[task["id"]]
+    return tasks
+
+
+async def stream_rows(
+    query: Select, include_labels: bool = False
+) -> AsyncIterator[bytes]:
+    """
+    Encodes the rows of ``query`` as a JSON array, one database batch at a
+    time, so memory use doesn't grow with the size of the result.
+
+    The rows come from a server side cursor, on a pooled connection which is
+    held until the response finishes, or the client disconnects.
+    """
+    sql, args = query.querystrings[0].compile_string(engine_type="postgres")
+    yield b"["
+    separator = b""
+    async with replicas.read_connection() as (engine, connection):
+        # Only the time spent waiting on the database, not on the client.
+        duration = 0.0
+        try:
+            async with connection.transaction(readonly=True):
+                rows: List[Dict[str, Any]] = []
+                started = time.perf_counter()
+                cursor = connection.cursor(sql, *args, prefetch=STREAM_BATCH_SIZE)
+                async for record in cursor:
+                    rows.append(dict(record))
+                    if len(rows) < STREAM_BATCH_SIZE:
+                        continue
+                    duration += time.perf_counter() - started
+                    if include_labels:
+                        rows = await attach_labels(rows)
+                    # Strip the brackets, so the batches join into one array.
+                    yield separator + orjson.dumps(rows)[1:-1]
+                    separator = b","
+                    rows = []
+                    started = time.perf_counter()
+                duration += time.perf_counter() - started
+                if rows:
+                    if include_labels:
+                        rows = await attach_labels(rows)
+                    yield separator + orjson.dumps(rows)[1:-1]
+        finally:
+            engine.record_query(sql, duration)
+    yield b"]"
+
+
+TaskSort = Literal["id", "date_due", "status"]
+
+# The keyset of each sort order, after ``id`` - and the expected type of each
+# value in its cursor.
+SORT_COLUMNS = {"date_due": Task.date_due, "status": Task.status}
+SORT_CURSOR_TYPES: Dict[str, Tuple[Any, ...]] = {
+    "id": (int,),
+    "date_due": ((str, type(None)), int),
+    "status": (str, int),
+}
+
+
+def task_page(
+    where: Combinable, sort: TaskSort = "id", cursor: Optional[List[Any]] = None
+) -> Select:
+    """
+    Orders the tasks by ``sort`` then ``id``, starting after ``cursor``. Tasks
+    without a due date come last when sorted by ``date_due``.
+    """
+    if sort == "id":
+        query = Task.select().where(where).order_by(Task.id)
+        if cursor is not None:
+            query = query.where(Task.id > cursor[0])
+        return query
+
+    column = SORT_COLUMNS[sort]
+    name = column._meta.db_column_name
+    query = Task.select().where(where).order_by(column, Task.id)
+    if cursor is not None:
+        value, after_id = cursor
+        if value is None:
+            query = query.where(column.is_null() & (Task.id > after_id))
+        else:
+            if sort == "date_due":
+                value = datetime.date.fromisoformat(value)
+            after: Combinable = WhereRaw(
+                f'("task"."{name}", "task"."id") > ({{}}, {{}})', value, after_id
+            )
+            if column._meta.null:
+                after = after | column.is_null()
+            query = query.where(after)
+    return query
+
+
+def page_cursor(sort: TaskSort, row: Dict[str, Any]) -> str:
+    if sort == "id":
+        return encode_cursor(row["id"])
+    return encode_cursor(row[sort], row["id"])
+
+
+def task_filters(
+    task_status: List[Task.Status],
+    due_after: Optional[datetime.date],
+    due_before: Optional[datetime.date],
+    has_parent: Optional[bool],
+) -> List[Combinable]:
+    filters: List[Combinable] = []
+    if task_status:
+        filters.append(Task.status.is_in([x.value for x in task_status]))
+    if due_after is not None:
+        filters.append(Task.date_due >= due_after)
+    if due_before is not None:
+        filters.append(Task.date_due < due_before)
+    if has_parent is not None:
+        filters.append(
+            Task.parent_task.is_not_null() if has_parent else Task.parent_task.is_null()
+        )
+    return filters
+
+
+async def task_version(user_id: int) -> int:
+    row = await replicas.read(
+        TaskVersion.select(TaskVersion.version)
+        .where(TaskVersion.user_id == user_id)
+        .first()
+    )
+    return row["version"] if row else 0
+
+
+async def paginate_tasks(
+    request: Request,
+    where: Combinable,
+    limit: int,
+    after: Optional[str],
+    stream: bool,
+    include: List[Literal["labels"]],
+    sort: TaskSort = "id",
+) -> Union[List[TaskWithLabelsOut], Response]:
+    """
+    Pages have an ETag derived from the user's ``TaskVersion``, so when
+    nothing has changed, ``If-None-Match`` gets a 304 after a single lookup.
+    Pages are also cached in-process until the version moves on.
+    """
+    try:
+        cursor = decode_cursor(after, SORT_CURSOR_TYPES[sort])
+        query = task_page(where, sort, cursor)
+    except ValueError as error:
+        return JSONResponse(
+            {"detail": str(error)}, status_code=status.HTTP_400_BAD_REQUEST
+        )
+
+    include_labels = "labels" in include
+    if stream:
+        return StreamingResponse(
+            stream_rows(query, include_labels), media_type="application/json"
+        )
+
+    user_id = request.user.user_id
+    # The version is read first, and on the same node as the page, so the
+    # page is never older than the version in its ETag.
+    with replicas.same_node():
+        version = await task_version(user_id)
+        key = (user_id, version, f"{request.url.path}?{request.url.query}")
+        etag = listing_etag(key)
+        if etag_matches(request.headers.get("If-None-Match"), etag):
+            return Response(
+                status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag}
+            )
+
+        cached = listing_cache.get(key)
+        if cached is None:
+            tasks = await replicas.read(query.limit(limit + 1))
+            headers = {}
+            if len(tasks) > limit:
+                tasks = tasks[:limit]
+                headers[NEXT_CURSOR_HEADER] = page_cursor(sort, tasks[-1])
+            if include_labels:
+                tasks = await attach_labels(tasks)
+            cached = (orjson.dumps(tasks), headers)
+            listing_cache.set(key, cached)
+
+    body, headers = cached
+    return Response(
+        body,
+        media_type="application/json",
+        headers={**headers, "ETag": etag, "Cache-Control": "no-cache"},
+    )
+
+
+@router.get(
+    "/tasks",
+    response_model=List[TaskWithLabelsOut],
+    response_model_exclude_unset=True,
+)
+async def list_tasks(
+    request: Request,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[str] = None,
+    stream: bool = False,
+    include: List[Literal["labels"]] = Query([]),
+    task_status: List[Task.Status] = Query([], alias="status"),
+    due_after: Optional[datetime.date] = None,
+    due_before: Optional[datetime.date] = None,
+    has_parent: Optional[bool] = None,
+    sort: TaskSort = "id",
+) -> Union[List[TaskWithLabelsOut], Response]:
+    """
+    Lists the current user's tasks. ``status`` can be repeated to match any
+    of several statuses, ``due_after`` is inclusive and ``due_before`` is
+    exclusive, and ``has_parent`` picks subtasks or top level tasks.
+    """
+    where = Task.assignee_id == request.user.user_id
+    for condition in task_filters(task_status, due_after, due_before, has_parent):
+        where = where & condition
+    return await paginate_tasks(request, where, limit, after, stream, include, sort)
+
+
+def search_terms(text: str) -> Optional[str]:
+    """
+    Builds a ``tsquery`` matching every word in ``text`` as a prefix, so
+    results appear while the user is still typing. Only word characters are
+    kept, so the user can't inject ``tsquery`` syntax.
+    """
+    words = re.findall(r"\w+", text)
+    if not words:
+        return None
+    return " & ".join(f"{word}:*" for word in words)
+
+
+def search_query(
+    terms: str,
+    user_id: int,
+    limit: int,
+    after: Optional[List[Any]] = None,
+) -> Raw:
+    """
+    The matching tasks, best first, using the GIN index on the generated
+    ``search_vector`` column. Pages are keyed on ``(rank, id)``.
+    """
+    conditions = ["task.assignee_id = {}", "task.search_vector @@ query"]
+    args: List[Any] = [terms, user_id]
+    if after is not None:
+        conditions.append("(rank < {}::real OR (rank = {}::real AND task.id > {}))")
+        args += [after[0], after[0], after[1]]
+    return Task.raw(
+        f"SELECT {task_columns('task')}, rank "
+        "FROM task, to_tsquery('english', {}) query, "
+        "ts_rank(task.search_vector, query) rank "
+        f"WHERE {' AND '.join(conditions)} "
+        "ORDER BY rank DESC, task.id LIMIT {}",
+        *args,
+        limit + 1,
+    )
+
+
+@router.get("/tasks/search", response_model=List[TaskModelOut])
+async def search_tasks(
+    request: Request,
+    q: str = Query(..., min_length=1, max_length=MAX_SEARCH_LENGTH),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[str] = None,
+) -> Union[List[TaskModelOut], Response]:
+    """
+    Searches the name and description of the current user's tasks, with the
+    best matches first. Each word in ``q`` matches as a prefix.
+    """
+    terms = search_terms(q)
+    if terms is None:
+        return JSONResponse(
+            {"detail": "q must contain a word"},
+            status_code=status.HTTP_400_BAD_REQUEST,
+        )
+    try:
+        cursor = decode_cursor(after, (float, int))
+    except InvalidCursor as error:
+        return JSONResponse(
+            {"detail": str(error)}, status_code=status.HTTP_400_BAD_REQUEST
+        )
+
+    tasks = await replicas.read(
+        search_query(terms, request.user.user_id, limit, cursor)
+    )
+    headers = {}
+    if len(tasks) > limit:
+        tasks = tasks[:limit]
+        headers[NEXT_CURSOR_HEADER] = encode_cursor(tasks[-1]["rank"], tasks[-1]["id"])
+    return ORJSONResponse([task_encoder.project(x) for x in tasks], headers=headers)
+
+
 @router.post("/tasks/", response_model=TaskModelOut)
 async def create_task(task_model: TaskModelIn) -> TaskModelOut:
     DB = Task._meta.db
@@ -36,97 +410,568 @@ async def create_task(task_model: TaskModelIn) -> TaskModelOut:
     return task.to_dict()
 
 
-@router.put("/tasks/{task_id}/", response_model=TaskModelIn)
-async def update_task(
-    task_id: int, task_model: TaskModelIn
-) -> Union[TaskModelOut, JSONResponse]:
+async def existing_ids(table: Type[Table], ids: Set[int]) -> Set[int]:
+    if not ids:
+        return set()
+    primary_key = table._meta.primary_key
+    rows = await table.select(primary_key).where(primary_key.is_in(list(ids)))
+    return {row[primary_key._meta.name] for row in rows}
+
+
+def column_problem(table: Type[Table], values: Dict[str, Any]) -> Optional[str]:
+    """
+    Checks the values given for ``table``'s columns, which the pydantic
+    models don't - a ``None`` for a column which isn't nullable, or a value
+    which isn't one of the column's choices.
+    """
+    for column in table._meta.non_default_columns:
+        name = column._meta.name
+        if name not in values:
+            continue
+        value = values[name]
+        if value is None and not column._meta.null:
+            return f"{name} is required"
+        if (
+            value is not None
+            and column._meta.choices
+            and value not in {x.value for x in column._meta.choices}
+        ):
+            return f"{value} is not a valid {name}"
+    return None
+
+
+async def check_tasks(rows: Sequence[Dict[str, Any]]) -> Dict[int, str]:
+    """
+    Checks a batch of task values in a single pass, returning the problems
+    found keyed by position, so one bad item doesn't fail the whole batch.
+    Only the columns present in each row are checked, so partial updates
+    can be checked too.
+    """
+    assignee_ids = await existing_ids(
+        BaseUser, {x["assignee_id"] for x in rows if "assignee_id" in x}
+    )
+    parent_ids = await existing_ids(
+        Task, {x["parent_task"] for x in rows if x.get("parent_task") is not None}
+    )
+
+    problems = {}
+    for index, row in enumerate(rows):
+        problem = column_problem(Task, row)
+        if problem is not None:
+            problems[index] = problem
+        elif "assignee_id" in row and row["assignee_id"] not in assignee_ids:
+            problems[index] = f"User {row['assignee_id']} does not exist"
+        elif (
+            row.get("parent_task") is not None and row["parent_task"] not in parent_ids
+        ):
+            problems[index] = f"Task {row['parent_task']} does not exist"
+    return problems
+
+
+async def insert_tasks(rows: List[Dict]) -> List[int]:
     DB = Task._meta.db
+    async with DB.transaction() as transaction:
+        if len(rows) < BULK_COPY_THRESHOLD:
+            inserted = await Task.insert(*[Task(**row) for row in rows]).returning(
+                Task.id
+            )
+            return [x["id"] for x in inserted]
 
-    task = await Task.objects().get(Task.id == task_id)
-    if not task:
-        return JSONResponse({}, status_code=status.HTTP_404_NOT_FOUND)
+        ids = await reserve_ids(Task, len(rows))
+        columns = Task._meta.non_default_columns
+        await transaction.connection.copy_records_to_table(
+            Task._meta.tablename,
+            columns=[Task.id._meta.db_column_name]
+            + [x._meta.db_column_name for x in columns],
+            records=[
+                (id, *[row[x._meta.name] for x in columns])
+                for id, row in zip(ids, rows)
+            ],
+        )
+        return ids
 
-    for key, value in task_model.model_dump().items():
-        setattr(task, key, value)
 
+async def update_tasks(task_models: List[TaskBulkUpdateIn], user_id: int) -> Set[int]:
+    """
+    Updates every task assigned to ``user_id`` with a single
+    ``UPDATE ... FROM unnest(...)``, returning the ids which matched a row.
+    """
+    DB = Task._meta.db
+    columns = Task._meta.non_default_columns
+    names = ", ".join(f'"{x._meta.db_column_name}"' for x in columns)
+    array_types = ", ".join(f"{{}}::{x.column_type}[]" for x in columns)
+    assignments = ", ".join(
+        f'"{x._meta.db_column_name}" = v."{x._meta.db_column_name}"' for x in columns
+    )
     async with DB.transaction():
-        await task.save()
+        updated = await Task.raw(
+            f"UPDATE task SET {assignments} "
+            f"FROM unnest({{}}::INTEGER[], {array_types}) AS v(id, {names}) "
+            "WHERE task.id = v.id AND task.assignee_id = {} RETURNING task.id",
+            [x.id for x in task_models],
+            *[
+                [getattr(x, column._meta.name) for x in task_models]
+                for column in columns
+            ],
+            user_id,
+        )
+    return {x["id"] for x in updated}
 
-    return task.to_dict()
 
+@router.post("/tasks/bulk", response_model=List[TaskBulkResultOut])
+async def create_tasks(
+    task_models: Annotated[List[TaskModelIn], Body(max_length=MAX_BULK_SIZE)]
+) -> List[TaskBulkResultOut]:
+    problems = await check_tasks([x.model_dump() for x in task_models])
+    valid = [
+        (index, task_model.model_dump())
+        for index, task_model in enumerate(task_models)
+        if index not in problems
+    ]
+    ids = await insert_tasks([row for _, row in valid]) if valid else []
 
-@router.delete("/tasks/{task_id}/")
-async def delete_task(request: Request, task_id: int) -> JSONResponse:
-    DB = Task._meta.db
+    results = [
+        TaskBulkResultOut(index=index, status="invalid", detail=detail)
+        for index, detail in problems.items()
+    ]
+    results += [
+        TaskBulkResultOut(index=index, id=id, status="created")
+        for (index, _), id in zip(valid, ids)
+    ]
+    return sorted(results, key=lambda x: x.index)
+
+
+@router.put("/tasks/bulk", response_model=List[TaskBulkResultOut])
+async def update_tasks_in_bulk(
+    request: Request,
+    task_models: Annotated[List[TaskBulkUpdateIn], Body(max_length=MAX_BULK_SIZE)],
+) -> List[TaskBulkResultOut]:
+    problems = await check_tasks([x.model_dump() for x in task_models])
+    seen_ids: Set[int] = set()
+    for index, task_model in enumerate(task_models):
+        if task_model.id in seen_ids:
+            problems.setdefault(index, f"Task {task_model.id} is repeated")
+        seen_ids.add(task_model.id)
 
-    task = await Task.objects().get(Task.id == task_id)
+    valid = [x for index, x in enumerate(task_models) if index not in problems]
+    updated_ids = await update_tasks(valid, request.user.user_id) if valid else set()
+
+    # Missing tasks, and other users' tasks, are skipped by the update.
+    skipped = set()
+    for index, task_model in enumerate(task_models):
+        if index not in problems and task_model.id not in updated_ids:
+            problems[index] = f"Task {task_model.id} is not one of your tasks"
+            skipped.add(index)
+
+    results = []
+    for index, task_model in enumerate(task_models):
+        if index in skipped:
+            results.append(
+                TaskBulkResultOut(
+                    index=index,
+                    id=task_model.id,
+                    status="not_found",
+                    detail=problems[index],
+                )
+            )
+        elif index in problems:
+            results.append(
+                TaskBulkResultOut(index=index, status="invalid", detail=problems[index])
+            )
+        else:
+            results.append(
+                TaskBulkResultOut(index=index, id=task_model.id, status="updated")
+            )
+    return results
+
+
+def invalid_response(detail: str) -> JSONResponse:
+    return JSONResponse(
+        {"detail": detail}, status_code=status.HTTP_422_UNPROCESSABLE_ENTITY
+    )
+
+
+async def update_returning(
+    table: Type[Table],
+    row_id: int,
+    values: Dict[str, Any],
+    where: Optional[Combinable] = None,
+) -> Optional[Dict[str, Any]]:
+    """
+    Updates a row with a single ``UPDATE ... RETURNING`` statement, returning
+    the new row, or ``None`` if it doesn't exist or doesn't match ``where``.
+    """
+    condition: Combinable = table._meta.primary_key == row_id
+    if where is not None:
+        condition = condition & where
+    if values:
+        query = table.update(values).where(condition)
+        rows = await query.returning(*table._meta.columns)
+        return rows[0] if rows else None
+    return await table.select().where(condition).first()
+
+
+async def update_task_values(
+    request: Request, task_id: int, values: Dict[str, Any]
+) -> Union[Dict[str, Any], JSONResponse]:
+    """
+    Updates one of the current user's tasks. Only the ``UPDATE`` is run -
+    the values are checked in Python, and a missing assignee or parent is
+    caught by its foreign key, rather than looked up first.
+    """
+    problem = column_problem(Task, values)
+    if problem is not None:
+        return invalid_response(problem)
+    try:
+        task = await update_returning(
+            Task, task_id, values, where=Task.assignee_id == request.user.user_id
+        )
+    except asyncpg.ForeignKeyViolationError as error:
+        return invalid_response(error.detail or str(error))
     if not task:
         return JSONResponse({}, status_code=status.HTTP_404_NOT_FOUND)
-    history_representation = json.dumps(
-        TaskModelOut(**task.to_dict()).model_dump(), default=str
+    return task
+
+
+@router.put("/tasks/{task_id}/", response_model=TaskModelOut)
+async def update_task(
+    request: Request, task_id: int, task_model: TaskModelIn
+) -> Union[TaskModelOut, JSONResponse]:
+    return await update_task_values(request, task_id, task_model.model_dump())
+
+
+@router.patch("/tasks/{task_id}/", response_model=TaskModelOut)
+async def patch_task(
+    request: Request, task_id: int, task_model: TaskModelPatch
+) -> Union[TaskModelOut, JSONResponse]:
+    return await update_task_values(
+        request, task_id, task_model.model_dump(exclude_unset=True)
     )
 
-    async with DB.transaction():
-        await TaskHistory.objects().create(
-            task_id=task.id,
-            serialized_data=history_representation,
-            deleted_by=request.user.user_id,
+
+async def archive_tasks(task_ids: List[int], deleted_by: int) -> List[int]:
+    """
+    Deletes the tasks assigned to ``deleted_by`` along with all of their
+    subtasks, which would otherwise be removed by the cascade without a
+    history record. Each deleted row is
+    serialised into ``TaskHistory`` by the same statement, along with the ids
+    of its labels, so that a restore can relink them.
+    """
+    columns = task_columns()
+    archived = await TaskHistory.raw(
+        f"""
+        WITH RECURSIVE subtree AS (
+            SELECT id FROM task WHERE id = ANY({{}}) AND assignee_id = {{}}
+            UNION
+            SELECT task.id FROM task JOIN subtree ON task.parent_task = subtree.id
+        ), deleted AS (
+            DELETE FROM task WHERE id IN (SELECT id FROM subtree)
+            RETURNING {columns}
         )
-        await task.remove()
+        INSERT INTO task_history (task_id, serialized_data, deleted_by)
+        SELECT
+            deleted.id,
+            to_jsonb(deleted) || jsonb_build_object(
+                'labels',
+                (
+                    SELECT coalesce(
+                        jsonb_agg(task_label.label ORDER BY task_label.id), '[]'
+                    )
+                    FROM task_label WHERE task_label.task = deleted.id
+                )
+            ),
+            {{}}
+        FROM deleted
+        RETURNING task_id
+        """,
+        task_ids,
+        deleted_by,
+        deleted_by,
+    )
+    return [x["task_id"] for x in archived]
+
+
+@router.delete("/tasks/bulk", response_model=TaskDeleteOut)
+async def delete_tasks(request: Request, delete_spec: TaskDeleteIn) -> TaskDeleteOut:
+    deleted_ids = await archive_tasks(delete_spec.delete_ids, request.user.user_id)
+    return TaskDeleteOut(deleted_ids=deleted_ids)
+
 
+@router.delete("/tasks/{task_id}/")
+async def delete_task(request: Request, task_id: int) -> JSONResponse:
+    if not await archive_tasks([task_id], request.user.user_id):
+        return JSONResponse({}, status_code=status.HTTP_404_NOT_FOUND)
     return JSONResponse({})
 
 
-@router.get("/tasks/{task_id}/subtasks/", response_model=List[TaskModelOut])
-async def list_subtasks(request: Request, task_id: int) -> List[TaskModelOut]:
-    return (
-        await Task.select()
-        .where(
-            (Task.assignee_id == request.user.user_id) & (Task.parent_task == task_id)
+@router.get(
+    "/tasks/{task_id}/subtasks/",
+    response_model=List[TaskWithLabelsOut],
+    response_model_exclude_unset=True,
+)
+async def list_subtasks(
+    request: Request,
+    task_id: int,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[str] = None,
+    stream: bool = False,
+    include: List[Literal["labels"]] = Query([]),
+) -> Union[List[TaskWithLabelsOut], Response]:
+    return await paginate_tasks(
+        request,
+        (Task.assignee_id == request.user.user_id) & (Task.parent_task == task_id),
+        limit,
+        after,
+        stream,
+        include,
+    )
+
+
+def tree_query(task_id: int, user_id: int, depth: int) -> Raw:
+    columns = task_columns("task")
+    # The recursive query is unordered so it can stop as soon as the limit is
+    # reached - it emits the tree breadth first. The path guards against
+    # cycles in ``parent_task``.
+    return Task.raw(
+        f"""
+        WITH RECURSIVE tree AS (
+            SELECT {columns}, 0 AS depth, ARRAY[task.id] AS path
+            FROM task
+            WHERE task.id = {{}} AND task.assignee_id = {{}}
+            UNION ALL
+            SELECT {columns}, tree.depth + 1, tree.path || task.id
+            FROM task JOIN tree ON task.parent_task = tree.id
+            WHERE tree.depth < {{}}
+            AND task.assignee_id = {{}}
+            AND task.id <> ALL(tree.path)
         )
-        .order_by(Task.id)
+        SELECT {task_columns("tree")}, tree.depth
+        FROM tree LIMIT {{}}
+        """,
+        task_id,
+        user_id,
+        depth,
+        user_id,
+        MAX_TREE_NODES + 1,
     )
 
 
-@router.get("/tasks/deleted/", response_model=List[TaskModelOut])
-async def list_deleted() -> List[TaskModelOut]:
-    historical_tasks = await TaskHistory.objects().order_by(TaskHistory.id)
+@router.get(
+    "/tasks/{task_id}/tree",
+    response_model=Union[TaskTreeOut, List[TaskTreeNodeOut]],
+)
+async def get_task_tree(
+    request: Request,
+    task_id: int,
+    depth: int = Query(MAX_TREE_DEPTH, ge=0, le=MAX_TREE_DEPTH),
+    flat: bool = False,
+) -> Union[TaskTreeOut, List[TaskTreeNodeOut], Response]:
+    """
+    Fetches a task and its subtasks, down to ``depth`` levels, with a single
+    recursive query. At most ``MAX_TREE_NODES`` tasks are returned - if the
+    tree is larger, the deepest levels are cut off and the
+    ``X-Tree-Truncated`` header is set.
+    """
+    nodes = await replicas.read(tree_query(task_id, request.user.user_id, depth))
+    if not nodes:
+        return JSONResponse({}, status_code=status.HTTP_404_NOT_FOUND)
+    headers = {}
+    if len(nodes) > MAX_TREE_NODES:
+        nodes = nodes[:MAX_TREE_NODES]
+        headers[TREE_TRUNCATED_HEADER] = "true"
+    nodes.sort(key=lambda x: (x["depth"], x["id"]))
+
+    if flat:
+        return ORJSONResponse(nodes, headers=headers)
+
+    nodes_by_id = {x["id"]: {**task_encoder.project(x), "subtasks": []} for x in nodes}
+    for node in nodes[1:]:
+        nodes_by_id[node["parent_task"]]["subtasks"].append(nodes_by_id[node["id"]])
+    return ORJSONResponse(nodes_by_id[task_id], headers=headers)
+
+
+def hot_statements() -> List[str]:
+    """
+    The statements run by the busiest routes, which are prepared on every
+    new pool connection. They're built by the same functions as the routes
+    use, so the SQL matches exactly and hits asyncpg's statement cache.
+    """
+    page_size = DEFAULT_PAGE_SIZE + 1
+    queries: List[Union[Select, Raw]] = [
+        task_page(Task.assignee_id == 0).limit(page_size),
+        task_page(Task.assignee_id == 0, cursor=[0]).limit(page_size),
+        task_page((Task.assignee_id == 0) & (Task.parent_task == 0)).limit(page_size),
+        tree_query(0, 0, MAX_TREE_DEPTH),
+    ]
     return [
-        TaskModelOut(**json.loads(deleted.serialized_data))
-        for deleted in historical_tasks
+        query.querystrings[0].compile_string(engine_type="postgres")[0]
+        for query in queries
     ]
 
 
-@router.post("/tasks/deleted/restore", response_model=List[TaskModelOut])
-async def restore_deleted_tasks(restore_spec: TaskRestoreIn) -> List[TaskModelOut]:
-    DB = Task._meta.db
+@router.get("/tasks/deleted/", response_model=List[TaskModelOut])
+async def list_deleted(
+    request: Request,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[str] = None,
+    deleted_after: Optional[datetime.datetime] = None,
+    deleted_before: Optional[datetime.datetime] = None,
+    task_status: List[Task.Status] = Query([], alias="status"),
+) -> Union[List[TaskModelOut], Response]:
+    """
+    Lists the tasks deleted by, or previously assigned to, the current user,
+    ordered by when they were deleted. The archived rows are unpacked with
+    ``jsonb_populate_record``, so the payloads are never parsed in Python.
+    """
+    try:
+        cursor = decode_cursor(after, (str, int))
+        cursor_deleted_on = (
+            datetime.datetime.fromisoformat(cursor[0]) if cursor else None
+        )
+    except ValueError as error:
+        return JSONResponse(
+            {"detail": str(error)}, status_code=status.HTTP_400_BAD_REQUEST
+        )
 
-    def historical_model_to_task(history: TaskHistory) -> Task:
-        return Task(**TaskModelOut(**json.loads(history.serialized_data)).model_dump())
+    conditions = [
+        "(history.deleted_by = {} "
+        "OR (history.serialized_data ->> 'assignee_id')::integer = {})"
+    ]
+    args: List[Any] = [request.user.user_id, request.user.user_id]
+    if deleted_after is not None:
+        conditions.append("history.deleted_on >= {}::timestamptz")
+        args.append(deleted_after)
+    if deleted_before is not None:
+        conditions.append("history.deleted_on < {}::timestamptz")
+        args.append(deleted_before)
+    if task_status:
+        conditions.append("history.serialized_data ->> 'status' = ANY({})")
+        args.append([x.value for x in task_status])
+    if cursor is not None:
+        conditions.append("(history.deleted_on, history.id) > ({}, {})")
+        args += [cursor_deleted_on, cursor[1]]
 
-    tasks_to_restore = await TaskHistory.objects().where(
-        TaskHistory.task_id.is_in(restore_spec.restore_ids)
+    columns = task_columns("task")
+    tasks = await replicas.read(
+        TaskHistory.raw(
+            f"SELECT history.id AS history_id, history.deleted_on, {columns} "
+            "FROM task_history history, "
+            "jsonb_populate_record(NULL::task, history.serialized_data) task "
+            f"WHERE {' AND '.join(conditions)} "
+            "ORDER BY history.deleted_on, history.id LIMIT {}",
+            *args,
+            limit + 1,
+        )
     )
+    headers = {}
+    if len(tasks) > limit:
+        tasks = tasks[:limit]
+        headers[NEXT_CURSOR_HEADER] = encode_cursor(
+            tasks[-1]["deleted_on"].isoformat(), tasks[-1]["history_id"]
+        )
+    return ORJSONResponse([task_encoder.project(x) for x in tasks], headers=headers)
 
-    restored_tasks = [historical_model_to_task(x) for x in tasks_to_restore]
 
-    async with DB.transaction():
-        await TaskHistory.delete().where(
-            TaskHistory.task_id.is_in(restore_spec.restore_ids)
+@router.post("/tasks/deleted/restore", response_model=TaskRestoreOut)
+async def restore_deleted_tasks(
+    request: Request, restore_spec: TaskRestoreIn
+) -> Dict[str, Any]:
+    """
+    Restores the latest archived copy of each task deleted by, or previously
+    assigned to, the current user, and relinks the labels which still exist,
+    in a single statement. A subtask is only restored along with its parent,
+    or if its parent still exists - otherwise it's reported as a
+    ``missing_parent`` conflict. Ids with no history the user can restore
+    are ``not_found``, and ids which are already in use are ``exists``.
+    """
+    columns = task_columns()
+    rows = await Task.raw(
+        f"""
+        WITH RECURSIVE config AS (
+            -- Reported on the change feed as restored, rather than created.
+            SELECT set_config({{}}, 'restored', true)
+        ), requested AS (
+            SELECT DISTINCT ON (history.task_id)
+                history.task_id AS id,
+                history.serialized_data AS data,
+                jsonb_populate_record(NULL::task, history.serialized_data) AS task
+            FROM task_history history, config
+            WHERE history.task_id = ANY({{}})
+            AND (
+                history.deleted_by = {{}}
+                OR (history.serialized_data ->> 'assignee_id')::integer = {{}}
+            )
+            ORDER BY history.task_id, history.deleted_on DESC
+        ), restorable AS (
+            SELECT requested.id, requested.task, 0 AS depth FROM requested
+            WHERE NOT EXISTS (SELECT FROM task WHERE task.id = requested.id)
+            AND (
+                (requested.task).parent_task IS NULL
+                OR EXISTS (
+                    SELECT FROM task WHERE task.id = (requested.task).parent_task
+                )
+            )
+            UNION ALL
+            SELECT requested.id, requested.task, restorable.depth + 1
+            FROM requested
+            JOIN restorable ON (requested.task).parent_task = restorable.id
+            WHERE NOT EXISTS (SELECT FROM task WHERE task.id = requested.id)
+        ), inserted AS (
+            INSERT INTO task ({columns})
+            SELECT {task_columns("(restorable.task)")} FROM restorable
+            ORDER BY restorable.depth
+            ON CONFLICT (id) DO NOTHING
+            RETURNING {columns}
+        ), relinked AS (
+            INSERT INTO task_label (task, label)
+            SELECT inserted.id, label.id
+            FROM inserted
+            JOIN requested ON requested.id = inserted.id
+            CROSS JOIN jsonb_array_elements_text(
+                coalesce(requested.data -> 'labels', '[]')
+            ) archived (label_id)
+            JOIN label ON label.id = archived.label_id::integer
+        ), removed AS (
+            DELETE FROM task_history
+            WHERE task_id IN (SELECT inserted.id FROM inserted)
         )
-
-        await Task.insert(*restored_tasks)
-    return (
-        await Task.objects()
-        .where(Task.id.is_in(restore_spec.restore_ids))
-        .order_by(Task.id)
+        SELECT
+            ids.id AS requested_id,
+            CASE
+                WHEN inserted.id IS NOT NULL THEN NULL
+                WHEN EXISTS (SELECT FROM task WHERE task.id = ids.id) THEN 'exists'
+                WHEN requested.id IS NULL THEN 'not_found'
+                WHEN restorable.id IS NULL THEN 'missing_parent'
+                -- Restored by a concurrent request.
+                ELSE 'exists'
+            END AS conflict,
+            {task_columns("inserted")}
+        FROM (SELECT DISTINCT unnest({{}}::integer[]) AS id) ids
+        LEFT JOIN requested ON requested.id = ids.id
+        LEFT JOIN restorable ON restorable.id = ids.id
+        LEFT JOIN inserted ON inserted.id = ids.id
+        ORDER BY ids.id
+        """,
+        CHANGE_EVENT_SETTING,
+        restore_spec.restore_ids,
+        request.user.user_id,
+        request.user.user_id,
+        restore_spec.restore_ids,
     )
+    return {
+        "restored": [task_encoder.project(x) for x in rows if x["conflict"] is None],
+        "conflicts": [
+            {"id": x["requested_id"], "reason": x["conflict"]}
+            for x in rows
+            if x["conflict"] is not None
+        ],
+    }
 
 
 @router.get("/tasks/{task_id}/labels/", response_model=List[TaskLabelOut])
 async def list_task_labels(task_id: int) -> List[TaskLabelOut]:
-    return (
-        await TaskLabel.objects(TaskLabel.label)
+    return await replicas.read(
+        TaskLabel.objects(TaskLabel.label)
         .where(TaskLabel.task == task_id)
         .order_by(TaskLabel.id)
     )
@@ -135,37 +980,67 @@ async def list_task_labels(task_id: int) -> List[TaskLabelOut]:
 @router.post("/tasks/{task_id}/labels/", response_model=List[TaskLabelOut])
 async def set_task_labels(
     task_id: int, labels: List[TaskLabelIn]
-) -> List[TaskLabelOut]:
-    DB = TaskLabel._meta.db
-
-    new_task_labels = {x.label for x in labels}
-    existing_task_labels = (
-        await TaskLabel.select(TaskLabel.label)
-        .where(TaskLabel.task == task_id)
-        .distinct()
-    )
-    existing_task_label_ids = {x["label"] for x in existing_task_labels}
-    async with DB.transaction():
-        await TaskLabel.delete().where(
-            (TaskLabel.label.not_in(new_task_labels) & (TaskLabel.task == task_id))
-        )
-        await TaskLabel.insert(
-            *[
-                TaskLabel(task=task_id, label=x.label)
-                for x in labels
-                if x.label not in existing_task_label_ids
-            ]
+) -> List[Dict[str, Any]]:
+    """
+    Replaces the task's labels in a single statement, which removes the
+    labels not in ``labels``, adds the missing ones and returns the result.
+    Concurrent calls can't link a label twice, as the insert skips rows
+    which conflict with the unique ``(task, label)`` index.
+    """
+    label_ids = [x.label for x in labels]
+    label_columns = [x._meta.db_column_name for x in Label._meta.columns]
+    selected = ", ".join(f'label."{x}" AS "label.{x}"' for x in label_columns)
+    rows = await TaskLabel.raw(
+        f"""
+        WITH requested AS (
+            SELECT requested.label
+            FROM unnest({{}}::integer[]) WITH ORDINALITY requested (label, position)
+            GROUP BY requested.label
+            ORDER BY min(requested.position)
+        ), removed AS (
+            DELETE FROM task_label
+            WHERE task = {{}} AND label <> ALL({{}}::integer[])
+            RETURNING id
+        ), added AS (
+            INSERT INTO task_label (task, label)
+            SELECT {{}}, requested.label FROM requested
+            ON CONFLICT (task, label) DO NOTHING
+            RETURNING id, label
         )
-    return (
-        await TaskLabel.objects(TaskLabel.label)
-        .where(TaskLabel.task == task_id)
-        .order_by(TaskLabel.id)
+        SELECT task_label.id, {selected}
+        FROM (
+            SELECT id, label FROM task_label
+            WHERE task = {{}} AND id NOT IN (SELECT id FROM removed)
+            UNION ALL
+            SELECT id, label FROM added
+        ) task_label
+        JOIN label ON label.id = task_label.label
+        ORDER BY task_label.id
+        """,
+        label_ids,
+        task_id,
+        label_ids,
+        task_id,
+        task_id,
     )
+    return [
+        {"id": x["id"], "label": {y: x[f"label.{y}"] for y in label_columns}}
+        for x in rows
+    ]
 
 
 @router.get("/labels", response_model=List[LabelModelOut])
-async def list_labels(request: Request) -> List[LabelModelOut]:
-    return await Label.select().order_by(Label.id)
+async def list_labels(request: Request) -> Response:
+    body, etag = await label_cache.get()
+    if etag_matches(request.headers.get("If-None-Match"), etag):
+        return Response(
+            status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag}
+        )
+    return Response(
+        body,
+        media_type="application/json",
+        headers={"ETag": etag, "Cache-Control": "no-cache"},
+    )
 
 
 @router.post("/labels/", response_model=LabelModelOut)
@@ -174,6 +1049,7 @@ async def create_label(task_model: LabelModelIn) -> LabelModelOut:
     label = Label(**task_model.model_dump())
     async with DB.transaction():
         await label.save()
+    label_cache.invalidate()
     return label.to_dict()
 
 
@@ -181,18 +1057,30 @@ async def create_label(task_model: LabelModelIn) -> LabelModelOut:
 async def update_label(
     label_id: int, label_model: LabelModelIn
 ) -> Union[LabelModelOut, JSONResponse]:
-    DB = Label._meta.db
-    label = await Label.objects().get(Label.id == label_id)
+    values = label_model.model_dump()
+    problem = column_problem(Label, values)
+    if problem is not None:
+        return invalid_response(problem)
+    label = await update_returning(Label, label_id, values)
+    label_cache.invalidate()
     if not label:
         return JSONResponse({}, status_code=status.HTTP_404_NOT_FOUND)
+    return label
 
-    for key, value in label_model.model_dump().items():
-        setattr(label, key, value)
-
-    async with DB.transaction():
-        await label.save()
 
-    return label.to_dict()
+@router.patch("/labels/{label_id}/", response_model=LabelModelOut)
+async def patch_label(
+    label_id: int, label_model: LabelModelPatch
+) -> Union[LabelModelOut, JSONResponse]:
+    values = label_model.model_dump(exclude_unset=True)
+    problem = column_problem(Label, values)
+    if problem is not None:
+        return invalid_response(problem)
+    label = await update_returning(Label, label_id, values)
+    label_cache.invalidate()
+    if not label:
+        return JSONResponse({}, status_code=status.HTTP_404_NOT_FOUND)
+    return label
 
 
 @router.delete("/labels/{label_id}/")
@@ -204,5 +1092,6 @@ async def delete_label(label_id: int) -> JSONResponse:
 
     async with DB.transaction():
         await label.remove()
+    label_cache.invalidate()
 
     return JSONResponse({})
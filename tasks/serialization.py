@@ -0,0 +1,64 @@
+import datetime
+import uuid
+from typing import Any, Dict, Sequence, Tuple, Type
+
+from piccolo.table import Table
+from pydantic import BaseModel
+
+# The column types which orjson encodes the same way as Pydantic does.
+NATIVE_TYPES = (bool, int, float, str, datetime.date, datetime.datetime, uuid.UUID)
+
+
+class SchemaMismatch(RuntimeError):
+    pass
+
+
+def check_schema(
+    table: Type[Table], model: Type[BaseModel], extra_fields: Sequence[str] = ()
+) -> None:
+    """
+    Raises ``SchemaMismatch`` unless ``table``'s rows can be encoded as
+    ``model`` without validation - they must have the same fields, and each
+    column's type must be encoded the same way by orjson as by Pydantic.
+
+    :param extra_fields:
+        Fields of ``model`` which aren't columns of ``table``, and are added
+        to the rows separately.
+
+    """
+    columns = {column._meta.name: column for column in table._meta.columns}
+    expected = set(columns) | set(extra_fields)
+    if expected != set(model.model_fields):
+        raise SchemaMismatch(
+            f"{model.__name__} has the fields {sorted(model.model_fields)}, "
+            f"but {table.__name__} rows have {sorted(expected)}"
+        )
+    for name, column in columns.items():
+        if column.value_type not in NATIVE_TYPES:
+            raise SchemaMismatch(
+                f"{table.__name__}.{name} can't be encoded without validation"
+            )
+
+
+class RowEncoder:
+    """
+    Lets the rows returned by piccolo be encoded straight to JSON with
+    ``ORJSONResponse``, skipping the ``response_model`` validation FastAPI
+    otherwise does for every row.
+
+    The rows can only be trusted if they match the model, so this is checked
+    once, when the encoder is created, rather than once per row.
+    """
+
+    def __init__(self, table: Type[Table], model: Type[BaseModel]):
+        check_schema(table, model)
+        self.fields: Tuple[str, ...] = tuple(
+            column._meta.name for column in table._meta.columns
+        )
+
+    def project(self, row: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Drops any values in ``row`` which aren't part of the output, such as
+        the keyset values used for pagination.
+        """
+        return {name: row[name] for name in self.fields}
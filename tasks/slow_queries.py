@@ -0,0 +1,153 @@
+import asyncio
+import datetime
+import json
+import logging
+import re
+from logging.handlers import RotatingFileHandler
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+
+from piccolo.engine.postgres import PostgresEngine
+from piccolo.querystring import QueryString
+
+from tasks.metrics import request_stats, route_name
+
+MAX_PARAMETER_LENGTH = 200
+
+Query = Union[QueryString, str]
+
+# Calls which change state outside the transaction, so a rolled back
+# ``EXPLAIN ANALYZE`` would still have side effects - such as the
+# ``nextval`` calls which reserve ids.
+SIDE_EFFECTS = re.compile(
+    r"\b(nextval|setval|set_config|pg_notify|pg_advisory_\w*lock\w*)\s*\(",
+    re.IGNORECASE,
+)
+
+
+def compile_query(engine: PostgresEngine, query: Query) -> Tuple[str, Sequence[Any]]:
+    if isinstance(query, QueryString):
+        return query.compile_string(engine_type=engine.engine_type)
+    return query, []
+
+
+def format_parameter(value: Any) -> str:
+    text = repr(value)
+    if len(text) > MAX_PARAMETER_LENGTH:
+        return text[:MAX_PARAMETER_LENGTH] + "..."
+    return text
+
+
+class SlowQueryLog:
+    """
+    Writes the statements which take longer than ``threshold`` seconds to a
+    rotating log file, one JSON object per line, along with their
+    parameters, duration and the route which ran them.
+
+    With ``explain``, slow ``SELECT`` statements are run again with
+    ``EXPLAIN (ANALYZE, BUFFERS)`` in the background, inside a transaction
+    which is rolled back, and the plan is added to the entry. Statements
+    with side effects which a rollback can't undo are only planned, with a
+    plain ``EXPLAIN``. Only one plan
+    is captured at a time, so a burst of slow queries doesn't make things
+    worse.
+    """
+
+    def __init__(
+        self,
+        threshold: float,
+        path: str = "slow_queries.log",
+        explain: bool = False,
+        max_bytes: int = 10 * 1024 * 1024,
+        backup_count: int = 5,
+    ):
+        self.threshold = threshold
+        self.explain = explain
+        self.logger = logging.getLogger(f"{__name__}.{path}")
+        self.logger.setLevel(logging.INFO)
+        self.logger.propagate = False
+        if not self.logger.handlers:
+            handler = RotatingFileHandler(
+                path, maxBytes=max_bytes, backupCount=backup_count, delay=True
+            )
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            self.logger.addHandler(handler)
+        self._explaining = False
+
+    def record(self, engine: PostgresEngine, query: Query, duration: float) -> None:
+        sql, args = compile_query(engine, query)
+        stats = request_stats.get()
+        entry: Dict[str, Any] = {
+            "time": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            "duration_ms": round(duration * 1000, 2),
+            "route": route_name(stats.scope) if stats else None,
+            "sql": sql,
+            "parameters": [format_parameter(x) for x in args],
+        }
+        if (
+            self.explain
+            and not self._explaining
+            and sql.lstrip()[:6].upper() == "SELECT"
+        ):
+            self._explaining = True
+            asyncio.ensure_future(
+                self._explain_and_write(
+                    engine, sql, args, entry, analyze=not SIDE_EFFECTS.search(sql)
+                )
+            )
+        else:
+            self.write(entry)
+
+    def write(self, entry: Dict[str, Any]) -> None:
+        self.logger.info(json.dumps(entry, default=str))
+
+    async def _explain_and_write(
+        self,
+        engine: PostgresEngine,
+        sql: str,
+        args: Sequence[Any],
+        entry: Dict[str, Any],
+        analyze: bool = True,
+    ) -> None:
+        try:
+            entry["plan"] = await self._explain(engine, sql, args, analyze)
+        except Exception as exception:
+            entry["plan_error"] = str(exception)
+        finally:
+            self._explaining = False
+        self.write(entry)
+
+    async def _explain(
+        self, engine: PostgresEngine, sql: str, args: Sequence[Any], analyze: bool
+    ) -> List[str]:
+        options = "(ANALYZE, BUFFERS) " if analyze else ""
+        pool = engine.pool
+        connection = await (pool.acquire() if pool else engine.get_new_connection())
+        try:
+            transaction = connection.transaction()
+            await transaction.start()
+            try:
+                rows = await connection.fetch(f"EXPLAIN {options}{sql}", *args)
+            finally:
+                await transaction.rollback()
+        finally:
+            if pool:
+                await pool.release(connection)
+            else:
+                await connection.close()
+        return [row[0] for row in rows]
+
+
+def slow_query_log_from_env(environ: Dict[str, str]) -> Optional[SlowQueryLog]:
+    """
+    The log is only enabled when ``SLOW_QUERY_THRESHOLD_MS`` is set.
+    ``SLOW_QUERY_LOG`` sets the file, and ``SLOW_QUERY_EXPLAIN=true``
+    captures the plans.
+    """
+    threshold = environ.get("SLOW_QUERY_THRESHOLD_MS")
+    if not threshold:
+        return None
+    return SlowQueryLog(
+        threshold=float(threshold) / 1000,
+        path=environ.get("SLOW_QUERY_LOG", "slow_queries.log"),
+        explain=environ.get("SLOW_QUERY_EXPLAIN", "false").lower() == "true",
+    )
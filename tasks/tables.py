@@ -7,7 +7,8 @@ from piccolo.columns import (
     M2M,
     LazyTableReference,
     Integer,
-    JSON,
+    BigInt,
+    JSONB,
     Timestamp,
 )
 from piccolo.apps.user.tables import BaseUser
@@ -17,6 +18,16 @@ from piccolo.columns import OnDelete
 class Task(Table):
     """
     An example table.
+
+    Listings are served by the composite indexes ``(assignee_id, id)`` and
+    ``(assignee_id, parent_task, id)``, which are created in a raw migration
+    as Piccolo can't declare multi-column indexes. Filtered listings use the
+    partial indexes on unfinished tasks by ``(assignee_id, date_due, id)`` and
+    on top level tasks, along with ``(assignee_id, status, id)``.
+
+    Search uses the GIN index on ``search_vector``, a ``tsvector`` of the
+    name and description. It's a generated column added by a raw migration,
+    so it isn't declared here.
     """
 
     class Status(str, Enum):
@@ -31,14 +42,28 @@ class Task(Table):
         references=BaseUser, on_delete=OnDelete.restrict, null=False
     )
     status = Varchar(length=50, choices=Status, null=False, default=Status.pending)
-    parent_task = ForeignKey(references="self", on_delete=OnDelete.cascade, null=True)
+    parent_task = ForeignKey(
+        references="self", on_delete=OnDelete.cascade, null=True, index=True
+    )
     date_due = Date(null=True)
     labels = M2M(LazyTableReference("TaskLabel", module_path=__name__))
 
 
 class TaskHistory(Table):
-    task_id = Integer(unique=True)
-    serialized_data = JSON()
+    """
+    Snapshots of deleted tasks, with the ids of their labels under
+    ``labels``. Listings are served by the raw migration indexes on
+    ``(deleted_by, deleted_on, id)`` and on the archived assignee.
+
+    The table is range partitioned by ``deleted_on`` month, so old history
+    can be dropped a partition at a time - see the ``prune_history``
+    command. Postgres can't enforce uniqueness across partitions, so
+    ``task_id`` only has a plain index, and the primary key is
+    ``(id, deleted_on)``.
+    """
+
+    task_id = Integer()
+    serialized_data = JSONB()
     deleted_on = Timestamp()
     deleted_by = ForeignKey(BaseUser, on_delete=OnDelete.restrict)
 
@@ -50,5 +75,21 @@ class Label(Table):
 
 
 class TaskLabel(Table):
+    """
+    Each label can only be applied to a task once - this is enforced by a
+    unique ``(task, label)`` index, created in a raw migration.
+    """
+
     task = ForeignKey(Task)
-    label = ForeignKey(Label)
+    label = ForeignKey(Label, index=True)
+
+
+class TaskVersion(Table):
+    """
+    A counter for each user, bumped by triggers in the same transaction as
+    any change to their tasks, or to the labels on them. Listings derive
+    their ETags from it, so an unchanged listing costs a single lookup.
+    """
+
+    user_id = ForeignKey(BaseUser, on_delete=OnDelete.cascade, null=False, unique=True)
+    version = BigInt(default=0)
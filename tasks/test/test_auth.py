@@ -0,0 +1,91 @@
+import datetime
+
+from fastapi import status
+from fastapi.testclient import TestClient
+from piccolo.utils.sync import run_sync
+from piccolo_api.session_auth.tables import SessionsBase
+
+from app import app, auth_backend
+from tasks.auth import CachedSessionsAuthBackend
+from tasks.notifications import listener
+from tasks.test.test_routers import TaskRouteTestCase
+
+
+class CustomSessions(SessionsBase, tablename="custom_sessions"):
+    pass
+
+
+class CachedSessionsAuthTestCase(TaskRouteTestCase):
+
+    def test__when_session_cached__database_not_consulted(self):
+        with self._get_authenticated_client() as client:
+            self.assertTrue(listener.is_listening)
+            self.assertEqual(
+                client.get("/task_manager/tasks").status_code, status.HTTP_200_OK
+            )
+            client.portal.call(SessionsBase.delete(force=True).run)
+            self.assertEqual(
+                client.get("/task_manager/tasks").status_code, status.HTTP_200_OK
+            )
+
+    def test__when_listener_disconnected__cache_bypassed(self):
+        client = self._get_authenticated_client()
+        self.assertFalse(listener.is_listening)
+        self.assertEqual(
+            client.get("/task_manager/tasks").status_code, status.HTTP_200_OK
+        )
+        SessionsBase.delete(force=True).run_sync()
+        self.assertEqual(
+            client.get("/task_manager/tasks").status_code,
+            status.HTTP_400_BAD_REQUEST,
+        )
+
+    def test__when_logged_out__cached_session_revoked(self):
+        client = self._get_authenticated_client()
+        self.assertEqual(
+            client.get("/task_manager/tasks").status_code, status.HTTP_200_OK
+        )
+        client.post("/logout/", follow_redirects=False)
+        self.assertEqual(
+            client.get("/task_manager/tasks").status_code,
+            status.HTTP_400_BAD_REQUEST,
+        )
+
+    def test__when_flushed__used_sessions_extended(self):
+        expiry_date = datetime.datetime.now() + datetime.timedelta(minutes=5)
+        session = SessionsBase.create_session_sync(
+            self.primary_user.id, expiry_date=expiry_date
+        )
+        client = TestClient(app, cookies={"id": session.token})
+        client.get("/task_manager/tasks")
+
+        run_sync(auth_backend.flush())
+        self.assertEqual(
+            SessionsBase.select(SessionsBase.expiry_date)
+            .where(SessionsBase.token == session.token)
+            .first()
+            .run_sync()["expiry_date"],
+            expiry_date + auth_backend.increase_expiry,
+        )
+
+    def test__when_custom_session_table__its_sessions_are_extended(self):
+        CustomSessions.create_table().run_sync()
+        self.addCleanup(CustomSessions.alter().drop_table().run_sync)
+        expiry_date = datetime.datetime.now() + datetime.timedelta(minutes=5)
+        session = CustomSessions.create_session_sync(
+            self.primary_user.id, expiry_date=expiry_date
+        )
+        backend = CachedSessionsAuthBackend(
+            session_table=CustomSessions,
+            increase_expiry=datetime.timedelta(minutes=20),
+        )
+        backend._used_tokens.add(session.token)
+
+        run_sync(backend.flush())
+        self.assertEqual(
+            CustomSessions.select(CustomSessions.expiry_date)
+            .where(CustomSessions.token == session.token)
+            .first()
+            .run_sync()["expiry_date"],
+            expiry_date + datetime.timedelta(minutes=20),
+        )
@@ -0,0 +1,70 @@
+import asyncio
+import json
+from typing import Any, Dict, Tuple
+from fastapi.testclient import TestClient
+from tasks.changes import RESET, ChangeFeed, change_feed
+from tasks.tables import Label
+from tasks.test.test_routers import TaskRouteTestCase
+
+
+class ChangeFeedTestCase(TaskRouteTestCase):
+    def _subscribe(self, client: TestClient, user_id: int) -> asyncio.Queue:
+        queue = client.portal.call(change_feed.subscribe, user_id)
+        self.addCleanup(change_feed.unsubscribe, user_id, queue)
+        return queue
+
+    def _next_event(
+        self, client: TestClient, queue: asyncio.Queue
+    ) -> Tuple[str, Dict[str, Any]]:
+        async def get() -> bytes:
+            return await asyncio.wait_for(queue.get(), 5)
+
+        event, data = client.portal.call(get).decode().strip().split("\n")
+        return event.removeprefix("event: "), json.loads(data.removeprefix("data: "))
+
+    def test__task_changes__reach_only_their_user(self):
+        task_id = self.primary_user_task.id
+        with self._get_authenticated_client() as client:
+            queue = self._subscribe(client, self.primary_user.id)
+            other_queue = self._subscribe(client, self.secondary_user.id)
+
+            client.patch(f"/task_manager/tasks/{task_id}/", json={"status": "Done"})
+            event, data = self._next_event(client, queue)
+            self.assertEqual(event, "task.updated")
+            self.assertEqual(data["ids"], [task_id])
+
+            client.delete(f"/task_manager/tasks/{task_id}/")
+            self.assertEqual(self._next_event(client, queue)[0], "task.deleted")
+
+            client.post(
+                "/task_manager/tasks/deleted/restore",
+                json={"restore_ids": [task_id]},
+            )
+            self.assertEqual(self._next_event(client, queue)[0], "task.restored")
+            self.assertTrue(other_queue.empty())
+
+    def test__label_changes__reach_every_user(self):
+        with self._get_authenticated_client() as client:
+            queues = [
+                self._subscribe(client, x.id)
+                for x in [self.primary_user, self.secondary_user]
+            ]
+            client.portal.call(Label.insert(Label(term="Shared")).run)
+            for queue in queues:
+                event, data = self._next_event(client, queue)
+                self.assertEqual(event, "label.created")
+                self.assertIsNone(data["user_id"])
+
+    def test__when_events_missed__subscriber_is_reset(self):
+        feed = ChangeFeed(queue_size=2)
+        queue = feed.subscribe(1)
+        payload = json.dumps(
+            {"table": "task", "event": "created", "user_id": 1, "ids": [1]}
+        )
+        for _ in range(3):
+            feed.publish(payload)
+        self.assertEqual(queue.get_nowait(), RESET)
+        self.assertTrue(queue.empty())
+
+        feed.publish(None)
+        self.assertEqual(queue.get_nowait(), RESET)
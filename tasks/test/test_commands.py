@@ -0,0 +1,115 @@
+import datetime
+import random
+from unittest import TestCase
+from piccolo.apps.migrations.commands.backwards import run_backwards
+from piccolo.apps.migrations.commands.forwards import run_forwards
+from piccolo.apps.user.tables import BaseUser
+from piccolo.utils.sync import run_sync
+from unittest.mock import patch
+from tasks.commands.generate_data import Generator, generate_data
+from tasks.commands.prune_history import history_partitions, prune_history
+from tasks.tables import Label, Task, TaskHistory, TaskLabel
+
+
+class GenerateDataTestCase(TestCase):
+    def setUp(self):
+        super().setUp()
+        run_sync(run_forwards("all"))
+
+    def tearDown(self):
+        super().tearDown()
+        run_sync(run_backwards("all", auto_agree=True))
+
+    def test__generate_data__loads_the_requested_shape(self):
+        tables = [BaseUser, Task, Label, TaskHistory, TaskLabel]
+        before = [table.count().run_sync() for table in tables]
+        run_sync(
+            generate_data(
+                users=3,
+                tasks_per_user=50,
+                tree_depth=2,
+                labels=5,
+                deleted_per_user=4,
+            )
+        )
+        added = [
+            table.count().run_sync() - count for table, count in zip(tables, before)
+        ]
+        self.assertEqual(added[:4], [3, 150, 5, 12])
+        self.assertTrue(added[4] > 0)
+        # The history is spread over the monthly partitions.
+        default_rows = TaskHistory.raw(
+            "SELECT count(*) FROM task_history_default"
+        ).run_sync()
+        self.assertEqual(default_rows[0]["count"], 0)
+
+        max_depth = Task.raw(
+            "WITH RECURSIVE tree AS ("
+            "SELECT id, 0 AS depth FROM task "
+            "WHERE parent_task IS NULL AND name LIKE 'Task %' "
+            "UNION ALL SELECT task.id, tree.depth + 1 "
+            "FROM task JOIN tree ON task.parent_task = tree.id"
+            ") SELECT max(depth) AS depth FROM tree"
+        ).run_sync()[0]["depth"]
+        self.assertEqual(max_depth, 2)
+
+    def test__generator__is_reproducible(self):
+        def generate():
+            generator = Generator(
+                random.Random(1), datetime.date(2024, 6, 1), 3, [1, 2, 3], 2
+            )
+            return generator.tasks(1, list(range(100)))
+
+        self.assertEqual(generate(), generate())
+
+
+class PruneHistoryTestCase(TestCase):
+    def setUp(self):
+        super().setUp()
+        run_sync(run_forwards("all"))
+        for deleted_on in ["1999-12-15", "2000-01-15"]:
+            TaskHistory.raw(
+                "INSERT INTO task_history (task_id, deleted_on) VALUES (1, {})",
+                datetime.datetime.fromisoformat(deleted_on),
+            ).run_sync()
+        # The 1999 row stays in the default partition.
+        TaskHistory.raw("SELECT create_task_history_partition('2000-01-01')").run_sync()
+
+    def tearDown(self):
+        super().tearDown()
+        TaskHistory.raw("DROP TABLE IF EXISTS archived_task_history_2000_01").run_sync()
+        run_sync(run_backwards("all", auto_agree=True))
+
+    def _prune(self, **kwargs):
+        with patch("builtins.print"):
+            run_sync(prune_history(**kwargs))
+
+    def test__old_partitions__are_dropped(self):
+        self.assertIn("task_history_2000_01", run_sync(history_partitions()))
+        self._prune(keep_months=12, months_ahead=2)
+
+        partitions = run_sync(history_partitions())
+        self.assertNotIn("task_history_2000_01", partitions)
+        next_month = datetime.date.today().replace(day=28) + datetime.timedelta(days=4)
+        self.assertIn(f"task_history_{next_month:%Y_%m}", partitions)
+        self.assertEqual(TaskHistory.count().run_sync(), 0)
+
+    def test__manually_named_partitions__are_left_alone(self):
+        TaskHistory.raw(
+            "CREATE TABLE task_history_manual PARTITION OF task_history "
+            "FOR VALUES FROM ('1990-01-01') TO ('1990-02-01')"
+        ).run_sync()
+        self._prune(keep_months=12)
+
+        partitions = run_sync(history_partitions())
+        self.assertIn("task_history_manual", partitions)
+        self.assertNotIn("task_history_2000_01", partitions)
+
+    def test__when_archiving__old_partitions_are_kept(self):
+        self._prune(keep_months=12, archive=True)
+        self.assertNotIn("task_history_2000_01", run_sync(history_partitions()))
+        self.assertEqual(TaskHistory.count().run_sync(), 0)
+        archived = TaskHistory.raw(
+            "SELECT count(*) FROM archived_task_history_2000_01"
+        ).run_sync()
+        self.assertEqual(archived[0]["count"], 1)
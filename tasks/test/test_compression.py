@@ -0,0 +1,176 @@
+import asyncio
+import gzip
+import os
+import tempfile
+import zlib
+from typing import List
+from unittest import TestCase
+from unittest.mock import patch
+from fastapi.testclient import TestClient
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Mount, Route
+from starlette.types import ASGIApp, Message
+from tasks.commands.compress_static import compress_static
+from tasks.compression import (
+    ENCODERS,
+    STATIC_SUFFIXES,
+    CompressionMiddleware,
+    PrecompressedStaticFiles,
+    negotiate,
+)
+
+ROWS = [{"id": x, "name": f"Task {x}"} for x in range(100)]
+
+
+async def large(request):
+    return JSONResponse(ROWS)
+
+
+async def small(request):
+    return JSONResponse({"id": 1})
+
+
+async def streamed(request):
+    async def chunks():
+        yield b"["
+        yield b'{"id": 1}'
+        yield b"]"
+
+    return StreamingResponse(chunks(), media_type="application/json")
+
+
+def build_app(**kwargs) -> CompressionMiddleware:
+    app = Starlette(
+        routes=[
+            Route("/large", large),
+            Route("/small", small),
+            Route("/streamed", streamed),
+        ]
+    )
+    return CompressionMiddleware(app, **kwargs)
+
+
+def run_app(app: ASGIApp, path: str) -> List[Message]:
+    """
+    Sends a gzip accepting ``GET`` for ``path`` to ``app``, returning the
+    messages it sends back.
+    """
+    messages: List[Message] = []
+
+    async def receive() -> Message:
+        return {"type": "http.disconnect"}
+
+    async def send(message: Message) -> None:
+        messages.append(message)
+
+    scope = {
+        "type": "http",
+        "method": "GET",
+        "path": path,
+        "root_path": "",
+        "query_string": b"",
+        "headers": [(b"accept-encoding", b"gzip")],
+    }
+    asyncio.run(app(scope, receive, send))
+    return messages
+
+
+class NegotiateTestCase(TestCase):
+    def test__highest_weight__is_chosen(self):
+        available = ["zstd", "br", "gzip"]
+        self.assertEqual(negotiate("gzip, br", available), "br")
+        self.assertEqual(negotiate("gzip, br;q=0.5", available), "gzip")
+        self.assertEqual(negotiate("*;q=0.1, zstd;q=0", available), "br")
+        self.assertIsNone(negotiate("identity", available))
+
+
+class CompressionMiddlewareTestCase(TestCase):
+    def test__large_response__is_compressed(self):
+        client = TestClient(build_app())
+        # Brotli and zstd are only available with the compression extra.
+        for encoding in ENCODERS:
+            response = client.get("/large", headers={"Accept-Encoding": encoding})
+            self.assertEqual(response.headers["Content-Encoding"], encoding)
+            self.assertEqual(response.headers["Vary"], "Accept-Encoding")
+            self.assertEqual(response.json(), ROWS)
+
+    def test__small_response__is_not_compressed(self):
+        client = TestClient(build_app())
+        response = client.get("/small", headers={"Accept-Encoding": "gzip"})
+        self.assertNotIn("Content-Encoding", response.headers)
+
+    def test__when_budget_spent__responses_are_not_compressed(self):
+        client = TestClient(build_app(cpu_budget=0))
+        response = client.get("/large", headers={"Accept-Encoding": "gzip"})
+        self.assertNotIn("Content-Encoding", response.headers)
+
+    def test__streamed_response__is_compressed_chunk_by_chunk(self):
+        messages = run_app(build_app(), "/streamed")
+
+        bodies = [x["body"] for x in messages if x["type"] == "http.response.body"]
+        self.assertGreaterEqual(len(bodies), 3)
+        # Each chunk can be decoded as soon as it arrives.
+        decoder = zlib.decompressobj(zlib.MAX_WBITS | 16)
+        self.assertEqual(decoder.decompress(bodies[0]), b"[")
+        self.assertEqual(decoder.decompress(bodies[1]), b'{"id": 1}')
+        self.assertEqual(b"".join(decoder.decompress(x) for x in bodies[2:]), b"]")
+
+    def test__when_no_body_message__start_message_is_sent_first(self):
+        start = {
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [(b"content-type", b"application/json")],
+        }
+        pathsend = {"type": "http.response.pathsend", "path": "/tmp/rows.json"}
+
+        async def app(scope, receive, send):
+            await send(start)
+            await send(pathsend)
+
+        messages = run_app(CompressionMiddleware(app), "/rows.json")
+        self.assertEqual(messages, [start, pathsend])
+        self.assertNotIn(b"content-encoding", dict(start["headers"]))
+
+
+class PrecompressedStaticFilesTestCase(TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.css = b"body { color: black; }\n" * 100
+        with open(os.path.join(self.directory.name, "main.css"), "wb") as file:
+            file.write(self.css)
+        app = Starlette(
+            routes=[
+                Mount(
+                    "/static", PrecompressedStaticFiles(directory=self.directory.name)
+                )
+            ]
+        )
+        self.client = TestClient(CompressionMiddleware(app))
+
+    def test__compress_static__writes_each_variant(self):
+        with patch("builtins.print"):
+            compress_static(self.directory.name)
+        self.assertEqual(
+            sorted(os.listdir(self.directory.name)),
+            sorted(["main.css"] + [f"main.css{STATIC_SUFFIXES[x]}" for x in ENCODERS]),
+        )
+        with open(os.path.join(self.directory.name, "main.css.gz"), "rb") as file:
+            self.assertEqual(gzip.decompress(file.read()), self.css)
+
+    def test__when_variant_accepted__it_is_served(self):
+        with patch("builtins.print"):
+            compress_static(self.directory.name)
+        response = self.client.get(
+            "/static/main.css", headers={"Accept-Encoding": "gzip"}
+        )
+        self.assertEqual(response.headers["Content-Encoding"], "gzip")
+        self.assertEqual(response.headers["Content-Type"], "text/css; charset=utf-8")
+        self.assertEqual(response.content, self.css)
+
+        response = self.client.get(
+            "/static/main.css", headers={"Accept-Encoding": "identity"}
+        )
+        self.assertNotIn("Content-Encoding", response.headers)
+        self.assertEqual(response.content, self.css)
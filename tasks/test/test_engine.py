@@ -0,0 +1,56 @@
+from unittest.mock import AsyncMock, patch
+from piccolo.utils.sync import run_sync
+import app as app_module
+from app import open_database_connection_pool
+from tasks.engine import InstrumentedPostgresEngine
+from tasks.routers import hot_statements
+from tasks.slow_queries import compile_query
+from tasks.tables import Task
+from tasks.test.test_routers import TaskRouteTestCase
+
+
+class ConnectionPoolTestCase(TaskRouteTestCase):
+    def test__hot_statements__match_the_routes(self):
+        statements = set()
+        record_query = InstrumentedPostgresEngine.record_query
+
+        def capture(engine, query, duration):
+            statements.add(compile_query(engine, query)[0])
+            record_query(engine, query, duration)
+
+        client = self._get_authenticated_client()
+        task_id = self.primary_user_task.id
+        with patch.object(InstrumentedPostgresEngine, "record_query", capture):
+            client.get("/task_manager/tasks")
+            client.get("/task_manager/tasks", params={"after": "WzFd"})
+            client.get(f"/task_manager/tasks/{task_id}/subtasks/")
+            client.get(f"/task_manager/tasks/{task_id}/tree")
+
+        for statement in hot_statements():
+            self.assertIn(statement, statements)
+
+    def test__pool__is_prewarmed_on_startup(self):
+        engine = Task._meta.db
+        with self._get_authenticated_client() as client:
+            self.assertEqual(engine.pool.get_size(), engine.pool.get_min_size())
+            client.get("/task_manager/tasks")
+            response = client.get("/metrics")
+        self.assertIn("db_pool_wait_seconds_count", response.text)
+
+    def test__streaming__releases_its_connection(self):
+        engine = Task._meta.db
+        with self._get_authenticated_client() as client:
+            response = client.get("/task_manager/tasks", params={"stream": True})
+            self.assertEqual(len(response.json()), 1)
+            self.assertEqual(engine.pool.get_idle_size(), engine.pool.get_size())
+
+    def test__startup__fails_after_retrying(self):
+        engine = Task._meta.db
+        with patch.object(app_module, "DB_CONNECT_BACKOFF", 0), patch.object(
+            engine, "start_connection_pool", AsyncMock(side_effect=OSError)
+        ) as start_connection_pool:
+            with self.assertRaises(RuntimeError):
+                run_sync(open_database_connection_pool())
+        self.assertEqual(
+            start_connection_pool.call_count, app_module.DB_CONNECT_ATTEMPTS
+        )
@@ -0,0 +1,41 @@
+from unittest import TestCase
+from fastapi import status
+from tasks.metrics import Histogram
+from tasks.test.test_routers import TaskRouteTestCase
+
+
+class HistogramTestCase(TestCase):
+    def test__observe__renders_cumulative_buckets(self):
+        histogram = Histogram("latency", "Latency.", ["route"], buckets=(0.1, 1.0))
+        histogram.observe(0.05, "/a")
+        histogram.observe(0.5, "/a")
+        histogram.observe(5, "/a")
+        self.assertEqual(
+            histogram.render().splitlines(),
+            [
+                "# HELP latency Latency.",
+                "# TYPE latency histogram",
+                'latency_bucket{route="/a",le="0.1"} 1.0',
+                'latency_bucket{route="/a",le="1.0"} 2.0',
+                'latency_bucket{route="/a",le="+Inf"} 3.0',
+                'latency_count{route="/a"} 3.0',
+                'latency_sum{route="/a"} 5.55',
+            ],
+        )
+
+
+class MetricsEndpointTestCase(TaskRouteTestCase):
+    def test__metrics__records_routes_and_queries(self):
+        client = self._get_authenticated_client()
+        with client:
+            client.get(f"/task_manager/tasks/{self.primary_user_task.id}/subtasks/")
+            response = client.get("/metrics")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        route = 'route="/task_manager/tasks/{task_id}/subtasks/"'
+        self.assertIn(
+            'http_request_duration_seconds_count{method="GET",'
+            f'{route},status="200"}}',
+            response.text,
+        )
+        self.assertIn(f'db_queries_per_request_bucket{{{route},le="1"}}', response.text)
+        self.assertIn('db_pool_connections{state="size"}', response.text)
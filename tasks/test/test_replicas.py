@@ -0,0 +1,69 @@
+import os
+from unittest.mock import patch
+from fastapi import status
+from tasks.engine import InstrumentedPostgresEngine
+from tasks.replicas import PRIMARY_PIN_COOKIE, replicas
+from tasks.tables import Task
+from tasks.test.test_routers import TaskRouteTestCase
+
+# A streaming replica of the test database, for example one created with
+# ``pg_basebackup -R``. Without one, a second engine on the primary stands in.
+REPLICA_PORT = os.environ.get("TEST_DB_REPLICA_PORT")
+
+
+class ReplicaTestCase(TaskRouteTestCase):
+    def setUp(self):
+        super().setUp()
+        self.engine = Task._meta.db
+        config = dict(self.engine.config)
+        if REPLICA_PORT:
+            config["port"] = int(REPLICA_PORT)
+        self.replica = InstrumentedPostgresEngine(config=config, extensions=())
+        self.engine.extra_nodes["replica"] = self.replica
+        self.replica_queries = []
+        record_query = self.replica.record_query
+        self.replica.record_query = lambda query, duration: (
+            self.replica_queries.append(query),
+            record_query(query, duration),
+        )
+
+    def tearDown(self):
+        self.engine.extra_nodes.clear()
+        super().tearDown()
+
+    def test__reads__go_to_the_replica(self):
+        with self._get_authenticated_client() as client:
+            self.assertEqual(replicas.healthy, {"replica"})
+            self.replica_queries.clear()
+            response = client.get("/task_manager/tasks")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        # The version lookup and the page.
+        self.assertEqual(len(self.replica_queries), 2)
+
+    def test__after_a_write__reads_are_pinned_to_the_primary(self):
+        task_id = self.primary_user_task.id
+        with self._get_authenticated_client() as client:
+            response = client.patch(
+                f"/task_manager/tasks/{task_id}/", json={"name": "Renamed"}
+            )
+            self.assertIn(PRIMARY_PIN_COOKIE, response.cookies)
+            self.replica_queries.clear()
+            response = client.get("/task_manager/tasks")
+        self.assertEqual(response.json()[0]["name"], "Renamed")
+        self.assertEqual(self.replica_queries, [])
+
+    def test__unreachable_replica__falls_back_to_the_primary(self):
+        self.replica.config["port"] = 1
+        with self._get_authenticated_client() as client:
+            self.assertEqual(replicas.healthy, set())
+            response = client.get("/task_manager/tasks")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.json()), 1)
+
+    def test__lagging_replica__is_taken_out_of_rotation(self):
+        with patch.object(replicas, "max_lag", -1):
+            with self._get_authenticated_client() as client:
+                self.assertEqual(replicas.healthy, set())
+                self.replica_queries.clear()
+                client.get("/task_manager/tasks")
+        self.assertEqual(self.replica_queries, [])
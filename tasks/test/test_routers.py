@@ -1,4 +1,9 @@
+import asyncio
+import datetime
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List
 from unittest import TestCase
+from unittest.mock import patch
 from piccolo.apps.migrations.commands.backwards import run_backwards
 from piccolo.apps.migrations.commands.forwards import run_forwards
 from piccolo.apps.user.tables import BaseUser
@@ -8,13 +13,20 @@ from piccolo_api.session_auth.tables import SessionsBase
 from app import app
 from fastapi import status
 from piccolo.testing.model_builder import ModelBuilder
-from tasks.tables import Task, TaskHistory
+from tasks.cache import listing_cache
+from tasks.engine import InstrumentedPostgresEngine
+from tasks.metrics import request_stats
+from tasks.notifications import listener
+from tasks.tables import Label, Task, TaskHistory, TaskLabel
+from tasks.types.task import TaskModelOut
 
 
 class TaskRouteTestCase(TestCase):
     def setUp(self):
         super().setUp()
         run_sync(run_forwards("all"))
+        # The tables are recreated, so the task versions start again.
+        listing_cache.clear()
         self.primary_user = ModelBuilder.build_sync(BaseUser, defaults={"active": True})
         self.secondary_user = ModelBuilder.build_sync(
             BaseUser, defaults={"active": True}
@@ -34,6 +46,32 @@ class TaskRouteTestCase(TestCase):
         session = self._create_user_session()
         return TestClient(app, cookies={"id": session.token})
 
+    @contextmanager
+    def assertMaxQueries(self, maximum: int) -> Iterator[None]:
+        """
+        Fails if the routes called inside the block run more than ``maximum``
+        queries between them. Queries run before a route is matched, such as
+        looking up the session, aren't counted.
+        """
+        queries = []
+        record_query = InstrumentedPostgresEngine.record_query
+
+        def counting_record_query(engine, query, duration):
+            stats = request_stats.get()
+            if stats is not None and "route" in stats.scope:
+                queries.append(str(query))
+            record_query(engine, query, duration)
+
+        with patch.object(
+            InstrumentedPostgresEngine, "record_query", counting_record_query
+        ):
+            yield
+        if len(queries) > maximum:
+            self.fail(
+                f"{len(queries)} queries were run, expected at most {maximum}:\n"
+                + "\n".join(queries)
+            )
+
     def tearDown(self):
         super().tearDown()
         run_sync(run_backwards("all", auto_agree=True))
@@ -54,6 +92,226 @@ class TaskListTestCase(TaskRouteTestCase):
         self.assertEqual(len(tasks), 1)
         self.assertEqual(tasks[0].get("id"), self.primary_user_task.id)
 
+    def test__when_more_tasks_than_limit__endpoint_pages_with_cursor(self):
+        task_ids = sorted(
+            [self.primary_user_task.id]
+            + [
+                ModelBuilder.build_sync(
+                    Task, defaults={"assignee_id": self.primary_user.id}
+                ).id
+                for _ in range(2)
+            ]
+        )
+        client = self._get_authenticated_client()
+        response = client.get("/task_manager/tasks", params={"limit": 2})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([x["id"] for x in response.json()], task_ids[:2])
+        cursor = response.headers["X-Next-Cursor"]
+
+        response = client.get(
+            "/task_manager/tasks", params={"limit": 2, "after": cursor}
+        )
+        self.assertEqual([x["id"] for x in response.json()], task_ids[2:])
+        self.assertNotIn("X-Next-Cursor", response.headers)
+
+    def test__when_cursor_malformed__endpoint_rejects_request(self):
+        client = self._get_authenticated_client()
+        response = client.get("/task_manager/tasks", params={"after": "not-a-cursor"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test__when_labels_included__tasks_list_their_labels(self):
+        label = ModelBuilder.build_sync(Label)
+        TaskLabel.insert(
+            TaskLabel(task=self.primary_user_task.id, label=label.id)
+        ).run_sync()
+        client = self._get_authenticated_client()
+
+        response = client.get("/task_manager/tasks", params={"include": "labels"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            response.json()[0]["labels"],
+            [{"id": label.id, "term": label.term, "description": label.description}],
+        )
+
+        response = client.get("/task_manager/tasks")
+        self.assertNotIn("labels", response.json()[0])
+
+    def test__when_filtered__endpoint_lists_matching_tasks(self):
+        Task.update({Task.status: Task.Status.done}).where(
+            Task.id == self.primary_user_task.id
+        ).run_sync()
+        due_tasks = [
+            ModelBuilder.build_sync(
+                Task,
+                defaults={
+                    "assignee_id": self.primary_user.id,
+                    "parent_task": self.primary_user_task.id,
+                    "status": task_status,
+                    "date_due": datetime.date(2024, 6, day),
+                },
+            )
+            for task_status, day in [
+                (Task.Status.pending, 3),
+                (Task.Status.doing, 10),
+                (Task.Status.done, 4),
+            ]
+        ]
+        client = self._get_authenticated_client()
+
+        response = client.get(
+            "/task_manager/tasks",
+            params={
+                "status": ["Pending", "Doing"],
+                "due_after": "2024-06-01",
+                "due_before": "2024-06-08",
+            },
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([x["id"] for x in response.json()], [due_tasks[0].id])
+
+        response = client.get("/task_manager/tasks", params={"has_parent": False})
+        self.assertEqual(
+            [x["id"] for x in response.json()], [self.primary_user_task.id]
+        )
+        response = client.get("/task_manager/tasks", params={"has_parent": True})
+        self.assertEqual(
+            [x["id"] for x in response.json()], sorted(x.id for x in due_tasks)
+        )
+
+        response = client.get("/task_manager/tasks", params={"status": "Finished"})
+        self.assertEqual(response.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+
+    def test__when_sorted_by_due_date__endpoint_pages_with_cursor(self):
+        due_tasks = [
+            ModelBuilder.build_sync(
+                Task,
+                defaults={
+                    "assignee_id": self.primary_user.id,
+                    "date_due": datetime.date(2024, 6, day),
+                },
+            )
+            for day in [10, 3, 3]
+        ]
+        Task.update({Task.date_due: None}).where(
+            Task.id == self.primary_user_task.id
+        ).run_sync()
+        expected = sorted([due_tasks[1].id, due_tasks[2].id]) + [
+            due_tasks[0].id,
+            self.primary_user_task.id,
+        ]
+
+        client = self._get_authenticated_client()
+        ids = []
+        params = {"sort": "date_due", "limit": 1}
+        while True:
+            response = client.get("/task_manager/tasks", params=params)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            ids += [x["id"] for x in response.json()]
+            if "X-Next-Cursor" not in response.headers:
+                break
+            params["after"] = response.headers["X-Next-Cursor"]
+        self.assertEqual(ids, expected)
+
+        response = client.get(
+            "/task_manager/tasks", params={"sort": "id", "after": params["after"]}
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test__when_etag_matches__tasks_not_modified(self):
+        label = ModelBuilder.build_sync(Label)
+        TaskLabel.insert(
+            TaskLabel(task=self.primary_user_task.id, label=label.id)
+        ).run_sync()
+        client = self._get_authenticated_client()
+        params = {"include": "labels"}
+        etag = client.get("/task_manager/tasks", params=params).headers["ETag"]
+
+        response = client.get(
+            "/task_manager/tasks", params=params, headers={"If-None-Match": etag}
+        )
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        response = client.get("/task_manager/tasks", headers={"If-None-Match": etag})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        # Changes made outside the routers bump the version too.
+        Label.update({Label.term: "Renamed"}).where(Label.id == label.id).run_sync()
+        response = client.get(
+            "/task_manager/tasks", params=params, headers={"If-None-Match": etag}
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()[0]["labels"][0]["term"], "Renamed")
+        etag = response.headers["ETag"]
+
+        ModelBuilder.build_sync(Task, defaults={"assignee_id": self.primary_user.id})
+        response = client.get(
+            "/task_manager/tasks", params=params, headers={"If-None-Match": etag}
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.json()), 2)
+
+    def test__when_streaming__endpoint_lists_users_tasks(self):
+        client = self._get_authenticated_client()
+        response = client.get("/task_manager/tasks", params={"stream": True})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        tasks = response.json()
+        self.assertEqual(len(tasks), 1)
+        self.assertEqual(tasks[0].get("id"), self.primary_user_task.id)
+
+
+class TaskSearchTestCase(TaskRouteTestCase):
+    def setUp(self):
+        super().setUp()
+        self.named_task = ModelBuilder.build_sync(
+            Task,
+            defaults={
+                "assignee_id": self.primary_user.id,
+                "name": "Renew passport",
+                "description": "Book an appointment",
+            },
+        )
+        self.described_task = ModelBuilder.build_sync(
+            Task,
+            defaults={
+                "assignee_id": self.primary_user.id,
+                "name": "Holiday",
+                "description": "Check the passport has not expired",
+            },
+        )
+        ModelBuilder.build_sync(
+            Task,
+            defaults={"assignee_id": self.secondary_user.id, "name": "Passport"},
+        )
+
+    def test__when_logged_in__name_matches_rank_first(self):
+        client = self._get_authenticated_client()
+        response = client.get("/task_manager/tasks/search", params={"q": "passport"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [x["id"] for x in response.json()],
+            [self.named_task.id, self.described_task.id],
+        )
+
+    def test__when_word_incomplete__matches_as_prefix(self):
+        client = self._get_authenticated_client()
+        response = client.get("/task_manager/tasks/search", params={"q": "appoint"})
+        self.assertEqual([x["id"] for x in response.json()], [self.named_task.id])
+
+    def test__when_more_matches_than_limit__endpoint_pages_with_cursor(self):
+        client = self._get_authenticated_client()
+        params = {"q": "passport", "limit": 1}
+        response = client.get("/task_manager/tasks/search", params=params)
+        self.assertEqual([x["id"] for x in response.json()], [self.named_task.id])
+
+        params["after"] = response.headers["X-Next-Cursor"]
+        response = client.get("/task_manager/tasks/search", params=params)
+        self.assertEqual([x["id"] for x in response.json()], [self.described_task.id])
+        self.assertNotIn("X-Next-Cursor", response.headers)
+
+    def test__when_query_has_no_words__endpoint_rejects_request(self):
+        client = self._get_authenticated_client()
+        response = client.get("/task_manager/tasks/search", params={"q": "&!:*"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
 
 class TaskCreateTestCase(TaskRouteTestCase):
 
@@ -138,3 +396,530 @@ class TaskDeleteTestCase(TaskRouteTestCase):
             .where(TaskHistory.task_id == self.primary_user_task.id)
             .run_sync()
         )
+
+    def test__when_parent_deleted__subtasks_recorded_in_history(self):
+        subtask = ModelBuilder.build_sync(
+            Task,
+            defaults={
+                "assignee_id": self.primary_user.id,
+                "parent_task": self.primary_user_task.id,
+            },
+        )
+        client = self._get_authenticated_client()
+        response = client.delete(
+            f"/task_manager/tasks/{self.primary_user_task.id}/",
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            TaskHistory.count()
+            .where(TaskHistory.task_id.is_in([self.primary_user_task.id, subtask.id]))
+            .run_sync(),
+            2,
+        )
+
+    def test__when_logged_in__can_delete_own_tasks_in_bulk(self):
+        client = self._get_authenticated_client()
+        task_ids = [self.primary_user_task.id, self.secondary_user_task.id]
+        response = client.request(
+            "DELETE", "/task_manager/tasks/bulk", json={"delete_ids": task_ids}
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()["deleted_ids"], [self.primary_user_task.id])
+        self.assertFalse(
+            Task.exists().where(Task.id == self.primary_user_task.id).run_sync()
+        )
+        # Only the current user's tasks can be deleted.
+        self.assertTrue(
+            Task.exists().where(Task.id == self.secondary_user_task.id).run_sync()
+        )
+
+
+class TaskBulkTestCase(TaskRouteTestCase):
+
+    def _task_data(self, name: str) -> dict:
+        return {
+            "name": name,
+            "description": "Created in bulk",
+            "assignee_id": self.primary_user.id,
+            "status": "Pending",
+            "parent_task": None,
+            "date_due": "2024-05-26",
+        }
+
+    def test__when_logged_in__can_create_tasks_in_bulk(self):
+        client = self._get_authenticated_client()
+        invalid_task = {**self._task_data("Invalid"), "status": "Unknown"}
+        response = client.post(
+            "/task_manager/tasks/bulk",
+            json=[self._task_data("First"), invalid_task, self._task_data("Second")],
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        results = response.json()
+        self.assertEqual(
+            [x["status"] for x in results], ["created", "invalid", "created"]
+        )
+        created = Task.select(Task.id, Task.name).where(
+            Task.id.is_in([results[0]["id"], results[2]["id"]])
+        )
+        self.assertEqual(
+            {x["id"]: x["name"] for x in created.run_sync()},
+            {results[0]["id"]: "First", results[2]["id"]: "Second"},
+        )
+
+    def test__when_batch_is_large__tasks_are_copied_in(self):
+        client = self._get_authenticated_client()
+        with patch("tasks.routers.BULK_COPY_THRESHOLD", 2):
+            response = client.post(
+                "/task_manager/tasks/bulk",
+                json=[self._task_data(f"Copied {x}") for x in range(3)],
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        ids = [x["id"] for x in response.json()]
+        self.assertEqual(
+            Task.select(Task.id, Task.name)
+            .where(Task.id.is_in(ids))
+            .order_by(Task.id)
+            .run_sync(),
+            [{"id": id, "name": f"Copied {x}"} for x, id in enumerate(ids)],
+        )
+
+    def test__when_logged_in__can_update_tasks_in_bulk(self):
+        client = self._get_authenticated_client()
+        response = client.put(
+            "/task_manager/tasks/bulk",
+            json=[
+                {**self._task_data("Updated"), "id": self.primary_user_task.id},
+                {**self._task_data("Missing"), "id": -1},
+                {**self._task_data("Other"), "id": self.secondary_user_task.id},
+            ],
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [x["status"] for x in response.json()],
+            ["updated", "not_found", "not_found"],
+        )
+        # Other users' tasks are left alone.
+        self.assertFalse(Task.exists().where(Task.name == "Other").run_sync())
+        self.assertEqual(
+            Task.select(Task.name)
+            .where(Task.id == self.primary_user_task.id)
+            .first()
+            .run_sync(),
+            {"name": "Updated"},
+        )
+
+
+class TaskPatchTestCase(TaskRouteTestCase):
+
+    def test__when_logged_in__can_patch_single_field(self):
+        client = self._get_authenticated_client()
+        response = client.patch(
+            f"/task_manager/tasks/{self.primary_user_task.id}/",
+            json={"status": "Blocked"},
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        task = response.json()
+        self.assertEqual(task["id"], self.primary_user_task.id)
+        self.assertEqual(task["status"], "Blocked")
+        self.assertEqual(task["name"], self.primary_user_task.name)
+
+    def test__when_task_missing__patch_returns_not_found(self):
+        client = self._get_authenticated_client()
+        response = client.patch("/task_manager/tasks/-1/", json={"name": "Missing"})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test__when_task_belongs_to_other_user__patch_returns_not_found(self):
+        client = self._get_authenticated_client()
+        task_id = self.secondary_user_task.id
+        response = client.patch(
+            f"/task_manager/tasks/{task_id}/", json={"name": "Mine"}
+        )
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        response = client.put(
+            f"/task_manager/tasks/{task_id}/",
+            json={
+                **TaskModelOut(**self.secondary_user_task.to_dict()).model_dump(
+                    mode="json"
+                ),
+                "name": "Mine",
+            },
+        )
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertFalse(Task.exists().where(Task.name == "Mine").run_sync())
+
+    def test__when_required_column_null__patch_is_rejected(self):
+        client = self._get_authenticated_client()
+        response = client.patch(
+            f"/task_manager/tasks/{self.primary_user_task.id}/", json={"name": None}
+        )
+        self.assertEqual(response.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+        self.assertEqual(response.json()["detail"], "name is required")
+
+        label = ModelBuilder.build_sync(Label)
+        response = client.patch(
+            f"/task_manager/labels/{label.id}/", json={"term": None}
+        )
+        self.assertEqual(response.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+
+    def test__when_assignee_missing__patch_is_rejected(self):
+        client = self._get_authenticated_client()
+        response = client.patch(
+            f"/task_manager/tasks/{self.primary_user_task.id}/",
+            json={"assignee_id": -1},
+        )
+        self.assertEqual(response.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+
+    def test__when_status_invalid__patch_and_put_are_rejected(self):
+        client = self._get_authenticated_client()
+        task_id = self.primary_user_task.id
+        response = client.patch(
+            f"/task_manager/tasks/{task_id}/", json={"status": "Bogus"}
+        )
+        self.assertEqual(response.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+
+        response = client.put(
+            f"/task_manager/tasks/{task_id}/",
+            json={
+                **TaskModelOut(**self.primary_user_task.to_dict()).model_dump(
+                    mode="json"
+                ),
+                "status": "Bogus",
+            },
+        )
+        self.assertEqual(response.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+        self.assertEqual(
+            Task.select(Task.status)
+            .where(Task.id == task_id)
+            .first()
+            .run_sync()["status"],
+            self.primary_user_task.status,
+        )
+
+
+class TaskDeletedListTestCase(TaskRouteTestCase):
+
+    def test__when_logged_in__lists_only_users_deleted_tasks(self):
+        client = self._get_authenticated_client()
+        for task in (self.primary_user_task, self.secondary_user_task):
+            TaskHistory.objects().create(
+                task_id=task.id,
+                serialized_data=TaskModelOut(**task.to_dict()).model_dump_json(),
+                deleted_by=task.assignee_id,
+            ).run_sync()
+
+        response = client.get("/task_manager/tasks/deleted/")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        tasks = response.json()
+        self.assertEqual(len(tasks), 1)
+        self.assertEqual(tasks[0]["id"], self.primary_user_task.id)
+        self.assertEqual(tasks[0]["name"], self.primary_user_task.name)
+
+    def test__when_more_deleted_than_limit__endpoint_pages_with_cursor(self):
+        client = self._get_authenticated_client()
+        subtask = ModelBuilder.build_sync(
+            Task,
+            defaults={
+                "assignee_id": self.primary_user.id,
+                "parent_task": self.primary_user_task.id,
+            },
+        )
+        client.delete(f"/task_manager/tasks/{self.primary_user_task.id}/")
+
+        response = client.get("/task_manager/tasks/deleted/", params={"limit": 1})
+        self.assertEqual(len(response.json()), 1)
+        cursor = response.headers["X-Next-Cursor"]
+        second_page = client.get(
+            "/task_manager/tasks/deleted/", params={"limit": 1, "after": cursor}
+        )
+        self.assertEqual(
+            sorted([response.json()[0]["id"], second_page.json()[0]["id"]]),
+            sorted([self.primary_user_task.id, subtask.id]),
+        )
+        self.assertNotIn("X-Next-Cursor", second_page.headers)
+
+    def test__when_status_given__lists_only_matching_deleted_tasks(self):
+        client = self._get_authenticated_client()
+        client.patch(
+            f"/task_manager/tasks/{self.primary_user_task.id}/",
+            json={"status": "Blocked"},
+        )
+        client.delete(f"/task_manager/tasks/{self.primary_user_task.id}/")
+
+        for task_status, expected in [("Blocked", 1), ("Done", 0)]:
+            response = client.get(
+                "/task_manager/tasks/deleted/", params={"status": task_status}
+            )
+            self.assertEqual(len(response.json()), expected)
+
+
+class TaskRestoreTestCase(TaskRouteTestCase):
+    def setUp(self):
+        super().setUp()
+        self.subtask = ModelBuilder.build_sync(
+            Task,
+            defaults={
+                "assignee_id": self.primary_user.id,
+                "parent_task": self.primary_user_task.id,
+            },
+        )
+        self.label = ModelBuilder.build_sync(Label)
+        TaskLabel.insert(
+            TaskLabel(task=self.subtask.id, label=self.label.id)
+        ).run_sync()
+
+    def _restore(self, client: TestClient, restore_ids: List[int]) -> Dict[str, Any]:
+        response = client.post(
+            "/task_manager/tasks/deleted/restore",
+            json={"restore_ids": restore_ids},
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.json()
+
+    def test__when_restored__tasks_and_labels_return(self):
+        client = self._get_authenticated_client()
+        client.delete(f"/task_manager/tasks/{self.primary_user_task.id}/")
+
+        result = self._restore(
+            client,
+            [
+                self.subtask.id,
+                self.primary_user_task.id,
+                self.secondary_user_task.id,
+                -1,
+            ],
+        )
+        self.assertEqual(
+            [x["id"] for x in result["restored"]],
+            sorted([self.primary_user_task.id, self.subtask.id]),
+        )
+        self.assertEqual(
+            result["conflicts"],
+            [
+                {"id": -1, "reason": "not_found"},
+                {"id": self.secondary_user_task.id, "reason": "exists"},
+            ],
+        )
+        self.assertEqual(
+            TaskLabel.select(TaskLabel.label)
+            .where(TaskLabel.task == self.subtask.id)
+            .run_sync(),
+            [{"label": self.label.id}],
+        )
+        self.assertEqual(TaskHistory.count().run_sync(), 0)
+
+    def test__when_parent_still_deleted__subtask_is_not_restored(self):
+        client = self._get_authenticated_client()
+        client.delete(f"/task_manager/tasks/{self.primary_user_task.id}/")
+
+        result = self._restore(client, [self.subtask.id])
+        self.assertEqual(result["restored"], [])
+        self.assertEqual(
+            result["conflicts"], [{"id": self.subtask.id, "reason": "missing_parent"}]
+        )
+        self.assertEqual(TaskHistory.count().run_sync(), 2)
+
+    def test__when_archived_by_other_user__task_is_not_restored(self):
+        TaskHistory.objects().create(
+            task_id=-1,
+            serialized_data=TaskModelOut(
+                **{**self.secondary_user_task.to_dict(), "id": -1}
+            ).model_dump_json(),
+            deleted_by=self.secondary_user.id,
+        ).run_sync()
+
+        result = self._restore(self._get_authenticated_client(), [-1])
+        self.assertEqual(result["conflicts"], [{"id": -1, "reason": "not_found"}])
+        self.assertFalse(Task.exists().where(Task.id == -1).run_sync())
+
+
+class TaskTreeTestCase(TaskRouteTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.subtask = ModelBuilder.build_sync(
+            Task,
+            defaults={
+                "assignee_id": self.primary_user.id,
+                "parent_task": self.primary_user_task.id,
+            },
+        )
+        self.nested_subtask = ModelBuilder.build_sync(
+            Task,
+            defaults={
+                "assignee_id": self.primary_user.id,
+                "parent_task": self.subtask.id,
+            },
+        )
+
+    def test__when_logged_in__returns_nested_tree(self):
+        client = self._get_authenticated_client()
+        response = client.get(f"/task_manager/tasks/{self.primary_user_task.id}/tree")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        tree = response.json()
+        self.assertEqual(tree["id"], self.primary_user_task.id)
+        self.assertEqual(tree["subtasks"][0]["id"], self.subtask.id)
+        self.assertEqual(
+            tree["subtasks"][0]["subtasks"][0]["id"], self.nested_subtask.id
+        )
+
+    def test__when_depth_given__returns_flat_tree_to_depth(self):
+        client = self._get_authenticated_client()
+        response = client.get(
+            f"/task_manager/tasks/{self.primary_user_task.id}/tree",
+            params={"depth": 1, "flat": True},
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [(x["id"], x["parent_task"], x["depth"]) for x in response.json()],
+            [
+                (self.primary_user_task.id, None, 0),
+                (self.subtask.id, self.primary_user_task.id, 1),
+            ],
+        )
+
+    def test__when_task_belongs_to_other_user__returns_not_found(self):
+        client = self._get_authenticated_client()
+        response = client.get(f"/task_manager/tasks/{self.secondary_user_task.id}/tree")
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class LabelListTestCase(TaskRouteTestCase):
+
+    def test__when_etag_matches__labels_not_modified(self):
+        client = self._get_authenticated_client()
+        response = client.get("/task_manager/labels")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        response = client.get(
+            "/task_manager/labels",
+            headers={"If-None-Match": response.headers["ETag"]},
+        )
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test__when_label_changed_elsewhere__cached_labels_refreshed(self):
+        with self._get_authenticated_client() as client:
+            self.assertTrue(listener.is_listening)
+            etag = client.get("/task_manager/labels").headers["ETag"]
+            # Bypass the routers, so only the notification can invalidate.
+            client.portal.call(Label.insert(Label(term="Elsewhere")).run)
+            for _ in range(20):
+                response = client.get(
+                    "/task_manager/labels", headers={"If-None-Match": etag}
+                )
+                if response.status_code == status.HTTP_200_OK:
+                    break
+                client.portal.call(asyncio.sleep, 0.1)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn("Elsewhere", [x["term"] for x in response.json()])
+
+
+class TaskLabelSetTestCase(TaskRouteTestCase):
+    def setUp(self):
+        super().setUp()
+        self.labels = [ModelBuilder.build_sync(Label) for _ in range(3)]
+        TaskLabel.insert(
+            TaskLabel(task=self.primary_user_task.id, label=self.labels[0].id),
+            TaskLabel(task=self.primary_user_task.id, label=self.labels[1].id),
+        ).run_sync()
+
+    def _set_labels(self, client: TestClient, label_ids: List[int]) -> List[Any]:
+        response = client.post(
+            f"/task_manager/tasks/{self.primary_user_task.id}/labels/",
+            json=[{"label": x} for x in label_ids],
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.json()
+
+    def test__when_labels_set__only_requested_labels_remain(self):
+        client = self._get_authenticated_client()
+        label_ids = [self.labels[2].id, self.labels[1].id, self.labels[2].id]
+        task_labels = self._set_labels(client, label_ids)
+        self.assertEqual(
+            [x["label"]["id"] for x in task_labels],
+            [self.labels[1].id, self.labels[2].id],
+        )
+        self.assertEqual(task_labels[1]["label"]["term"], self.labels[2].term)
+        self.assertEqual(
+            TaskLabel.count()
+            .where(TaskLabel.task == self.primary_user_task.id)
+            .run_sync(),
+            2,
+        )
+
+    def test__when_no_labels_given__all_labels_removed(self):
+        client = self._get_authenticated_client()
+        self.assertEqual(self._set_labels(client, []), [])
+        self.assertFalse(
+            TaskLabel.exists()
+            .where(TaskLabel.task == self.primary_user_task.id)
+            .run_sync()
+        )
+
+
+class QueryBudgetTestCase(TaskRouteTestCase):
+    def setUp(self):
+        super().setUp()
+        self.subtask = ModelBuilder.build_sync(
+            Task,
+            defaults={
+                "assignee_id": self.primary_user.id,
+                "parent_task": self.primary_user_task.id,
+            },
+        )
+        self.labels = [ModelBuilder.build_sync(Label) for _ in range(4)]
+        for label in self.labels[:3]:
+            TaskLabel(task=self.primary_user_task.id, label=label.id).save().run_sync()
+
+    def test__list_routes__run_a_fixed_number_of_queries(self):
+        client = self._get_authenticated_client()
+        task_id = self.primary_user_task.id
+        # The task listings look up the user's version first.
+        with self.assertMaxQueries(2):
+            client.get("/task_manager/tasks")
+        with self.assertMaxQueries(3):
+            client.get("/task_manager/tasks", params={"include": "labels"})
+        with self.assertMaxQueries(2):
+            client.get(f"/task_manager/tasks/{task_id}/subtasks/")
+        # Then serve unchanged pages from the cache.
+        with self.assertMaxQueries(1):
+            client.get("/task_manager/tasks", params={"include": "labels"})
+        with self.assertMaxQueries(1):
+            client.get(f"/task_manager/tasks/{task_id}/tree")
+        with self.assertMaxQueries(1):
+            client.get("/task_manager/tasks/search", params={"q": "task"})
+        with self.assertMaxQueries(1):
+            client.get("/task_manager/tasks/deleted/")
+        with self.assertMaxQueries(1):
+            client.get(f"/task_manager/tasks/{task_id}/labels/")
+
+    def test__write_routes__run_a_fixed_number_of_queries(self):
+        client = self._get_authenticated_client()
+        task_id = self.primary_user_task.id
+        with self.assertMaxQueries(1):
+            client.patch(f"/task_manager/tasks/{task_id}/", json={"status": "Done"})
+        with self.assertMaxQueries(1):
+            client.put(
+                f"/task_manager/tasks/{task_id}/",
+                json=TaskModelOut(**self.primary_user_task.to_dict()).model_dump(
+                    mode="json"
+                ),
+            )
+        with self.assertMaxQueries(1):
+            client.post(
+                f"/task_manager/tasks/{task_id}/labels/",
+                json=[{"label": x.id} for x in self.labels[1:]],
+            )
+        with self.assertMaxQueries(1):
+            client.delete(f"/task_manager/tasks/{task_id}/")
+        with self.assertMaxQueries(1):
+            client.post(
+                "/task_manager/tasks/deleted/restore",
+                json={"restore_ids": [task_id, self.subtask.id]},
+            )
+
+    def test__assert_max_queries__fails_when_exceeded(self):
+        client = self._get_authenticated_client()
+        with self.assertRaises(AssertionError):
+            with self.assertMaxQueries(0):
+                client.get("/task_manager/tasks")
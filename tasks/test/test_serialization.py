@@ -0,0 +1,30 @@
+from unittest import TestCase
+
+from piccolo.columns import Varchar
+
+from tasks.serialization import RowEncoder, SchemaMismatch, check_schema
+from tasks.tables import Task
+from tasks.types.task import TaskModelOut, TaskWithLabelsOut
+
+
+class RowEncoderTestCase(TestCase):
+    def test__when_model_matches__fields_are_the_columns(self):
+        check_schema(Task, TaskWithLabelsOut, extra_fields=["labels"])
+        encoder = RowEncoder(Task, TaskModelOut)
+        self.assertEqual(encoder.fields, tuple(TaskModelOut.model_fields))
+
+    def test__when_field_missing__schema_mismatch_raised(self):
+        with self.assertRaises(SchemaMismatch):
+            check_schema(Task, TaskWithLabelsOut)
+
+    def test__when_column_extra__schema_mismatch_raised(self):
+        class WideTask(Task, tablename="task"):
+            summary = Varchar()
+
+        with self.assertRaises(SchemaMismatch):
+            RowEncoder(WideTask, TaskModelOut)
+
+    def test__project__drops_other_values(self):
+        encoder = RowEncoder(Task, TaskModelOut)
+        row = {name: None for name in encoder.fields}
+        self.assertEqual(encoder.project({**row, "history_id": 1}), row)
@@ -0,0 +1,71 @@
+import asyncio
+import json
+import os
+import tempfile
+from unittest import TestCase
+from piccolo.utils.sync import run_sync
+from tasks.slow_queries import SlowQueryLog, slow_query_log_from_env
+from tasks.tables import Task
+
+
+class SlowQueryLogTestCase(TestCase):
+    def setUp(self):
+        super().setUp()
+        self.engine = Task._meta.db
+        self.path = os.path.join(tempfile.mkdtemp(), "slow_queries.log")
+
+    def tearDown(self):
+        super().tearDown()
+        self.engine.slow_query_log = None
+
+    def read_entries(self):
+        with open(self.path) as f:
+            return [json.loads(line) for line in f]
+
+    def test__slow_queries__are_logged(self):
+        self.engine.slow_query_log = SlowQueryLog(threshold=0, path=self.path)
+        Task.raw("SELECT {} AS value", "parameter").run_sync()
+
+        [entry] = self.read_entries()
+        self.assertEqual(entry["sql"], "SELECT $1 AS value")
+        self.assertEqual(entry["parameters"], ["'parameter'"])
+        self.assertIsNone(entry["route"])
+        self.assertNotIn("plan", entry)
+
+    def test__fast_queries__are_not_logged(self):
+        self.engine.slow_query_log = SlowQueryLog(threshold=60, path=self.path)
+        Task.raw("SELECT 1").run_sync()
+        self.assertFalse(os.path.exists(self.path))
+
+    def _run_and_explain(self, sql: str):
+        self.engine.slow_query_log = SlowQueryLog(
+            threshold=0, path=self.path, explain=True
+        )
+
+        async def run_query():
+            await Task.raw(sql)
+            # The plan is captured in the background.
+            while not os.path.exists(self.path):
+                await asyncio.sleep(0.01)
+
+        run_sync(run_query())
+        return self.read_entries()[0]["plan"]
+
+    def test__explain__captures_the_plan(self):
+        plan = self._run_and_explain("SELECT 1::integer AS value")
+        self.assertTrue(any("Result" in line for line in plan))
+        self.assertTrue(any("actual time" in line for line in plan))
+
+    def test__when_query_has_side_effects__it_is_not_run_again(self):
+        Task.raw("CREATE SEQUENCE explained").run_sync()
+        self.addCleanup(Task.raw("DROP SEQUENCE IF EXISTS explained").run_sync)
+        plan = self._run_and_explain("SELECT nextval('explained') AS value")
+        self.assertFalse(any("actual time" in line for line in plan))
+
+    def test__when_threshold_not_set__log_is_disabled(self):
+        self.assertIsNone(slow_query_log_from_env({}))
+        self.assertIsNotNone(
+            slow_query_log_from_env(
+                {"SLOW_QUERY_THRESHOLD_MS": "500", "SLOW_QUERY_LOG": self.path}
+            )
+        )
@@ -1,20 +1,41 @@
-from typing import List
+from typing import List, Literal, Optional
 from piccolo_api.crud.serializers import create_pydantic_model
 from pydantic import BaseModel
 from tasks.tables import Task, TaskLabel, Label
 
 LabelModelIn = create_pydantic_model(table=Label, model_name="LabelModelIn")
 
+LabelModelPatch = create_pydantic_model(
+    table=Label, model_name="LabelModelPatch", all_optional=True
+)
+
 LabelModelOut = create_pydantic_model(
     table=Label, model_name="LabelModelOut", include_default_columns=True
 )
 
 TaskModelIn = create_pydantic_model(table=Task, model_name="TaskModelIn")
 
+TaskModelPatch = create_pydantic_model(
+    table=Task, model_name="TaskModelPatch", all_optional=True
+)
+
 TaskModelOut = create_pydantic_model(
     table=Task, include_default_columns=True, model_name="TaskModelOut"
 )
 
+
+class TaskWithLabelsOut(TaskModelOut):
+    labels: List[LabelModelOut] = []
+
+
+class TaskTreeNodeOut(TaskModelOut):
+    depth: int
+
+
+class TaskTreeOut(TaskModelOut):
+    subtasks: List["TaskTreeOut"] = []
+
+
 TaskLabelIn = create_pydantic_model(
     TaskLabel,
     exclude_columns=(TaskLabel.task,),
@@ -32,3 +53,32 @@ TaskLabelOut = create_pydantic_model(
 
 class TaskRestoreIn(BaseModel):
     restore_ids: List[int]
+
+
+class TaskRestoreConflictOut(BaseModel):
+    id: int
+    reason: Literal["not_found", "exists", "missing_parent"]
+
+
+class TaskRestoreOut(BaseModel):
+    restored: List[TaskModelOut]
+    conflicts: List[TaskRestoreConflictOut]
+
+
+class TaskDeleteIn(BaseModel):
+    delete_ids: List[int]
+
+
+class TaskDeleteOut(BaseModel):
+    deleted_ids: List[int]
+
+
+class TaskBulkUpdateIn(TaskModelIn):
+    id: int
+
+
+class TaskBulkResultOut(BaseModel):
+    index: int
+    id: Optional[int] = None
+    status: Literal["created", "updated", "not_found", "invalid"]
+    detail: Optional[str] = None